@@ -1,45 +1,199 @@
 from pymongo import MongoClient, ASCENDING
+from loguru import logger
 from config import settings
+from app.utilities.circuit_breaker import (
+    BreakerCommandListener, BreakerHeartbeatListener, CircuitBreaker, GuardedCollection
+)
+from app.utilities.profiling import ProfilingCommandListener
+from app.utilities.tenancy import TenantCollection
+
+# Trips after consecutive failed or slow MongoDB calls, so requests fail fast while the database is degraded
+mongo_breaker = CircuitBreaker(
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    slow_call_ms=settings.CIRCUIT_SLOW_CALL_MS,
+    reset_timeout=settings.CIRCUIT_RESET_SECONDS,
+    half_open_max_calls=settings.CIRCUIT_HALF_OPEN_MAX_CALLS,
+)
 
 # Connect to MongoDB
 client = MongoClient(
-    settings.DATABASE_URL, serverSelectionTimeoutMS=5000
+    settings.DATABASE_URL, serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    event_listeners=[
+        BreakerCommandListener(mongo_breaker), BreakerHeartbeatListener(mongo_breaker),
+        # Only registered when profiling is enabled, so other deployments don't pay for it on every command
+        *([ProfilingCommandListener()] if settings.PROFILING_ENABLED else []),
+    ]
 )
 
 try:
     conn = client.server_info()
-    print(f'Connected to MongoDB {conn.get("version")}')
+    logger.info("Connected to MongoDB {}", conn.get("version"))
 except Exception as e:
-    print(f"Unable to connect to the MongoDB server: {e}")
+    logger.error("Unable to connect to the MongoDB server: {}", e)
 
 # Select the database
 db = client[settings.MONGO_INITDB_DATABASE]
 
-# Create indexes for the users collection
-User = db.users
+
+def guarded(collection):
+    # Every collection goes through the circuit breaker
+    return GuardedCollection(collection, mongo_breaker)
+
+
+def tenant_scoped(collection):
+    # Branch data: queries only ever see the current gym's documents, and indexes lead with gym_id
+    return TenantCollection(guarded(collection))
+
+
+# Collections holding branch data, migrated by app.migrations.tenancy
+TENANT_COLLECTIONS = [
+    "users", "registrations", "customers", "screenings", "screening_revisions", "forms", "exercises",
+    "diet_plans", "food_items", "tombstones", "leaderboard_scores", "diet_plans_archive", "workout_plans_archive",
+    "slots", "slot_days", "slot_bookings", "checkins", "attendance_days", "recommendations",
+    "form_submissions", "dashboard_stats",
+]
+
+# Create indexes for the users collection (emails are unique within a branch)
+User = tenant_scoped(db.users)
 User.create_index([("email", ASCENDING)], unique=True)
 
+# Indexes backing the filters accepted by the users list endpoint
+USER_FILTER_INDEXES = [
+    ("email",),
+    ("registration_id",),
+    ("phone_no",),
+    ("role", "created_at"),
+    ("created_at",),
+]
+# (email is already covered by the unique index above)
+for keys in USER_FILTER_INDEXES[1:]:
+    User.create_index([(key, ASCENDING) for key in keys])
+
 # Create indexes for the registrations collection
-Registrations = db.registrations
+Registrations = tenant_scoped(db.registrations)
 Registrations.create_index([("email", ASCENDING)], unique=True)
 
 # Create indexes for the customers collection
-Customers = db.customers
+Customers = tenant_scoped(db.customers)
 Customers.create_index([("name", ASCENDING), ("phone_no", ASCENDING), ("email", ASCENDING)], unique=True)
 
+# Screening answers: one "current" document per user, plus an append-only history
+# of revisions that only store the fields each edit changed
+Screenings = tenant_scoped(db.screenings)
+Screenings.create_index([("user_id", ASCENDING)], unique=True)
+ScreeningRevisions = tenant_scoped(db.screening_revisions)
+ScreeningRevisions.create_index([("user_id", ASCENDING), ("version", ASCENDING)], unique=True)
+
 # Create indexes for the forms collection
-Forms = db.forms
+Forms = tenant_scoped(db.forms)
 # Create an index on form_name to make querying forms by name more efficient
 Forms.create_index([("form_name", ASCENDING)], unique=True)
 
+# Members' answers to the forms, listed per form (and member) in insertion order
+FormSubmissions = tenant_scoped(db.form_submissions)
+FormSubmissions.create_index([("form_id", ASCENDING), ("_id", ASCENDING)])
+FormSubmissions.create_index([("form_id", ASCENDING), ("user_id", ASCENDING), ("_id", ASCENDING)])
+
 # Optionally, create a compound index on fields if needed
 # Forms.create_index([("form_name", ASCENDING), ("fields.field_name", ASCENDING)])
 
-Exercises = db.exercises
+Exercises = tenant_scoped(db.exercises)
 
 # Create indexes for the exercises collection   
 # Exercises.create_index([("exercise_name", ASCENDING)], unique=True)
+EXERCISE_FILTER_INDEXES = [
+    ("type", "category"),
+    ("category",),
+]
+for keys in EXERCISE_FILTER_INDEXES:
+    Exercises.create_index([(key, ASCENDING) for key in keys])
+
+DietPlans = tenant_scoped(db.diet_plans)
+DIET_PLAN_FILTER_INDEXES = [
+    ("user_id",),
+]
+for keys in DIET_PLAN_FILTER_INDEXES:
+    DietPlans.create_index([(key, ASCENDING) for key in keys])
+
+FoodItems = tenant_scoped(db.food_items)
+
+# Version counters of each branch's exercise and food catalogs, bumped on every catalog write
+# (keyed by "<gym_id>:<catalog>", so shared by all branches like the other counters below)
+CatalogVersions = guarded(db.catalog_versions)
+
+# Sequence counters (the "sync" counter orders every change served by the sync API)
+Counters = guarded(db.counters)
+
+# Deleted documents, kept so syncing clients learn about deletions
+Tombstones = tenant_scoped(db.tombstones)
+Tombstones.create_index([("seq", ASCENDING)])
+
+# Indexes on the change sequence each synced collection carries
+Exercises.create_index([("seq", ASCENDING)])
+FoodItems.create_index([("seq", ASCENDING)])
+Forms.create_index([("seq", ASCENDING)])
+DietPlans.create_index([("user_id", ASCENDING), ("seq", ASCENDING)])
+
+# Plans past their end_date, moved out of the hot collections by the archival job
+DietPlans.create_index([("end_date", ASCENDING)])
+User.create_index([("workout_plan.end_date", ASCENDING)], sparse=True)
+ArchivedDietPlans = tenant_scoped(db.diet_plans_archive)
+ArchivedDietPlans.create_index([("user_id", ASCENDING), ("end_date", ASCENDING)])
+ArchivedWorkoutPlans = tenant_scoped(db.workout_plans_archive)
+ArchivedWorkoutPlans.create_index([("user_id", ASCENDING), ("end_date", ASCENDING)])
+
+# Leases of background jobs meant to run on one worker at a time (keyed by job name, shared by all branches)
+JobLeases = guarded(db.job_leases)
+
+# Bookable training slots, the seats left in each slot per day, and the members' bookings
+# (a member holds at most one active booking, seated or waitlisted, per slot and day)
+Slots = tenant_scoped(db.slots)
+SlotDays = tenant_scoped(db.slot_days)
+SlotDays.create_index([("slot_id", ASCENDING), ("date", ASCENDING)], unique=True)
+SlotBookings = tenant_scoped(db.slot_bookings)
+SlotBookings.create_index(
+    [("slot_id", ASCENDING), ("date", ASCENDING), ("user_id", ASCENDING)],
+    unique=True, partialFilterExpression={"active": True}
+)
+SlotBookings.create_index([("slot_id", ASCENDING), ("date", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)])
+SlotBookings.create_index([("user_id", ASCENDING), ("date", ASCENDING)])
+
+# Attendance check-ins, written in batches, and the check-ins counted per day (and hour of the day)
+Checkins = tenant_scoped(db.checkins)
+Checkins.create_index([("user_id", ASCENDING), ("checked_in_at", ASCENDING)])
+Checkins.create_index([("date", ASCENDING)])
+AttendanceDays = tenant_scoped(db.attendance_days)
+AttendanceDays.create_index([("date", ASCENDING)], unique=True)
+
+# Plans suggested from the screening answers, one per member, and the screenings still waiting for one
+Recommendations = tenant_scoped(db.recommendations)
+Recommendations.create_index([("user_id", ASCENDING)], unique=True)
+Screenings.create_index([("recommendation_pending", ASCENDING)])
+
+# Admin dashboard counters, one document per figure (or day of registrations), maintained on write
+DashboardStats = tenant_scoped(db.dashboard_stats)
+DashboardStats.create_index([("name", ASCENDING)], unique=True)
+
+# Responses of write requests sent with an Idempotency-Key header, expired by a TTL index
+IdempotencyKeys = guarded(db.idempotency_keys)
+IdempotencyKeys.create_index([("created_at", ASCENDING)], expireAfterSeconds=settings.IDEMPOTENCY_TTL_SECONDS)
 
-DietPlans = db.diet_plans
+# Leaderboard entries, one per board, period and member, maintained as progress is logged
+LeaderboardScores = tenant_scoped(db.leaderboard_scores)
+LeaderboardScores.create_index([("metric", ASCENDING), ("period", ASCENDING), ("seq", ASCENDING)])
 
-FoodItems = db.food_items
\ No newline at end of file
+# Body weight and measurements over time, in a time-series collection (MongoDB 5.0+)
+# bucketed per member, so range reads touch few documents
+if "body_metrics" not in db.list_collection_names():
+    try:
+        db.create_collection(
+            "body_metrics",
+            timeseries={"timeField": "measured_at", "metaField": "user_id", "granularity": "hours"}
+        )
+    except Exception as e:
+        logger.warning("Could not create the body_metrics time-series collection: {}", e)
+# Measurements are always read by member (the metaField), and members are looked up within the branch
+# first, so the collection isn't scoped by gym_id: fields other than the metaField of existing
+# time-series documents can't be updated to add one
+BodyMetrics = guarded(db.body_metrics)
+BodyMetrics.create_index([("user_id", ASCENDING), ("measured_at", ASCENDING)])
@@ -1,8 +1,27 @@
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from loguru import logger
 
 from config import settings
-from app.routers import auth, user, forms, screening, exercise, workout_plan, diet_plan, food_item
+from app.utilities.circuit_breaker import CircuitOpenError
+from app.utilities.compression import CompressionMiddleware
+from app.utilities.idempotency import IdempotencyMiddleware
+from app.utilities.log import RequestIdMiddleware, setup_logging
+from app.utilities.profiling import ProfilingMiddleware, install as install_profiling, profiling_stats
+from app.utilities.tenancy import TenantMiddleware
+
+# Configure logging before the routers import the database module, which logs on connect
+setup_logging()
+
+from app.database import mongo_breaker
+from app.utilities.archive import archive_periodically
+from app.utilities.checkin import checkin_buffer
+from app.utilities.dashboard import reconcile_nightly, seed_missing_stats
+from app.routers import auth, user, forms, screening, exercise, workout_plan, diet_plan, food_item, sync, events, batch, leaderboard, body_metrics, slots, checkin, recommendations, dashboard
 
 app = FastAPI()
 
@@ -17,6 +36,46 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TenantMiddleware)
+# Stores and replays uncompressed responses, so it sits inside the compression middleware
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+if settings.PROFILING_ENABLED:
+    # Inside the request ID middleware, so the profile's log line and files carry the request ID
+    install_profiling()
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+
+
+@app.on_event("startup")
+async def start_archival():
+    if settings.ARCHIVE_INTERVAL_SECONDS:
+        # Kept on app.state so the task isn't garbage collected while it sleeps
+        app.state.archival = asyncio.create_task(archive_periodically())
+
+
+@app.on_event("startup")
+async def start_dashboard_reconciliation():
+    # Counters only follow changes made after they exist, so branches without any are counted first
+    try:
+        await run_in_threadpool(seed_missing_stats)
+    except Exception as e:
+        logger.error("Seeding the dashboard counters failed: {}", e)
+    if settings.DASHBOARD_RECONCILE_HOUR >= 0:
+        app.state.dashboard_reconciliation = asyncio.create_task(reconcile_nightly())
+
+
+@app.on_event("shutdown")
+async def flush_checkins():
+    # Write the buffered check-ins before the worker exits
+    await run_in_threadpool(checkin_buffer.close)
+
+
+@app.on_event("shutdown")
+async def flush_logs():
+    # Drain the queued log lines before the worker exits
+    await logger.complete()
+    logger.remove()
 
 
 app.include_router(auth.router, tags=['Auth'], prefix='/api/auth')
@@ -27,7 +86,50 @@ app.include_router(exercise.router, tags=['Exercises'], prefix='/api')
 app.include_router(workout_plan.router, tags=['Workout Plan'], prefix='/api')
 app.include_router(diet_plan.router, tags=['Diet Plan'], prefix='/api')
 app.include_router(food_item.router, tags=['Food Items'], prefix='/api')
+app.include_router(sync.router, tags=['Sync'], prefix='/api')
+app.include_router(events.router, tags=['Events'], prefix='/api')
+app.include_router(batch.router, tags=['Batch'], prefix='/api')
+app.include_router(leaderboard.router, tags=['Leaderboards'], prefix='/api')
+app.include_router(body_metrics.router, tags=['Body Metrics'], prefix='/api')
+app.include_router(slots.router, tags=['Slots'], prefix='/api')
+app.include_router(checkin.router, tags=['Check-in'], prefix='/api')
+app.include_router(recommendations.router, tags=['Recommendations'], prefix='/api')
+app.include_router(dashboard.router, tags=['Dashboard'], prefix='/api')
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    # Database calls made outside handle_errors while the breaker is open
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
 
 @app.get("/api/healthchecker")
-def root():
-    return {"message": "Welcome to Level Up Fitness APIs!"}
+async def root():
+    # Answers from memory, so it stays reachable while the database is down
+    return {"message": "Welcome to Level Up Fitness APIs!", "database": mongo_breaker.snapshot()}
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of the MongoDB circuit breaker, the check-in buffer and the profiled requests."""
+    breaker = mongo_breaker.snapshot()
+    lines = [
+        "# TYPE mongo_circuit_state gauge",
+        *[f'mongo_circuit_state{{state="{state}"}} {int(breaker["state"] == state)}'
+          for state in ("closed", "open", "half_open")],
+        "# TYPE mongo_circuit_consecutive_failures gauge",
+        f"mongo_circuit_consecutive_failures {breaker['consecutive_failures']}",
+    ]
+    for counter in ("failures", "slow_calls", "rejected", "opened"):
+        lines += [f"# TYPE mongo_circuit_{counter}_total counter", f"mongo_circuit_{counter}_total {breaker[counter]}"]
+
+    checkins = checkin_buffer.snapshot()
+    lines += ["# TYPE checkin_buffer_pending gauge", f"checkin_buffer_pending {checkins['pending']}"]
+    for counter in ("buffered", "written", "flushes", "failed_flushes", "dropped"):
+        lines += [f"# TYPE checkin_{counter}_total counter", f"checkin_{counter}_total {checkins[counter]}"]
+
+    profiles = profiling_stats.snapshot()
+    lines += ["# TYPE request_profiles_total counter", f"request_profiles_total {profiles['profiled']}",
+              "# TYPE request_profile_phase_seconds_total counter"]
+    lines += [f'request_profile_phase_seconds_total{{phase="{name}"}} {seconds:.6f}'
+              for name, seconds in profiles["phase_seconds"].items()]
+    return "\n".join(lines) + "\n"
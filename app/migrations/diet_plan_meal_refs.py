@@ -0,0 +1,58 @@
+"""
+Replace the full food item copies embedded in diet plan meals with references to the catalog.
+
+Run with `python -m app.migrations.diet_plan_meal_refs`. Meals are matched to catalog items by
+food_name; meals without a catalog match keep their copy as a snapshot so no data is lost.
+"""
+from pymongo import UpdateOne
+from loguru import logger
+
+from app.database import DietPlans, FoodItems
+
+
+def migrate(batch_size: int = 500) -> int:
+    migrated = 0
+    cursor = DietPlans.find(
+        {"meals": {"$elemMatch": {"food_name": {"$exists": True}, "food_id": {"$exists": False}}}},
+        {"meals": 1},
+        batch_size=batch_size
+    )
+
+    batch = []
+    for plan in cursor:
+        batch.append(plan)
+        if len(batch) >= batch_size:
+            migrated += _migrate_batch(batch)
+            batch = []
+    if batch:
+        migrated += _migrate_batch(batch)
+
+    logger.info("Converted the meals of {} diet plans to food references", migrated)
+    return migrated
+
+
+def _migrate_batch(plans: list) -> int:
+    names = {meal.get("food_name") for plan in plans for meal in plan["meals"] if "food_id" not in meal}
+    food_ids = {
+        item["food_name"]: str(item["_id"])
+        for item in FoodItems.find({"food_name": {"$in": list(names)}}, {"food_name": 1})
+    }
+
+    operations = []
+    for plan in plans:
+        meals = []
+        for meal in plan["meals"]:
+            if "food_id" in meal:
+                meals.append(meal)
+            elif meal.get("food_name") in food_ids:
+                meals.append({"food_id": food_ids[meal["food_name"]], "quantity": meal.get("quantity"), "meal_slot": None})
+            else:
+                meals.append({"food_id": None, "quantity": meal.get("quantity"), "meal_slot": None, "snapshot": meal})
+        operations.append(UpdateOne({"_id": plan["_id"]}, {"$set": {"meals": meals}}))
+
+    DietPlans.bulk_write(operations, ordered=False)
+    return len(plans)
+
+
+if __name__ == "__main__":
+    migrate()
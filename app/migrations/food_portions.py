@@ -0,0 +1,64 @@
+"""
+Store the canonical portion of the quantities written before portions were worked out on write.
+
+Run with `python -m app.migrations.food_portions`, food items first: meal portions are weighed with the
+density and piece weight of their food item. Quantities that can't be parsed get a null portion, and
+their meals report no scaled nutrients until the quantity is fixed.
+"""
+from pymongo import UpdateOne
+from loguru import logger
+
+from app.database import DietPlans, FoodItems
+from app.utilities.portions import normalize_portion
+from app.utilities.tenancy import tenant
+from config import settings
+
+
+def migrate(batch_size: int = 500) -> int:
+    migrated = 0
+    for gym_id in sorted(settings.GYM_IDS):
+        with tenant(gym_id):
+            migrated += _migrate_food_items(batch_size) + _migrate_diet_plans(batch_size)
+    logger.info("Stored the portions of {} food items and diet plans", migrated)
+    return migrated
+
+
+def _migrate_food_items(batch_size: int) -> int:
+    operations = [
+        UpdateOne({"_id": item["_id"]}, {"$set": {"portion": normalize_portion(item.get("quantity"), item)}})
+        for item in FoodItems.find({"portion": {"$exists": False}}, batch_size=batch_size)
+    ]
+    if operations:
+        FoodItems.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def _migrate_diet_plans(batch_size: int) -> int:
+    foods = {str(item["_id"]): item for item in FoodItems.find({}, {"food_name": 1, "density": 1, "unit_weight": 1})}
+    cursor = DietPlans.find(
+        {"meals": {"$elemMatch": {"food_id": {"$ne": None}, "portion": {"$exists": False}}}},
+        {"meals": 1},
+        batch_size=batch_size
+    )
+
+    migrated, operations = 0, []
+    for plan in cursor:
+        for meal in plan["meals"]:
+            if not meal.get("food_id") or "portion" in meal:
+                continue
+            snapshot = meal.get("snapshot")
+            if snapshot is not None and "portion" not in snapshot:
+                snapshot["portion"] = normalize_portion(snapshot.get("quantity"), snapshot)
+            meal["portion"] = normalize_portion(meal.get("quantity"), snapshot or foods.get(meal["food_id"]) or {})
+        operations.append(UpdateOne({"_id": plan["_id"]}, {"$set": {"meals": plan["meals"]}}))
+        migrated += 1
+        if len(operations) >= batch_size:
+            DietPlans.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        DietPlans.bulk_write(operations, ordered=False)
+    return migrated
+
+
+if __name__ == "__main__":
+    migrate()
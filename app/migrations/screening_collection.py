@@ -0,0 +1,62 @@
+"""
+Move screening answers embedded in users documents into the screenings collection.
+
+Run with `python -m app.migrations.screening_collection`. The migration is idempotent:
+already migrated users are left alone, so it can be re-run safely after an interruption.
+"""
+from datetime import datetime
+from pymongo import UpdateOne
+from loguru import logger
+
+from app.database import User, Screenings, ScreeningRevisions
+
+
+def migrate(batch_size: int = 500) -> int:
+    migrated = 0
+    cursor = User.find({"screening": {"$exists": True}}, {"screening": 1}, batch_size=batch_size)
+
+    batch = []
+    for user in cursor:
+        batch.append(user)
+        if len(batch) >= batch_size:
+            migrated += _migrate_batch(batch)
+            batch = []
+    if batch:
+        migrated += _migrate_batch(batch)
+
+    logger.info("Migrated {} embedded screening forms", migrated)
+    return migrated
+
+
+def _migrate_batch(users: list) -> int:
+    screening_ops, revision_ops, user_ops = [], [], []
+    for user in users:
+        user_id = str(user["_id"])
+        answers = dict(user["screening"])
+        answers.pop("user_id", None)
+        submitted_at = answers.pop("submitted_at", None) or datetime.utcnow()
+        updated_at = answers.pop("updated_at", None) or submitted_at
+
+        # $setOnInsert keeps the migration from overwriting answers edited since a previous run
+        screening_ops.append(UpdateOne(
+            {"user_id": user_id},
+            {"$setOnInsert": {**answers, "user_id": user_id, "submitted_at": submitted_at,
+                              "updated_at": updated_at, "version": 1}},
+            upsert=True
+        ))
+        revision_ops.append(UpdateOne(
+            {"user_id": user_id, "version": 1},
+            {"$setOnInsert": {"changes": answers, "created_at": submitted_at}},
+            upsert=True
+        ))
+        user_ops.append(UpdateOne({"_id": user["_id"]}, {"$unset": {"screening": ""}}))
+
+    Screenings.bulk_write(screening_ops, ordered=False)
+    ScreeningRevisions.bulk_write(revision_ops, ordered=False)
+    # Only drop the embedded copies once both collections hold the data
+    User.bulk_write(user_ops, ordered=False)
+    return len(users)
+
+
+if __name__ == "__main__":
+    migrate()
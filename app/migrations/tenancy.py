@@ -0,0 +1,54 @@
+"""
+Move the data of a single-gym deployment into the default gym branch.
+
+Run with `python -m app.migrations.tenancy` after deploying the gym_id scoped collections (importing
+app.database creates the new gym_id prefixed indexes). It tags every document without a gym_id with
+DEFAULT_GYM_ID, then drops the old indexes that don't lead with gym_id, like the global unique email
+index that keeps two branches from having members with the same email. The migration is idempotent.
+The earlier migrations read through the gym_id scoped collections, so run this one before them.
+
+`--shard` also shards the branch collections on gym_id, on a sharded cluster.
+"""
+import sys
+
+from loguru import logger
+
+from app.database import TENANT_COLLECTIONS, client, db
+from app.utilities.tenancy import TENANT_FIELD
+from config import settings
+
+# Collections with a unique index can only be sharded on a prefix of it, which is gym_id alone;
+# the others add _id so a large branch can still be split across chunks
+SHARD_KEYS = {
+    name: {TENANT_FIELD: 1} if name in ("users", "registrations", "customers", "screenings", "screening_revisions", "forms")
+    else {TENANT_FIELD: 1, "_id": 1}
+    for name in TENANT_COLLECTIONS
+}
+
+
+def migrate(gym_id: str = settings.DEFAULT_GYM_ID) -> int:
+    tagged = 0
+    for name in TENANT_COLLECTIONS:
+        result = db[name].update_many({TENANT_FIELD: {"$exists": False}}, {"$set": {TENANT_FIELD: gym_id}})
+        tagged += result.modified_count
+
+        for index_name, index in db[name].index_information().items():
+            if index_name != "_id_" and index["key"][0][0] != TENANT_FIELD:
+                db[name].drop_index(index_name)
+                logger.info("Dropped index {} of {}", index_name, name)
+
+    logger.info("Moved {} documents into gym {}", tagged, gym_id)
+    return tagged
+
+
+def shard():
+    client.admin.command("enableSharding", db.name)
+    for name, key in SHARD_KEYS.items():
+        client.admin.command("shardCollection", f"{db.name}.{name}", key=key)
+        logger.info("Sharded {} on {}", name, key)
+
+
+if __name__ == "__main__":
+    migrate()
+    if "--shard" in sys.argv:
+        shard()
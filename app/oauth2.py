@@ -1,13 +1,16 @@
 import base64
-from typing import List
-from fastapi import Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Request, status
 from fastapi_jwt_auth import AuthJWT
 from pydantic import BaseModel
 from bson.objectid import ObjectId
 from loguru import logger
+from pymongo.errors import ConnectionFailure
 
 from app.serializers.userSerializers import userEntity
 from .database import User
+from app.utilities.circuit_breaker import CircuitOpenError
+from app.utilities.tenancy import TENANT_FIELD, set_current_gym
 from config import settings
 
 
@@ -29,6 +32,23 @@ def get_config():
     return Settings()
 
 
+# Only the fields userEntity needs, so the auth lookup never loads embedded plans
+USER_AUTH_PROJECTION = {
+    "name": 1, "email": 1, "role": 1, "photo": 1, "verified": 1,
+    "password": 1, "created_at": 1, "updated_at": 1, "gym_id": 1,
+}
+
+
+def token_claims(user: dict) -> dict:
+    """Claims carried by the user's tokens besides the subject: the branch every request of theirs is scoped to."""
+    return {TENANT_FIELD: user[TENANT_FIELD]}
+
+
+def token_gym(claims: dict) -> str:
+    """Branch named by the (already verified) token's claims; tokens issued before tenancy belong to the default branch."""
+    return claims.get(TENANT_FIELD) or settings.DEFAULT_GYM_ID
+
+
 class NotVerified(Exception):
     pass
 
@@ -37,32 +57,52 @@ class UserNotFound(Exception):
     pass
 
 
-def require_user(Authorize: AuthJWT = Depends()):
+async def require_user(request: Request, Authorize: AuthJWT = Depends()):
     """
     Dependency to check if the user is authenticated.
     Returns the user ID if the user is authenticated and verified.
+    The user document is kept on `request.state.user` for the rest of the request, and the
+    request is scoped to the user's gym branch. (It is async so that scope, a context variable,
+    carries over to the handler.)
     """
+    # Sub-requests of a batch arrive already authenticated by the batch endpoint
+    authenticated_user = getattr(request.state, "user", None)
+    if authenticated_user is not None:
+        set_current_gym(authenticated_user[TENANT_FIELD])
+        return authenticated_user["id"]
+
     try:
         # Ensure the user is authenticated
         Authorize.jwt_required()
         
-        # Retrieve the user ID from the JWT token's subject (sub)
-        user_id = Authorize.get_jwt_subject()
-        
-        # Fetch the user document using the user_id
-        user = userEntity(User.find_one({'_id': ObjectId(str(user_id))}))
+        # Retrieve the user ID from the JWT token's subject (sub). Every AuthJWT accessor decodes and
+        # verifies the token again, so the claims are read once
+        claims = Authorize.get_raw_jwt()
+        user_id = claims["sub"]
+        set_current_gym(token_gym(claims))
+
+        # Fetch the user document using the user_id (within the token's branch)
+        db_user = User.find_one({'_id': ObjectId(str(user_id))}, USER_AUTH_PROJECTION)
 
         # Check if the user exists in the database
-        if not user:
+        if not db_user:
             raise UserNotFound('User no longer exists')
+        user = userEntity(db_user)
 
         # Check if the user's email is verified
         if not user["verified"]:
             raise NotVerified('You are not verified')
 
+    except (CircuitOpenError, ConnectionFailure) as e:
+        # The token can't be checked against the database right now, which is not the client's fault
+        logger.error("Authorization unavailable: {}", e)
+        headers = {"Retry-After": str(e.retry_after)} if isinstance(e, CircuitOpenError) else None
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='The database is unavailable, try again later.',
+            headers=headers)
     except Exception as e:
         error = e.__class__.__name__
-        logger.error(f"Authorization error: {error}")
+        logger.error("Authorization error: {}", error)
         if error == 'MissingTokenError':
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail='You are not logged in')
@@ -75,17 +115,53 @@ def require_user(Authorize: AuthJWT = Depends()):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail='Token is invalid or has expired')
 
+    request.state.user = user
+
     # Return only the user ID instead of the entire user object
     return user_id
 
-def require_admin(user: dict = Depends(require_user)):
+def require_admin(request: Request, user_id: str = Depends(require_user)):
     """
     Dependency to check if the user is an admin.
     Requires the user to be authenticated and have the role of 'ADMIN'.
     """
+    user = request.state.user
     if user.get("role") != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have the required permissions. Admin access is required."
         )
     return user
+
+
+def member_access(request: Request, user_id: Optional[str], authenticated_id: str, what: str) -> str:
+    """
+    Resolve the member whose `what` a request reads or logs: members get their own, trainers and
+    admins can pass the user_id of any member of their gym.
+    """
+    if not user_id or user_id == authenticated_id:
+        return authenticated_id
+    if request.state.user.get("role") not in ("TRAINER", "ADMIN"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"You can only access your own {what}."
+        )
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID format.")
+    if not User.find_one({"_id": ObjectId(user_id)}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
+    return user_id
+
+
+def require_trainer(request: Request, user_id: str = Depends(require_user)):
+    """
+    Dependency to check if the user can manage members' workouts.
+    Requires the user to be authenticated and have the role of 'TRAINER' or 'ADMIN'.
+    """
+    user = request.state.user
+    if user.get("role") not in ("TRAINER", "ADMIN"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have the required permissions. Trainer access is required."
+        )
+    return user
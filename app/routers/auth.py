@@ -3,6 +3,7 @@ from bson.objectid import ObjectId
 from fastapi import APIRouter, Response, status, Depends, HTTPException
 import loguru
 
+from app.utilities import dashboard
 from app.utilities.error_handler import handle_errors
 from app.utilities.email_services import send_email
 from app.utilities.utils import get_next_registration_id
@@ -12,7 +13,8 @@ from app.database import User
 from app.serializers.userSerializers import userEntity, userResponseEntity
 from app.utilities import utils
 from app.schemas import user
-from app.oauth2 import AuthJWT
+from app.oauth2 import AuthJWT, token_claims, token_gym
+from app.utilities.tenancy import set_current_gym
 from config import settings
 
 
@@ -57,9 +59,11 @@ async def create_user(payload: user.CreateUserSchema):
                     message=f"Hi {payload.name},\n\nThank you for registering with our gym app!\n\nDownload the app and start your fitness journey.\n\nBest regards,\nThe Gym Team"
                 )
             except Exception as e:
-                loguru.logger.error(f"Error sending email or reg id creation: {e}")
+                loguru.logger.error("Error sending email or reg id creation: {}", e)
 
         result = User.insert_one(payload.dict())
+        dashboard.count_member(payload.role)
+        dashboard.count_signup("users")
         new_user = userResponseEntity(
             User.find_one({'_id': result.inserted_id}))
         return {"status": "success", "user": new_user}
@@ -81,13 +85,15 @@ def login(payload: user.LoginUserSchema, response: Response, Authorize: AuthJWT
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                 detail='Incorrect Email or Password')
 
-        # Create access token
+        # Create access token (carrying the user's branch, which scopes all their requests)
         access_token = Authorize.create_access_token(
-            subject=str(user["id"]), expires_time=timedelta(minutes=ACCESS_TOKEN_EXPIRES_IN))
+            subject=str(user["id"]), expires_time=timedelta(minutes=ACCESS_TOKEN_EXPIRES_IN),
+            user_claims=token_claims(user))
 
         # Create refresh token
         refresh_token = Authorize.create_refresh_token(
-            subject=str(user["id"]), expires_time=timedelta(minutes=REFRESH_TOKEN_EXPIRES_IN))
+            subject=str(user["id"]), expires_time=timedelta(minutes=REFRESH_TOKEN_EXPIRES_IN),
+            user_claims=token_claims(user))
 
         # Store refresh and access tokens in cookie
         response.set_cookie('access_token', access_token, ACCESS_TOKEN_EXPIRES_IN * 60,
@@ -111,12 +117,14 @@ def refresh_token(response: Response, Authorize: AuthJWT = Depends()):
             if not user_id:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                     detail='Could not refresh access token')
+            set_current_gym(token_gym(Authorize.get_raw_jwt()))
             user = userEntity(User.find_one({'_id': ObjectId(str(user_id))}))
             if not user:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                     detail='The user belonging to this token no logger exist')
             access_token = Authorize.create_access_token(
-                subject=str(user["id"]), expires_time=timedelta(minutes=ACCESS_TOKEN_EXPIRES_IN))
+                subject=str(user["id"]), expires_time=timedelta(minutes=ACCESS_TOKEN_EXPIRES_IN),
+                user_claims=token_claims(user))
         except Exception as e:
             error = e.__class__.__name__
             if error == 'MissingTokenError':
@@ -0,0 +1,130 @@
+# app/routers/batch.py
+
+import asyncio
+import contextvars
+import threading
+from typing import Tuple
+from urllib.parse import urlsplit
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from app.schemas.batch import BatchRequestSchema, BatchItemSchema, BatchResponseSchema
+from app.utilities.error_handler import handle_errors
+from config import settings
+from .. import oauth2
+
+router = APIRouter()
+
+# Routes that cannot be part of a batch: the batch endpoint itself and the never-ending event stream
+EXCLUDED_PATHS = {"/api/batch", "/api/events"}
+
+# Headers of the batch request passed on to its sub-requests
+FORWARDED_HEADERS = {b"authorization", b"cookie", b"x-request-id", b"user-agent"}
+
+
+def _sub_request_scope(request: Request, item: BatchItemSchema, body: bytes) -> dict:
+    url = urlsplit(item.path)
+    headers = [(name, value) for name, value in request.scope["headers"] if name in FORWARDED_HEADERS]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": item.method.value,
+        "scheme": request.scope["scheme"],
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "headers": headers,
+        # The user authenticated by the batch request, picked up by oauth2.require_user
+        "state": {"user": request.state.user},
+    }
+
+
+# One event loop per threadpool thread, reused by every sub-request the thread runs
+_thread_loops = threading.local()
+
+
+def _thread_loop() -> asyncio.AbstractEventLoop:
+    loop = getattr(_thread_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _thread_loops.loop = asyncio.new_event_loop()
+    return loop
+
+
+def _run_sub_request(app, scope: dict, body: bytes) -> Tuple[int, str, bytes]:
+    """
+    Run one sub-request through the whole application (middlewares, routing, exception handlers)
+    on the event loop of the worker thread. The handlers make blocking MongoDB calls, so running each
+    sub-request in a worker thread is what lets their database round trips overlap.
+    """
+    response = {"status": 500, "content_type": "", "body": []}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            for name, value in message.get("headers", []):
+                if name == b"content-type":
+                    response["content_type"] = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    _thread_loop().run_until_complete(app(scope, receive, send))
+    return response["status"], response["content_type"], b"".join(response["body"])
+
+
+async def _execute(request: Request, item: BatchItemSchema) -> dict:
+    url = urlsplit(item.path)
+    if url.scheme or url.netloc or not url.path.startswith("/api/") or url.path in EXCLUDED_PATHS:
+        return {"id": item.id, "status": status.HTTP_400_BAD_REQUEST,
+                "body": {"detail": f"Path {item.path} cannot be part of a batch."}}
+
+    body = orjson.dumps(item.body) if item.body is not None else b""
+    scope = _sub_request_scope(request, item, body)
+    # Copy the context so log lines of the sub-request carry the batch's request ID
+    context = contextvars.copy_context()
+    status_code, content_type, content = await run_in_threadpool(
+        context.run, _run_sub_request, request.app, scope, body
+    )
+
+    response_body = None
+    if content and content_type.startswith("application/json"):
+        try:
+            response_body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Labeled JSON but isn't, returned as text below
+            pass
+    if content and response_body is None:
+        response_body = content.decode("utf-8", "replace")
+    return {"id": item.id, "status": status_code, "body": response_body}
+
+
+@router.post('/batch', response_model=BatchResponseSchema, status_code=status.HTTP_200_OK)
+async def batch(payload: BatchRequestSchema, request: Request, user_id: str = Depends(oauth2.require_user)):
+    """
+    Run several API requests in one round trip and return all of their responses, in request order.
+
+    The batch is authenticated once and its sub-requests reuse that user instead of looking it up again.
+    Sub-requests run concurrently, so they must not depend on each other's results.
+    Each one gets its own status code; the batch itself succeeds even when some of them fail.
+    """
+    with handle_errors():
+        if not payload.requests:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The batch has no requests.")
+        if len(payload.requests) > settings.BATCH_MAX_REQUESTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"A batch can hold at most {settings.BATCH_MAX_REQUESTS} requests."
+            )
+
+        responses = await asyncio.gather(*[_execute(request, item) for item in payload.requests])
+        return {"status": "success", "responses": responses}
@@ -0,0 +1,137 @@
+# app/routers/body_metrics.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from loguru import logger
+
+from app.database import User, BodyMetrics
+from app.schemas.body_metrics import (
+    METRIC_FIELDS, BodyMetricSchema, BodyMetricSeriesSchema, MetricInterval
+)
+from app.utilities.error_handler import handle_errors
+from config import settings
+from .. import oauth2
+
+router = APIRouter()
+
+
+def _naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    # Stored datetimes are naive UTC, and so must be the ones compared with them
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _auto_interval(start: datetime, end: datetime) -> MetricInterval:
+    # Keep charts at a few hundred points at most, whatever the range
+    span = end - start
+    if span <= timedelta(days=90):
+        return MetricInterval.DAY
+    if span <= timedelta(days=730):
+        return MetricInterval.WEEK
+    return MetricInterval.MONTH
+
+
+def _weight_goal_progress(member_id: str) -> dict:
+    """Progress from the weight the workout plan started at toward its end_weight, using the latest measurement."""
+    member = User.find_one({"_id": ObjectId(member_id)}, {"workout_plan.current_weight": 1, "workout_plan.end_weight": 1})
+    workout_plan = (member or {}).get("workout_plan") or {}
+    latest = BodyMetrics.find_one(
+        {"user_id": member_id, "weight": {"$ne": None}}, {"weight": 1, "measured_at": 1},
+        sort=[("measured_at", -1)]
+    )
+
+    progress = {
+        "start_weight": workout_plan.get("current_weight"),
+        "end_weight": workout_plan.get("end_weight"),
+        "latest_weight": latest["weight"] if latest else None,
+        "latest_measured_at": latest["measured_at"] if latest else None,
+    }
+    start, target, current = progress["start_weight"], progress["end_weight"], progress["latest_weight"]
+    if target is not None and current is not None:
+        progress["remaining"] = round(abs(current - target), 2)
+        if start is not None and start != target:
+            percent = (start - current) / (start - target) * 100
+            progress["percent_complete"] = round(min(max(percent, 0), 100), 1)
+    return progress
+
+
+@router.post('/body-metrics', status_code=status.HTTP_201_CREATED)
+async def log_body_metrics(
+    payload: BodyMetricSchema,
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Member to log the measurement for (trainers and admins only)"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Log a body weight and/or body measurements for a member.
+    """
+    with handle_errors():
+        member_id = oauth2.member_access(request, user_id, authenticated_id, "body metrics")
+        logger.info("Logging body metrics for user ID: {}", member_id)
+
+        measurement = {field: getattr(payload, field) for field in METRIC_FIELDS if getattr(payload, field) is not None}
+        measurement["user_id"] = member_id
+        measurement["measured_at"] = payload.measured_at or datetime.utcnow()
+        measurement["logged_by"] = authenticated_id
+        BodyMetrics.insert_one(measurement)
+
+        return {"message": "Body metrics logged successfully!"}
+
+
+@router.get('/body-metrics', response_model=BodyMetricSeriesSchema)
+def get_body_metrics(
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Member to read the metrics of (trainers and admins only)"),
+    start: Optional[datetime] = Query(None, description="Start of the range. Defaults to 90 days before the end."),
+    end: Optional[datetime] = Query(None, description="End of the range. Defaults to now."),
+    interval: MetricInterval = Query(MetricInterval.AUTO, description="Averaging interval of the returned series"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Retrieve a member's body metrics over a range, averaged per day, week or month by the database,
+    along with their progress toward the workout plan's end_weight.
+    """
+    with handle_errors():
+        member_id = oauth2.member_access(request, user_id, authenticated_id, "body metrics")
+        end = _naive_utc(end) or datetime.utcnow()
+        start = _naive_utc(start) or end - timedelta(days=90)
+        if start >= end:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The start must be before the end.")
+        if interval == MetricInterval.AUTO:
+            interval = _auto_interval(start, end)
+
+        match = {"$match": {"user_id": member_id, "measured_at": {"$gte": start, "$lt": end}}}
+        if interval == MetricInterval.RAW:
+            points = list(BodyMetrics.aggregate([
+                match,
+                {"$sort": {"measured_at": 1}},
+                {"$limit": settings.BODY_METRICS_RAW_MAX_POINTS + 1},
+                {"$project": {"_id": 0, "measured_at": 1, **{field: 1 for field in METRIC_FIELDS}}},
+            ]))
+            if len(points) > settings.BODY_METRICS_RAW_MAX_POINTS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Too many measurements in this range, use a day, week or month interval."
+                )
+        else:
+            # Downsample in the database: one averaged point per interval, bucketed in the gym's timezone
+            averages = {field: {"$avg": f"${field}"} for field in METRIC_FIELDS}
+            points = list(BodyMetrics.aggregate([
+                match,
+                {"$group": {
+                    "_id": {"$dateTrunc": {"date": "$measured_at", "unit": interval.value,
+                                           "timezone": settings.GYM_TIMEZONE, "startOfWeek": "monday"}},
+                    "count": {"$sum": 1},
+                    "weight_min": {"$min": "$weight"},
+                    "weight_max": {"$max": "$weight"},
+                    **averages,
+                }},
+                {"$sort": {"_id": 1}},
+                {"$set": {"measured_at": "$_id", **{field: {"$round": [f"${field}", 2]} for field in METRIC_FIELDS}}},
+                {"$unset": "_id"},
+            ]))
+
+        return {"status": "success", "interval": interval, "points": points, "progress": _weight_goal_progress(member_id)}
@@ -0,0 +1,63 @@
+# app/routers/checkin.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from bson.objectid import ObjectId
+from datetime import date, timedelta
+from typing import Optional
+
+from app.database import AttendanceDays
+from app.schemas.checkin import AttendanceResponseSchema, CheckinResponseSchema, CheckinSchema
+from app.utilities.checkin import checkin_buffer, checkin_document
+from app.utilities.error_handler import handle_errors
+from app.utilities.leaderboard import local_today
+from .. import oauth2
+
+router = APIRouter()
+
+
+@router.post('/checkin', status_code=status.HTTP_202_ACCEPTED, response_model=CheckinResponseSchema)
+async def check_in(
+    request: Request,
+    response: Response,
+    payload: CheckinSchema = CheckinSchema(),
+    durable: bool = Query(False, description="Store the check-in before answering (201) instead of buffering it (202)"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Record a member's attendance. Built for the morning rush: check-ins are buffered in memory and
+    written in batches within a second, unless `durable` asks for this one to be stored right away.
+    """
+    with handle_errors():
+        member_id = oauth2.member_access(request, payload.user_id, authenticated_id, "check-ins")
+        if payload.slot_id is not None and not ObjectId.is_valid(payload.slot_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid slot ID format.")
+
+        checkin = checkin_document(member_id, authenticated_id, payload.slot_id)
+        if durable:
+            checkin_buffer.write_now(checkin)
+            response.status_code = status.HTTP_201_CREATED
+        else:
+            checkin_buffer.add(checkin)
+        return {"status": "recorded" if durable else "accepted", "user_id": member_id, "date": checkin["date"]}
+
+
+@router.get('/checkin/attendance', response_model=AttendanceResponseSchema)
+async def get_attendance(
+    start: Optional[date] = Query(None, description="First day. Defaults to 30 days before the end."),
+    end: Optional[date] = Query(None, description="Last day. Defaults to today."),
+    user: dict = Depends(oauth2.require_trainer)
+):
+    """
+    Retrieve the daily attendance counters (check-ins per day and per hour). Only accessible by trainers and admins.
+    Buffered check-ins are counted once written, within a second or so.
+    """
+    with handle_errors():
+        end = end or local_today()
+        start = start or end - timedelta(days=30)
+        if start > end:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The start must be before the end.")
+
+        days = AttendanceDays.find(
+            {"date": {"$gte": start.isoformat(), "$lte": end.isoformat()}}, {"_id": 0, "gym_id": 0}
+        ).sort("date", 1)
+        return {"status": "success", "days": list(days)}
@@ -0,0 +1,25 @@
+# app/routers/dashboard.py
+
+from fastapi import APIRouter, Depends, Query
+
+from app.schemas.dashboard import DashboardStatsSchema
+from app.utilities.dashboard import read_stats
+from app.utilities.error_handler import handle_errors
+from config import settings
+from .. import oauth2
+
+router = APIRouter()
+
+
+@router.get('/dashboard', response_model=DashboardStatsSchema)
+async def get_dashboard_stats(
+    days: int = Query(30, ge=1, le=settings.DASHBOARD_RECONCILE_DAYS, description="Days of daily registrations to return"),
+    user: dict = Depends(oauth2.require_admin)
+):
+    """
+    Retrieve the admin dashboard figures: members by role, daily registrations, active plans and
+    screening completion. Read from counters kept up to date on write, so the cost doesn't grow with the data.
+    Only accessible by admin users.
+    """
+    with handle_errors():
+        return {"status": "success", **read_stats(days)}
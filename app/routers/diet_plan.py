@@ -1,18 +1,87 @@
 # app/routers/diet_plan.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from bson.objectid import ObjectId
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from loguru import logger
 
-from app.database import User, DietPlans
-from app.schemas.diet_plan import DietPlanSchema, DietPlanResponseSchema
+from app.database import User, DietPlans, ArchivedDietPlans, DIET_PLAN_FILTER_INDEXES
+from app.schemas.diet_plan import DietPlanSchema, DietPlanResponseSchema, ArchivedDietPlansResponse
+from app.utilities import dashboard
+from app.utilities.catalog_cache import food_lookup
 from app.utilities.error_handler import handle_errors
+from app.utilities.events import event_bus
+from app.utilities.fields import FIELDS_DESCRIPTION, parse_fields, partial_model, projection, select
+from app.utilities.portions import normalize_portion, portion_factor, scale_nutrients
+from app.utilities.sync import next_seq, record_tombstone
+from app.utilities.query_guard import check_query
+from app.utilities.responses import TrustedJSONResponse, trusted_response
 from .. import oauth2
 
 router = APIRouter()
 
+
+def _meal_references(meals: List[dict], frozen: bool) -> List[dict]:
+    """
+    Turn the submitted meals into the stored form: a reference to the catalog food item with the
+    prescribed quantity in canonical units, plus a snapshot of the item when the plan is frozen.
+    Unknown food IDs are rejected.
+    """
+    foods = food_lookup.get_many([meal["food_id"] for meal in meals])
+    unknown = sorted({meal["food_id"] for meal in meals if meal["food_id"] not in foods})
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown food item IDs: {', '.join(unknown)}"
+        )
+
+    references = []
+    for meal in meals:
+        reference = {
+            "food_id": meal["food_id"], "quantity": meal.get("quantity"), "meal_slot": meal.get("meal_slot"),
+            "portion": normalize_portion(meal.get("quantity"), foods[meal["food_id"]]),
+        }
+        if frozen:
+            reference["snapshot"] = foods[meal["food_id"]]
+        references.append(reference)
+    return references
+
+
+def _resolve_meals(diet_plans: List[dict]) -> List[dict]:
+    """
+    Attach the food item to every meal of the given plans, with a single catalog lookup for all of them,
+    and the nutrients of the prescribed quantity, scaled from the stored portions in one array product.
+    """
+    food_ids = {
+        meal["food_id"]
+        for plan in diet_plans for meal in plan.get("meals") or []
+        if meal.get("food_id") and "snapshot" not in meal
+    }
+    foods = food_lookup.get_many(food_ids)
+
+    for plan in diet_plans:
+        resolved = []
+        for meal in plan.get("meals") or []:
+            if "food_id" not in meal:
+                # Plans written before meals became references embed the whole food item
+                resolved.append({"food_id": None, "quantity": meal.get("quantity"), "meal_slot": None, "food": meal, "portion": None})
+                continue
+            food = meal.get("snapshot") or foods.get(meal["food_id"])
+            resolved.append({"food_id": meal["food_id"], "quantity": meal.get("quantity"),
+                             "meal_slot": meal.get("meal_slot"), "food": food, "portion": meal.get("portion")})
+        plan["meals"] = resolved
+
+    meals = [meal for plan in diet_plans for meal in plan["meals"]]
+    # Meals without a quantity of their own, and legacy meals embedding the food item, get the item's quantity
+    factors = [
+        portion_factor(meal["portion"], (meal["food"] or {}).get("portion")) if meal["food_id"] and meal["quantity"] else 1.0
+        for meal in meals
+    ]
+    for meal, nutrients in zip(meals, scale_nutrients([meal["food"] for meal in meals], factors)):
+        meal["nutrients"] = nutrients
+    return diet_plans
+
 # Create a new diet plan
 @router.post('/diet-plan', status_code=status.HTTP_201_CREATED, response_model=DietPlanResponseSchema)
 async def create_diet_plan(
@@ -23,7 +92,7 @@ async def create_diet_plan(
     Create a new diet plan for a specific user.
     """
     with handle_errors():
-        logger.info(f"Creating diet plan for user ID: {user_id}")
+        logger.info("Creating diet plan for user ID: {}", user_id)
 
         # Convert user_id to ObjectId for MongoDB operations
         try:
@@ -41,32 +110,80 @@ async def create_diet_plan(
 
         # Convert start_date and end_date to strings if they are `datetime` objects
         diet_plan_data = payload.dict()
+        diet_plan_data["meals"] = _meal_references(diet_plan_data["meals"] or [], diet_plan_data["frozen"])
         diet_plan_data["created_at"] = datetime.utcnow().isoformat()
         diet_plan_data["updated_at"] = datetime.utcnow().isoformat()
+        diet_plan_data["seq"] = next_seq()
 
         # Insert diet plan into DietPlans collection
         result = DietPlans.insert_one(diet_plan_data)
+        dashboard.count_plans("diet_plans")
         new_diet_plan = DietPlans.find_one({"_id": result.inserted_id})
+        event_bus.publish(str(user_id), "diet_plan.updated", {"id": str(result.inserted_id), "seq": diet_plan_data["seq"]})
 
-        return DietPlanResponseSchema(id=str(new_diet_plan["_id"]), **new_diet_plan)
+        return DietPlanResponseSchema(id=str(new_diet_plan["_id"]), **_resolve_meals([new_diet_plan])[0])
 
 
 # Retrieve all diet plans for a user
-@router.get('/diet-plans', response_model=List[DietPlanResponseSchema])
+@router.get('/diet-plans', response_model=List[partial_model(DietPlanResponseSchema)], response_model_exclude_unset=True)
 async def get_all_diet_plans(
-    user_id: str = Query(..., description="User ID to get diet plans for")
+    user_id: str = Query(..., description="User ID to get diet plans for"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
     """
     Retrieve all diet plans for a specific user.
+    Meals are only resolved against the food catalog when they are requested.
     """
     with handle_errors():
+        names = parse_fields(fields, DietPlanResponseSchema.__fields__)
+
         try:
             user_id = ObjectId(user_id)
         except Exception:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID format.")
 
-        diet_plans = list(DietPlans.find({"user_id": str(user_id)}))
-        return [DietPlanResponseSchema(id=str(dp["_id"]), **dp) for dp in diet_plans]
+        query = check_query(DietPlans, DIET_PLAN_FILTER_INDEXES, {"user_id": str(user_id)})
+        if names:
+            diet_plans = list(DietPlans.find(query, projection(names)))
+            if "meals" in names:
+                _resolve_meals(diet_plans)
+            return TrustedJSONResponse([select(dp, names) for dp in diet_plans])
+
+        diet_plans = _resolve_meals(list(DietPlans.find(query)))
+        for dp in diet_plans:
+            dp["id"] = str(dp["_id"])
+        return trusted_response(DietPlanResponseSchema, diet_plans)
+
+
+# Retrieve a user's archived diet plans
+@router.get('/diet-plans/archive', response_model=ArchivedDietPlansResponse)
+async def get_archived_diet_plans(
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Member to read the archive of (trainers and admins only)"),
+    page: int = Query(1, ge=1, description="Page number for pagination"),
+    page_size: int = Query(10, ge=1, le=100, description="Number of diet plans per page"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Retrieve the diet plans that were archived after their end date, most recent first.
+    Archived meals keep the food item as it was when the plan was archived.
+    """
+    with handle_errors():
+        member_id = oauth2.member_access(request, user_id, authenticated_id, "diet plans")
+        query = {"user_id": member_id}
+        diet_plans = list(
+            ArchivedDietPlans.find(query).sort("end_date", -1).skip((page - 1) * page_size).limit(page_size)
+        )
+        for dp in _resolve_meals(diet_plans):
+            dp["id"] = str(dp["_id"])
+
+        return trusted_response(ArchivedDietPlansResponse, {
+            "status": "success",
+            "page": page,
+            "page_size": page_size,
+            "total": ArchivedDietPlans.count_documents(query),
+            "diet_plans": diet_plans
+        })
 
 
 # Update a diet plan
@@ -85,8 +202,21 @@ async def update_diet_plan(
         except Exception:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid diet plan ID format.")
 
-        # Remove None fields from the update payload
-        update_data = {k: v for k, v in payload.dict().items() if v is not None}
+        # Only the fields the client sent (the schema's defaults would reset meals and unfreeze the plan),
+        # without None fields
+        update_data = {k: v for k, v in payload.dict(exclude_unset=True).items() if v is not None}
+        if "meals" in update_data or "frozen" in update_data:
+            stored = DietPlans.find_one({"_id": diet_plan_obj_id, "user_id": user_id}, {"frozen": 1, "meals": 1})
+            if not stored:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Diet plan not found.")
+            frozen = update_data.get("frozen", stored.get("frozen", False))
+            if "meals" in update_data:
+                update_data["meals"] = _meal_references(update_data["meals"], frozen)
+            elif frozen != stored.get("frozen", False) and all("food_id" in meal for meal in stored.get("meals") or []):
+                # Freezing (or unfreezing) the stored meals adds (or drops) their snapshots
+                update_data["meals"] = _meal_references(stored.get("meals") or [], frozen)
+        update_data["updated_at"] = datetime.utcnow().isoformat()
+        update_data["seq"] = next_seq()
 
         # Update diet plan in the collection
         update_result = DietPlans.find_one_and_update(
@@ -100,8 +230,9 @@ async def update_diet_plan(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Diet plan not found."
             )
+        event_bus.publish(update_result["user_id"], "diet_plan.updated", {"id": diet_plan_id, "seq": update_data["seq"]})
 
-        return DietPlanResponseSchema(id=str(update_result["_id"]), **update_result)
+        return DietPlanResponseSchema(id=str(update_result["_id"]), **_resolve_meals([update_result])[0])
 
 
 # Delete a diet plan
@@ -119,11 +250,14 @@ async def delete_diet_plan(
         except Exception:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid diet plan ID format.")
 
-        delete_result = DietPlans.delete_one({"_id": diet_plan_obj_id, "user_id": user_id})
-        if delete_result.deleted_count == 0:
+        deleted_plan = DietPlans.find_one_and_delete({"_id": diet_plan_obj_id, "user_id": user_id}, {"user_id": 1})
+        if not deleted_plan:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Diet plan not found."
             )
+        dashboard.count_plans("diet_plans", -1)
+        seq = record_tombstone("diet_plans", diet_plan_obj_id, user_id=deleted_plan["user_id"])
+        event_bus.publish(deleted_plan["user_id"], "diet_plan.deleted", {"id": diet_plan_id, "seq": seq})
 
         return {"message": "Diet plan deleted successfully!"}
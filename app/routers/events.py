@@ -0,0 +1,43 @@
+# app/routers/events.py
+
+import asyncio
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from app.utilities.events import event_bus
+from config import settings
+from .. import oauth2
+
+router = APIRouter()
+
+
+async def _event_stream(request: Request, user_id: str):
+    queue = event_bus.subscribe(user_id)
+    try:
+        # Ask the browser to wait a few seconds before reconnecting after a drop
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                # Comment line keeping proxies from closing the idle connection
+                yield ": heartbeat\n\n"
+                continue
+            yield message
+    finally:
+        event_bus.unsubscribe(user_id, queue)
+
+
+@router.get('/events')
+async def stream_events(request: Request, user_id: str = Depends(oauth2.require_user)):
+    """
+    Server-sent events stream of the authenticated member's plan and progress updates.
+    Events carry the change sequence number; the changed data itself is fetched through the sync API.
+    """
+    return StreamingResponse(
+        _event_stream(request, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from bson.objectid import ObjectId
 from datetime import datetime
 from typing import List, Optional
 from loguru import logger
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
-from app.database import User, Exercises
-from app.schemas.exercise import DayProgressSchema, ExerciseCreateSchema, ExerciseUpdateSchema, ExerciseResponseSchema
+from app.database import User, Exercises, EXERCISE_FILTER_INDEXES
+from app.schemas.exercise import BulkProgressSchema, DayProgressSchema, ExerciseCreateSchema, ExerciseUpdateSchema, ExerciseResponseSchema
 from app.schemas.workout_plan import WorkoutPlanSchema
+from app.utilities import dashboard
+from app.utilities.catalog_cache import exercise_catalog
 from app.utilities.error_handler import handle_errors
+from app.utilities.events import event_bus
+from app.utilities.fields import FIELDS_DESCRIPTION, parse_fields, partial_model, projection, select
+from app.utilities.leaderboard import record_progress
+from app.utilities.sync import next_seq, record_tombstone, sync_stamp
+from app.utilities.log import sampled
+from app.utilities.query_guard import check_query
+from app.utilities.responses import TrustedJSONResponse, trusted_response
+from config import settings
 from .. import oauth2
 
 # Initialize the router
@@ -23,7 +35,7 @@ async def add_workout_plan(
     """
     with handle_errors():
         # Log user_id for debugging
-        logger.info(f"Adding workout plan for user ID: {user_id}")
+        logger.info("Adding workout plan for user ID: {}", user_id)
         
         # Convert user_id to ObjectId for MongoDB operations
         user_id = ObjectId(user_id)
@@ -40,6 +52,7 @@ async def add_workout_plan(
         workout_plan_data = payload.dict()
         workout_plan_data["created_at"] = datetime.utcnow()
         workout_plan_data["updated_at"] = datetime.utcnow()
+        workout_plan_data["seq"] = next_seq()
 
         # Update the user document with the new workout plan
         update_result = User.update_one(
@@ -52,6 +65,9 @@ async def add_workout_plan(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to add workout plan."
             )
+        if "workout_plan" not in existing_user:
+            dashboard.count_plans("workout_plans")
+        event_bus.publish(str(user_id), "workout_plan.updated", {"seq": workout_plan_data["seq"]})
 
         return {"message": "Workout plan added successfully!"}
 
@@ -65,7 +81,7 @@ async def add_workout_progress(
     """
     with handle_errors():
         # Log user_id for debugging
-        logger.info(f"Adding workout progress for user ID: {user_id}")
+        logger.info("Adding workout progress for user ID: {}", user_id)
 
         # Convert user_id to ObjectId for MongoDB operations
         user_id = ObjectId(user_id)
@@ -94,13 +110,14 @@ async def add_workout_progress(
         day_exists = False
         for day_progress in workout_plan["progress"]:
             if day_progress["day"] == payload.day:
-                day_progress["exercises"] = payload.exercises
+                day_progress["exercises"] = [exercise.dict() for exercise in payload.exercises]
                 day_exists = True
                 break
 
         # If day does not exist, append the new day progress
         if not day_exists:
             workout_plan["progress"].append(payload.dict())
+        workout_plan.update(sync_stamp())
 
         # Update the workout plan in the user document
         update_result = User.update_one(
@@ -113,6 +130,8 @@ async def add_workout_progress(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to add workout progress."
             )
+        event_bus.publish(str(user_id), "workout_progress.updated", {"day": payload.day, "seq": workout_plan["seq"]})
+        record_progress([(str(user_id), payload.day, [exercise.dict() for exercise in payload.exercises])])
 
         return {"message": "Workout progress added successfully!"}
 
@@ -126,7 +145,7 @@ async def edit_workout_progress(
     """
     with handle_errors():
         # Log user_id for debugging
-        logger.info(f"Editing workout progress for user ID: {user_id}")
+        logger.info("Editing workout progress for user ID: {}", user_id)
 
         # Convert user_id to ObjectId for MongoDB operations
         user_id = ObjectId(user_id)
@@ -158,7 +177,7 @@ async def edit_workout_progress(
         day_exists = False
         for day_progress in workout_plan["progress"]:
             if day_progress["day"] == payload.day:
-                day_progress["exercises"] = payload.exercises
+                day_progress["exercises"] = [exercise.dict() for exercise in payload.exercises]
                 day_exists = True
                 break
 
@@ -167,6 +186,7 @@ async def edit_workout_progress(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No progress found for the day: {payload.day}"
             )
+        workout_plan.update(sync_stamp())
 
         # Update the workout plan in the user document
         update_result = User.update_one(
@@ -179,9 +199,114 @@ async def edit_workout_progress(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to edit workout progress."
             )
+        event_bus.publish(str(user_id), "workout_progress.updated", {"day": payload.day, "seq": workout_plan["seq"]})
+        record_progress([(str(user_id), payload.day, [exercise.dict() for exercise in payload.exercises])])
 
         return {"message": "Workout progress updated successfully!"}
 
+@router.post('/workout-plan/progress/bulk', status_code=status.HTTP_200_OK)
+async def add_bulk_workout_progress(
+    payload: BulkProgressSchema,
+    trainer: dict = Depends(oauth2.require_trainer)
+):
+    """
+    Log a day's workout progress for many members at once, e.g. a whole group class.
+    Each entry sets the exercises of its day in the member's plan, or adds the day when it has no progress yet.
+
+    All entries are applied with a single unordered bulk write of targeted updates (no plan is read
+    and rewritten as a whole). Returns the outcome of every entry, in request order.
+    """
+    with handle_errors():
+        logger.info("Logging bulk workout progress for {} entries by user ID: {}", len(payload.entries), trainer["id"])
+
+        if len(payload.entries) > settings.BULK_PROGRESS_MAX_ENTRIES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {settings.BULK_PROGRESS_MAX_ENTRIES} entries can be logged at once."
+            )
+
+        results = [{"user_id": entry.user_id, "day": entry.day, "status": None} for entry in payload.entries]
+
+        # Validate the member IDs and reject entries logging the same member and day twice
+        seen = set()
+        member_ids = set()
+        for entry, result in zip(payload.entries, results):
+            if not ObjectId.is_valid(entry.user_id):
+                result["status"] = "invalid_user_id"
+            elif (entry.user_id, entry.day) in seen:
+                result["status"] = "duplicate"
+            else:
+                seen.add((entry.user_id, entry.day))
+                member_ids.add(ObjectId(entry.user_id))
+
+        # One read for the days already logged in every member's plan
+        logged_days = {
+            str(member["_id"]): {day_progress.get("day") for day_progress in member["workout_plan"].get("progress") or []}
+            for member in User.find(
+                {"_id": {"$in": list(member_ids)}, "workout_plan": {"$exists": True}},
+                {"workout_plan.progress.day": 1}
+            )
+        }
+
+        stamp = sync_stamp()
+        # Each bulk write operation, with the result and the exercises of its entry
+        operations, operation_entries = [], []
+        for entry, result in zip(payload.entries, results):
+            if result["status"]:
+                continue
+            if entry.user_id not in logged_days:
+                result["status"] = "not_found"
+                continue
+
+            exercises = [exercise.dict() for exercise in entry.exercises]
+            stamp_fields = {"workout_plan.seq": stamp["seq"], "workout_plan.updated_at": stamp["updated_at"]}
+            if entry.day in logged_days[entry.user_id]:
+                operations.append(UpdateOne(
+                    {"_id": ObjectId(entry.user_id), "workout_plan.progress.day": entry.day},
+                    {"$set": {"workout_plan.progress.$.exercises": exercises, **stamp_fields}}
+                ))
+                result["status"] = "updated"
+            else:
+                # Only push the day if it still has no progress, so a concurrent request can't add it twice
+                operations.append(UpdateOne(
+                    {"_id": ObjectId(entry.user_id), "workout_plan": {"$exists": True},
+                     "workout_plan.progress.day": {"$ne": entry.day}},
+                    {"$push": {"workout_plan.progress": {"day": entry.day, "exercises": exercises}}, "$set": stamp_fields}
+                ))
+                result["status"] = "added"
+            operation_entries.append((result, exercises))
+
+        if operations:
+            try:
+                User.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details["writeErrors"]:
+                    result, _ = operation_entries[error["index"]]
+                    result["status"] = "failed"
+                    logger.error("Bulk progress update failed for user ID {}: {}", result["user_id"], error["errmsg"])
+
+            # Updates whose filter no longer matched (the plan changed since it was read) did not apply
+            applied = {
+                str(member["_id"]): {day_progress.get("day"): day_progress.get("exercises")
+                                     for day_progress in member["workout_plan"].get("progress") or []}
+                for member in User.find(
+                    {"_id": {"$in": list(member_ids)}, "workout_plan": {"$exists": True}},
+                    {"workout_plan.progress": 1}
+                )
+            }
+            for result, exercises in operation_entries:
+                if result["status"] != "failed" and applied.get(result["user_id"], {}).get(result["day"]) != exercises:
+                    result["status"] = "conflict"
+
+        logged_entries = [(result["user_id"], result["day"], exercises)
+                          for result, exercises in operation_entries if result["status"] in ("updated", "added")]
+        for member_id, day, _ in logged_entries:
+            event_bus.publish(member_id, "workout_progress.updated", {"day": day, "seq": stamp["seq"]})
+        record_progress(logged_entries)
+
+        logged = sum(1 for result in results if result["status"] in ("updated", "added"))
+        return {"status": "success", "logged": logged, "results": results}
+
 
 # Exercise CRUD operations:
 
@@ -194,29 +319,40 @@ async def create_exercise(
     Create a new exercise.
     """
     with handle_errors():
-        logger.info(f"Creating a new exercise by user ID: {user_id}")
+        logger.info("Creating a new exercise by user ID: {}", user_id)
 
         # Prepare exercise data
         exercise_data = payload.dict()
+        exercise_data.update(sync_stamp())
 
         # Insert new exercise into the Exercises collection
         result = Exercises.insert_one(exercise_data)
         new_exercise = Exercises.find_one({'_id': result.inserted_id})
+        exercise_catalog.invalidate()
+        event_bus.broadcast("exercises.updated", {"seq": exercise_data["seq"]})
 
         return ExerciseResponseSchema(id=str(new_exercise['_id']), **new_exercise)
 
 
-@router.get('/exercises', response_model=List[ExerciseResponseSchema])
+@router.get('/exercises', response_model=List[partial_model(ExerciseResponseSchema)], response_model_exclude_unset=True)
 async def get_all_exercises(
+    request: Request,
     type: Optional[str] = None,
     category: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     user_id: str = Depends(oauth2.require_user)
 ):
     """
     Retrieve all exercises, optionally filtered by type and category.
+    The unfiltered catalog is served from a pre-serialized, pre-compressed snapshot
+    (unless only some fields are requested).
     """
     with handle_errors():
-        logger.info(f"Retrieving exercises with filters: type={type}, category={category}")
+        sampled().info("Retrieving exercises with filters: type={}, category={}", type, category)
+        names = parse_fields(fields, ExerciseResponseSchema.__fields__)
+
+        if not type and not category and not names:
+            return exercise_catalog.response(request)
 
         # Construct query filter
         query = {}
@@ -224,40 +360,51 @@ async def get_all_exercises(
             query['type'] = type
         if category:
             query['category'] = category
+        check_query(Exercises, EXERCISE_FILTER_INDEXES, query)
 
         # Fetch exercises from the collection
+        if names:
+            return TrustedJSONResponse([select(ex, names) for ex in Exercises.find(query, projection(names))])
         exercises = list(Exercises.find(query))
-        return [ExerciseResponseSchema(id=str(ex['_id']), **ex) for ex in exercises]
+        for ex in exercises:
+            ex['id'] = str(ex['_id'])
+        return trusted_response(ExerciseResponseSchema, exercises)
 
 
-@router.get('/exercise/{exercise_id}', response_model=ExerciseResponseSchema)
+@router.get('/exercise/{exercise_id}', response_model=partial_model(ExerciseResponseSchema), response_model_exclude_unset=True)
 async def get_single_exercise(
     exercise_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     user_id: str = Depends(oauth2.require_user)
 ):
     """
     Retrieve a single exercise by its unique ID.
     """
     with handle_errors():
+        names = parse_fields(fields, ExerciseResponseSchema.__fields__)
+
         # Convert exercise_id to ObjectId for MongoDB operations
         try:
             exercise_obj_id = ObjectId(exercise_id)
         except Exception as e:
-            logger.error(f"Invalid ObjectId: {e}")
+            logger.error("Invalid ObjectId: {}", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid exercise ID format."
             )
 
         # Find the exercise by ID
-        exercise = Exercises.find_one({"_id": exercise_obj_id})
+        exercise = Exercises.find_one({"_id": exercise_obj_id}, projection(names) if names else None)
         if not exercise:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Exercise not found."
             )
 
-        return ExerciseResponseSchema(id=str(exercise['_id']), **exercise)
+        if names:
+            return TrustedJSONResponse(select(exercise, names))
+        exercise['id'] = str(exercise['_id'])
+        return trusted_response(ExerciseResponseSchema, exercise)
 
 
 @router.put('/exercise/{exercise_id}', response_model=ExerciseResponseSchema)
@@ -270,13 +417,13 @@ async def update_exercise(
     Update an existing exercise.
     """
     with handle_errors():
-        logger.info(f"Updating exercise ID: {exercise_id} by user ID: {user_id}")
+        logger.info("Updating exercise ID: {} by user ID: {}", exercise_id, user_id)
 
         # Convert exercise_id to ObjectId for MongoDB operations
         try:
             exercise_obj_id = ObjectId(exercise_id)
         except Exception as e:
-            logger.error(f"Invalid ObjectId: {e}")
+            logger.error("Invalid ObjectId: {}", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid exercise ID format."
@@ -284,6 +431,7 @@ async def update_exercise(
 
         # Remove None fields from the update payload
         update_data = {k: v for k, v in payload.dict().items() if v is not None}
+        update_data.update(sync_stamp())
 
         # Update exercise in the collection
         update_result = Exercises.find_one_and_update(
@@ -297,6 +445,8 @@ async def update_exercise(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Exercise not found."
             )
+        exercise_catalog.invalidate()
+        event_bus.broadcast("exercises.updated", {"seq": update_data["seq"]})
 
         return ExerciseResponseSchema(id=str(update_result['_id']), **update_result)
 
@@ -310,13 +460,13 @@ async def delete_exercise(
     Delete an exercise by its ID.
     """
     with handle_errors():
-        logger.info(f"Deleting exercise ID: {exercise_id} by user ID: {user_id}")
+        logger.info("Deleting exercise ID: {} by user ID: {}", exercise_id, user_id)
 
         # Convert exercise_id to ObjectId for MongoDB operations
         try:
             exercise_obj_id = ObjectId(exercise_id)
         except Exception as e:
-            logger.error(f"Invalid ObjectId: {e}")
+            logger.error("Invalid ObjectId: {}", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid exercise ID format."
@@ -329,6 +479,9 @@ async def delete_exercise(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Exercise not found."
             )
+        seq = record_tombstone("exercises", exercise_obj_id)
+        exercise_catalog.invalidate()
+        event_bus.broadcast("exercises.updated", {"seq": seq})
 
         return {"message": "Exercise deleted successfully!"}
 
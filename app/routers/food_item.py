@@ -1,13 +1,20 @@
 # app/routers/food_item.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from bson.objectid import ObjectId
-from typing import List
+from typing import List, Optional
 from loguru import logger
 
-from app.database import FoodItems
-from app.schemas.diet_plan import FoodItemSchema
+from app.database import FoodItems, Screenings
+from app.schemas.diet_plan import FoodItemSchema, FoodSubstitutesResponse
+from app.schemas.screening import FoodPreferences
+from app.utilities.catalog_cache import food_catalog, food_lookup
 from app.utilities.error_handler import handle_errors
+from app.utilities.fields import FIELDS_DESCRIPTION, parse_fields, partial_model, projection, select
+from app.utilities.portions import NUTRIENT_FIELDS, normalize_portion
+from app.utilities.responses import TrustedJSONResponse, shape
+from app.utilities.substitutes import food_substitutes
+from app.utilities.sync import record_tombstone, sync_stamp
 from .. import oauth2
 
 router = APIRouter()
@@ -22,28 +29,86 @@ async def create_food_item(
     Create a new food item entry.
     """
     with handle_errors():
-        logger.info(f"Creating a new food item: {payload.food_name} by user ID: {user_id}")
+        logger.info("Creating a new food item: {} by user ID: {}", payload.food_name, user_id)
 
         # Prepare the food item data
         food_item_data = payload.dict()
+        food_item_data["portion"] = normalize_portion(payload.quantity, food_item_data)
+        food_item_data.update(sync_stamp())
 
         # Insert new food item into the FoodItems collection
         result = FoodItems.insert_one(food_item_data)
         new_food_item = FoodItems.find_one({'_id': result.inserted_id})
+        food_catalog.invalidate()
 
-        return {"message": "Food item added successfully!", "food_item": new_food_item}
+        return {
+            "message": "Food item added successfully!",
+            "food_item": {**shape(FoodItemSchema, new_food_item), "id": str(new_food_item["_id"])}
+        }
 
 
 # Retrieve all food items
-@router.get('/food-items', response_model=List[FoodItemSchema])
-async def get_all_food_items():
+@router.get('/food-items', response_model=List[partial_model(FoodItemSchema)], response_model_exclude_unset=True)
+async def get_all_food_items(request: Request, fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)):
     """
     Retrieve all food items from the collection.
+    Served from a pre-serialized, pre-compressed snapshot that is rebuilt only when the catalog changes
+    (unless only some fields are requested).
     """
     with handle_errors():
-        # Fetch all food items from the collection
-        food_items = list(FoodItems.find())
-        return food_items
+        names = parse_fields(fields, FoodItemSchema.__fields__)
+        if names:
+            return TrustedJSONResponse([select(item, names) for item in FoodItems.find({}, projection(names))])
+        return food_catalog.response(request)
+
+
+# Rank substitutes of a food item by nutrient similarity
+@router.get('/food-items/{food_item_id}/substitutes', response_model=FoodSubstitutesResponse)
+async def get_food_substitutes(
+    request: Request,
+    food_item_id: str,
+    limit: int = Query(10, ge=1, le=50, description="Number of substitutes to return"),
+    nutrients: Optional[str] = Query(None, description="Comma-separated nutrients to compare on, e.g. 'protein,energy_kcal'. Defaults to all."),
+    food_type: Optional[FoodPreferences] = Query(None, description="Diet the substitutes must fit. Defaults to the member's screening food preference."),
+    avoid: Optional[str] = Query(None, description="Comma-separated allergies to avoid. Defaults to the member's screening food allergies."),
+    user_id: Optional[str] = Query(None, description="Member whose screening answers apply (trainers and admins only)"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Find the catalog food items closest in nutrients to a food item, e.g. to swap paneer for something
+    with similar protein and kcal. Items that don't fit the member's diet or mention their allergies are left out;
+    items with no food_type are kept but marked unverified_diet.
+    """
+    with handle_errors():
+        names = [name.strip() for name in nutrients.split(",") if name.strip()] if nutrients else None
+        unknown = sorted(set(names or ()) - set(NUTRIENT_FIELDS))
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown nutrients: {', '.join(unknown)}")
+
+        if food_type is None or avoid is None:
+            member_id = oauth2.member_access(request, user_id, authenticated_id, "screening answers")
+            screening = Screenings.find_one({"user_id": member_id}, {"food_preferences": 1, "food_allergies": 1}) or {}
+            food_type = food_type or screening.get("food_preferences")
+            if avoid is None:
+                avoid = screening.get("food_allergies") or ""
+        diet = FoodPreferences(food_type).value if food_type else None
+        avoided = [allergy.strip() for allergy in avoid.split(",") if allergy.strip()]
+
+        ranked = food_substitutes.rank(food_item_id, limit, names, diet, avoided)
+        if ranked is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found.")
+
+        foods = food_lookup.get_many([food_id for food_id, _, _ in ranked])
+        return TrustedJSONResponse({
+            "status": "success",
+            "food_id": food_item_id,
+            "food_type": diet,
+            "avoided": avoided,
+            "substitutes": [
+                {**foods[food_id], "id": food_id, "distance": distance, "unverified_diet": unverified}
+                for food_id, distance, unverified in ranked if food_id in foods
+            ],
+        })
 
 
 # Update an existing food item
@@ -57,7 +122,7 @@ async def update_food_item(
     Update an existing food item by its ID.
     """
     with handle_errors():
-        logger.info(f"Updating food item ID: {food_item_id} by user ID: {user_id}")
+        logger.info("Updating food item ID: {} by user ID: {}", food_item_id, user_id)
 
         # Convert food_item_id to ObjectId for MongoDB operations
         try:
@@ -67,6 +132,10 @@ async def update_food_item(
 
         # Remove None fields from the update payload
         update_data = {k: v for k, v in payload.dict().items() if v is not None}
+        # The portion is weighed with the stored density and piece weight unless new ones are given
+        current = FoodItems.find_one({"_id": food_item_obj_id}, {"density": 1, "unit_weight": 1}) or {}
+        update_data["portion"] = normalize_portion(payload.quantity, {**current, **update_data})
+        update_data.update(sync_stamp())
 
         # Update food item in the collection
         update_result = FoodItems.find_one_and_update(
@@ -80,6 +149,7 @@ async def update_food_item(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Food item not found."
             )
+        food_catalog.invalidate()
 
         return update_result
 
@@ -94,7 +164,7 @@ async def delete_food_item(
     Delete a food item by its ID.
     """
     with handle_errors():
-        logger.info(f"Deleting food item ID: {food_item_id} by user ID: {user_id}")
+        logger.info("Deleting food item ID: {} by user ID: {}", food_item_id, user_id)
 
         # Convert food_item_id to ObjectId for MongoDB operations
         try:
@@ -109,5 +179,7 @@ async def delete_food_item(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Food item not found."
             )
+        record_tombstone("food_items", food_item_obj_id)
+        food_catalog.invalidate()
 
         return {"message": "Food item deleted successfully!"}
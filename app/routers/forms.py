@@ -1,31 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import io
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from bson.objectid import ObjectId
 from datetime import datetime
-from app.database import Forms
+from typing import Optional
+import orjson
+from pydantic import ValidationError
+from app.database import Forms, FormSubmissions
 from app.schemas import forms as form_schema
 from app.utilities.error_handler import handle_errors
+from app.utilities.fields import FIELDS_DESCRIPTION, parse_fields, partial_model, projection, select
+from app.utilities.form_validators import form_validators, validate_answers
+from app.utilities.responses import TrustedJSONResponse, trusted_response
+from app.utilities.sync import next_seq, record_tombstone
 from app.serializers.formSerializers import formResponseEntity
 from .. import oauth2
 
 router = APIRouter()
 
 
-@router.get('/', response_model=list[form_schema.FormResponseSchema])
-def get_all_forms(user: dict = Depends(oauth2.require_admin)):
+@router.get('/', response_model=list[partial_model(form_schema.FormResponseSchema)], response_model_exclude_unset=True)
+def get_all_forms(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    user: dict = Depends(oauth2.require_admin)
+):
     """Retrieve all forms. Only accessible by admin users."""
     with handle_errors():
+        names = parse_fields(fields, form_schema.FormResponseSchema.__fields__)
+        if names:
+            return TrustedJSONResponse([select(form, names) for form in Forms.find({}, projection(names))])
         forms = list(Forms.find())
-        return [formResponseEntity(form) for form in forms]
+        return trusted_response(form_schema.FormResponseSchema, [formResponseEntity(form) for form in forms])
 
 
-@router.get('/{form_id}', response_model=form_schema.FormResponseSchema)
-def get_form(form_id: str, user: dict = Depends(oauth2.require_admin)):
+@router.get('/{form_id}', response_model=partial_model(form_schema.FormResponseSchema), response_model_exclude_unset=True)
+def get_form(
+    form_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    user: dict = Depends(oauth2.require_admin)
+):
     """Retrieve a single form by its ID. Only accessible by admin users."""
     with handle_errors():
-        form = Forms.find_one({"_id": ObjectId(form_id)})
+        names = parse_fields(fields, form_schema.FormResponseSchema.__fields__)
+        form = Forms.find_one({"_id": ObjectId(form_id)}, projection(names) if names else None)
         if not form:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
-        return formResponseEntity(form)
+        if names:
+            return TrustedJSONResponse(select(form, names))
+        return trusted_response(form_schema.FormResponseSchema, formResponseEntity(form))
 
 
 @router.post('/', response_model=form_schema.FormResponseSchema, status_code=status.HTTP_201_CREATED)
@@ -38,6 +61,7 @@ async def create_form(payload: form_schema.FormCreateSchema, user: dict = Depend
         
         # Insert new form into the database
         form_data = payload.dict()
+        form_data["seq"] = next_seq()
         result = Forms.insert_one(form_data)
         new_form = Forms.find_one({'_id': result.inserted_id})
 
@@ -53,6 +77,7 @@ async def edit_form(form_id: str, payload: form_schema.FormUpdateSchema, user: d
         
         # Remove None fields from update data
         update_data = {k: v for k, v in payload.dict().items() if v is not None}
+        update_data["seq"] = next_seq()
         
         # Find and update the form
         updated_form = Forms.find_one_and_update(
@@ -63,6 +88,7 @@ async def edit_form(form_id: str, payload: form_schema.FormUpdateSchema, user: d
         
         if not updated_form:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
+        form_validators.invalidate(form_id)
 
         return formResponseEntity(updated_form)
 
@@ -74,4 +100,113 @@ async def delete_form(form_id: str, user: dict = Depends(oauth2.require_admin)):
         result = Forms.delete_one({"_id": ObjectId(form_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
+        record_tombstone("forms", form_id)
+        form_validators.invalidate(form_id)
         return {"message": "Form deleted successfully"}
+
+
+def _form_id(form_id: str) -> ObjectId:
+    if not ObjectId.is_valid(form_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid form ID format.")
+    return ObjectId(form_id)
+
+
+def _submission_response(submission: dict) -> dict:
+    return {"id": str(submission["_id"]), **{key: value for key, value in submission.items() if key != "_id"}}
+
+
+@router.post('/{form_id}/submissions', response_model=form_schema.FormSubmissionResponseSchema, status_code=status.HTTP_201_CREATED)
+async def submit_form(form_id: str, payload: form_schema.FormSubmissionSchema, user_id: str = Depends(oauth2.require_user)):
+    """Submit answers to a form. The answers are checked against the form's fields."""
+    with handle_errors():
+        model = form_validators.get(_form_id(form_id))
+        if model is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
+        try:
+            answers = validate_answers(model, payload.answers)
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            )
+
+        submission = {"form_id": form_id, "user_id": user_id, "answers": answers, "submitted_at": datetime.utcnow()}
+        FormSubmissions.insert_one(submission)
+        return _submission_response(submission)
+
+
+@router.get('/{form_id}/submissions', response_model=form_schema.FormSubmissionListSchema)
+def get_form_submissions(
+    form_id: str,
+    user_id: Optional[str] = Query(None, description="Only the submissions of this member"),
+    after: Optional[str] = Query(None, description="`next_after` of the previous page. Omit it for the first page."),
+    limit: int = Query(100, ge=1, le=1000, description="Number of submissions per page"),
+    user: dict = Depends(oauth2.require_admin)
+):
+    """
+    Retrieve the submissions of a form, oldest first, one page at a time. Only accessible by admin users.
+    Pages continue from the last submission returned, so deep pages are as fast as the first one.
+    """
+    with handle_errors():
+        query = {"form_id": str(_form_id(form_id))}
+        if user_id:
+            query["user_id"] = user_id
+        if after:
+            if not ObjectId.is_valid(after):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid `after` token.")
+            query["_id"] = {"$gt": ObjectId(after)}
+
+        submissions = list(FormSubmissions.find(query, {"gym_id": 0}).sort("_id", 1).limit(limit))
+        return trusted_response(form_schema.FormSubmissionListSchema, {
+            "status": "success",
+            "submissions": [_submission_response(submission) for submission in submissions],
+            "next_after": str(submissions[-1]["_id"]) if len(submissions) == limit else None,
+        })
+
+
+@router.get('/{form_id}/submissions/export')
+def export_form_submissions(
+    form_id: str,
+    format: str = Query("ndjson", regex="^(ndjson|csv)$", description="ndjson (one submission per line) or csv"),
+    user: dict = Depends(oauth2.require_admin)
+):
+    """
+    Download every submission of a form, streamed straight from the database cursor. Only accessible by admin users.
+    CSV exports have a column per field of the form as it is now.
+    """
+    with handle_errors():
+        form = Forms.find_one({"_id": _form_id(form_id)}, {"fields": 1})
+        if not form:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
+        cursor = FormSubmissions.find({"form_id": form_id}, {"gym_id": 0}, batch_size=1000).sort("_id", 1)
+
+        if format == "ndjson":
+            lines = (
+                orjson.dumps(_submission_response(submission), default=str) + b"\n"
+                for submission in cursor
+            )
+            return StreamingResponse(lines, media_type="application/x-ndjson")
+
+        names = [field["field_name"] for field in form["fields"]]
+
+        def rows():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(["id", "user_id", "submitted_at", *names])
+            for submission in cursor:
+                answers = submission["answers"]
+                writer.writerow([
+                    submission["_id"], submission["user_id"], submission["submitted_at"].isoformat(),
+                    *(";".join(map(str, answers[name])) if isinstance(answers.get(name), list) else answers.get(name)
+                      for name in names),
+                ])
+                if buffer.tell() > 65536:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+
+        return StreamingResponse(
+            rows(), media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="form-{form_id}-submissions.csv"'}
+        )
@@ -0,0 +1,59 @@
+# app/routers/leaderboard.py
+
+import re
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from bson.objectid import ObjectId
+from typing import Optional
+
+from app.database import User
+from app.schemas.leaderboard import LeaderboardMetric, LeaderboardResponseSchema
+from app.utilities.error_handler import handle_errors
+from app.utilities.leaderboard import leaderboards, local_today, period_for
+from .. import oauth2
+
+router = APIRouter()
+
+WEEK_PATTERN = re.compile(r"^\d{4}-W\d{2}$")
+
+
+@router.get('/leaderboards/{metric}', response_model=LeaderboardResponseSchema)
+def get_leaderboard(
+    metric: LeaderboardMetric,
+    slot: Optional[str] = Query(None, description="Only rank members who train in this slot"),
+    week: Optional[str] = Query(None, description="Week of the volume board, e.g. 2024-W07. Defaults to the current week."),
+    limit: int = Query(10, ge=1, le=100, description="Number of entries to return"),
+    offset: int = Query(0, ge=0, description="Number of entries to skip"),
+    user_id: str = Depends(oauth2.require_user)
+):
+    """
+    Retrieve a gym-wide or per-slot leaderboard, plus the rank of the requesting member.
+    Boards are kept up to date as progress is logged, so this never recomputes rankings.
+    """
+    with handle_errors():
+        period = period_for(metric.value, local_today())
+        if week:
+            if metric != LeaderboardMetric.VOLUME or not WEEK_PATTERN.match(week):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid week.")
+            period = week
+
+        board = leaderboards.get(metric.value, period).board(slot)
+        entries = [{"rank": rank, "user_id": member_id, "score": score}
+                   for rank, member_id, score in board.top(limit, offset)]
+        me = None
+        my_rank = board.rank(user_id)
+        if my_rank:
+            me = {"rank": my_rank[0], "user_id": user_id, "score": my_rank[1]}
+
+        # Names and photos of the listed members, with one query
+        listed = {entry["user_id"] for entry in entries} | ({user_id} if me else set())
+        profiles = {
+            str(user["_id"]): user
+            for user in User.find({"_id": {"$in": [ObjectId(member_id) for member_id in listed]}}, {"name": 1, "photo": 1})
+        }
+        for entry in entries + ([me] if me else []):
+            profile = profiles.get(entry["user_id"], {})
+            entry["name"] = profile.get("name")
+            entry["photo"] = profile.get("photo")
+
+        return {"status": "success", "metric": metric, "period": period, "slot": slot,
+                "total": len(board), "entries": entries, "me": me}
@@ -0,0 +1,57 @@
+# app/routers/recommendations.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from loguru import logger
+
+from app.database import Recommendations, Screenings
+from app.schemas.recommendation import RecommendationBatchResponseSchema, RecommendationSchema
+from app.utilities.catalog_cache import exercise_catalog
+from app.utilities.error_handler import handle_errors
+from app.utilities.recommendations import SCREENING_FIELDS, recommend, recommend_pending
+from .. import oauth2
+
+router = APIRouter()
+
+
+@router.get('/recommendations', response_model=RecommendationSchema)
+async def get_recommendation(
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Member to recommend a plan to (trainers and admins only)"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Suggest exercises per weekday and a daily macro target from a member's screening answers.
+    Returns the stored recommendation when it was made from the current answers and exercise catalog,
+    and works it out inline otherwise (e.g. after exercises were edited or deleted).
+    """
+    with handle_errors():
+        member_id = oauth2.member_access(request, user_id, authenticated_id, "recommendations")
+        screening = Screenings.find_one({"user_id": member_id}, SCREENING_FIELDS)
+        if not screening:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Screening form not found for the user.")
+
+        stored = Recommendations.find_one({"user_id": member_id}, {"_id": 0})
+        if (stored and stored["screening_version"] == screening.get("version", 1)
+                and stored.get("catalog_version") == exercise_catalog.current_version()):
+            return stored
+
+        recommendation = recommend(screening)
+        Recommendations.replace_one({"user_id": member_id}, recommendation, upsert=True)
+        Screenings.update_one(
+            {"_id": screening["_id"], "version": screening.get("version")}, {"$set": {"recommendation_pending": False}}
+        )
+        return recommendation
+
+
+@router.post('/recommendations/batch', response_model=RecommendationBatchResponseSchema)
+async def run_recommendation_batch(user: dict = Depends(oauth2.require_admin)):
+    """
+    Recommend plans to every member screened (or re-screened) since the last batch, in one pass.
+    Only accessible by admin users.
+    """
+    with handle_errors():
+        recommended = await run_in_threadpool(recommend_pending)
+        logger.info("Recommendation batch run by user ID: {}", user["id"])
+        return {"status": "success", "recommended": recommended}
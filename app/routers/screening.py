@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.database import User
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.database import User, Screenings, ScreeningRevisions
 from app.schemas.screening import ScreeningFormSchema
+from app.utilities import dashboard
 from app.utilities.error_handler import handle_errors
+from app.utilities.fields import FIELDS_DESCRIPTION, parse_fields, partial_model, projection
+from app.utilities.log import sampled
 from bson import ObjectId
 from datetime import datetime
+from typing import Optional
 from loguru import logger
 from .. import oauth2
 
@@ -16,7 +22,7 @@ async def submit_screening_form(
 ):
     """
     Route for users to submit their screening form.
-    The form responses will be saved and linked to the authenticated user within the user document.
+    The form responses are saved in the screenings collection, keyed by the user.
     """
     with handle_errors():
         
@@ -25,81 +31,85 @@ async def submit_screening_form(
             # Taking the user_id from the payload and converting it to ObjectId as it's customer id
             user_id = ObjectId(payload.dict().get("user_id"))
         except Exception as e:
-            logger.error(f"Error converting user ID to ObjectId: {e}")
+            logger.error("Error converting user ID to ObjectId: {}", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid user ID format."
             )
 
         # Check if the user exists in the database
-        existing_user = User.find_one({"_id": user_id})
+        existing_user = User.find_one({"_id": user_id}, {"_id": 1})
         if not existing_user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        
-        # Check if the user already has a screening field
-        if "screening" in existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Screening form has already been submitted."
-            )
-        
+
         # Prepare screening data
         screening_data = payload.dict()
+        screening_data["user_id"] = str(user_id)
         screening_data["submitted_at"] = datetime.utcnow()
+        screening_data["updated_at"] = screening_data["submitted_at"]
+        screening_data["version"] = 1
+        screening_data["recommendation_pending"] = True  # Picked up by the next recommendation batch
 
-        # Update user document with screening data in MongoDB
-        update_result = User.update_one(
-            {"_id": user_id},  # Use `_id` for MongoDB operations
-            {"$set": {"screening": screening_data}}
-        )
-
-        if update_result.modified_count == 0:
+        # The unique index on user_id rejects a second submission
+        try:
+            Screenings.insert_one(screening_data)
+        except DuplicateKeyError:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update user with screening form data."
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Screening form has already been submitted."
             )
 
+        dashboard.count_screening()
+
+        # The first revision holds every answer
+        ScreeningRevisions.insert_one({
+            "user_id": str(user_id),
+            "version": 1,
+            "changes": payload.dict(exclude={"user_id"}),
+            "created_at": screening_data["submitted_at"]
+        })
+
         return {"message": "Screening form submitted successfully!"}
 
-@router.get('/screening/details', response_model=ScreeningFormSchema)
-async def get_screening_details(user_id: str , authorize : str = Depends(oauth2.require_user)):
+@router.get('/screening/details', response_model=partial_model(ScreeningFormSchema), response_model_exclude_unset=True)
+async def get_screening_details(
+    user_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    authorize : str = Depends(oauth2.require_user)
+):
     """
     Retrieve the screening form details of the authenticated user.
     """
     with handle_errors():
+        names = parse_fields(fields, ScreeningFormSchema.__fields__)
+
         # Log the user ID for debugging
-        logger.info(f"Retrieving screening details for user ID: {user_id}")
+        sampled().info("Retrieving screening details for user ID: {}", user_id)
         
         # Convert `user_id` to ObjectId for MongoDB operations
         try:
             user_id = ObjectId(user_id)
         except Exception as e:
-            logger.error(f"Error converting user ID to ObjectId: {e}")
+            logger.error("Error converting user ID to ObjectId: {}", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid user ID format."
             )
 
-        # Fetch the user document from the database
-        existing_user = User.find_one({"_id": user_id})
-        if not existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
-        # Check if the user has a screening field
-        if "screening" not in existing_user:
+        # Fetch the current screening answers of the user
+        screening_projection = {**projection(names), "_id": 0} if names else {"_id": 0}
+        screening = Screenings.find_one({"user_id": str(user_id)}, screening_projection)
+        if not screening:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Screening form not found for the user."
             )
 
         # Return the screening data
-        return existing_user["screening"]
+        return screening
 
 @router.put('/screening/edit', status_code=status.HTTP_200_OK, response_model=ScreeningFormSchema)
 async def edit_screening_form(
@@ -108,49 +118,42 @@ async def edit_screening_form(
 ):
     """
     Route for users to edit their existing screening form.
-    The changes will be updated within the user document.
+    The current answers are updated in place and the changed fields are appended as a new revision.
     """
     with handle_errors():
       
         try:
             user_id = ObjectId(payload.dict().get("user_id")) # taking the user_id from the payload and converting it to ObjectId as it's customer id
         except Exception as e:
-            logger.error(f"Error converting user ID to ObjectId: {e}")
+            logger.error("Error converting user ID to ObjectId: {}", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid user ID format."
             )
 
-        # Check if the user exists in the database
-        existing_user = User.find_one({"_id": user_id})
-        if not existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
-        # Check if the user has a screening field to update
-        if "screening" not in existing_user:
+        # Apply the submitted answers to the current view in a single indexed update,
+        # getting the previous answers back to work out what actually changed
+        changes = payload.dict(exclude_unset=True, exclude={"user_id"})
+        now = datetime.utcnow()
+        previous = Screenings.find_one_and_update(
+            {"user_id": str(user_id)},
+            {"$set": {**changes, "updated_at": now, "recommendation_pending": True}, "$inc": {"version": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not previous:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Screening form not found for the user."
             )
-        
-        # Prepare updated screening data by merging with the existing data
-        screening_data = existing_user["screening"]
-        updated_screening_data = {**screening_data, **payload.dict(exclude_unset=True)}
-        updated_screening_data["updated_at"] = datetime.utcnow()
-
-        # Update the user document with the modified screening data in MongoDB
-        update_result = User.update_one(
-            {"_id": user_id},  # Use `_id` for MongoDB operations
-            {"$set": {"screening": updated_screening_data}}
-        )
 
-        if update_result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update user with screening form data."
-            )
+        # Record the revision with only the fields whose value changed
+        version = previous.get("version", 1) + 1
+        ScreeningRevisions.insert_one({
+            "user_id": str(user_id),
+            "version": version,
+            "changes": {k: v for k, v in changes.items() if previous.get(k) != v},
+            "created_at": now
+        })
 
-        return updated_screening_data
+        return {**previous, **changes, "updated_at": now, "version": version}
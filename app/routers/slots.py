@@ -0,0 +1,144 @@
+# app/routers/slots.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from bson.objectid import ObjectId
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from loguru import logger
+
+from app.database import Slots, SlotDays, SlotBookings
+from app.schemas.slots import (
+    BookingCreateSchema, BookingListResponseSchema, BookingResponseSchema, BookingStatus,
+    SlotCreateSchema, SlotResponseSchema, SlotUpdateSchema
+)
+from app.utilities.error_handler import handle_errors
+from app.utilities.leaderboard import local_today
+from app.utilities.slot_booking import AlreadyBooked, book, booking_response, cancel, resize
+from config import settings
+from .. import oauth2
+
+router = APIRouter()
+
+
+def _slot_id(slot_id: str) -> ObjectId:
+    if not ObjectId.is_valid(slot_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid slot ID format.")
+    return ObjectId(slot_id)
+
+
+@router.post('/slots', status_code=status.HTTP_201_CREATED, response_model=SlotResponseSchema)
+async def create_slot(payload: SlotCreateSchema, user: dict = Depends(oauth2.require_admin)):
+    """
+    Define a bookable training slot. Only accessible by admin users.
+    """
+    with handle_errors():
+        slot = payload.dict()
+        slot["created_at"] = datetime.utcnow()
+        result = Slots.insert_one(slot)
+        return {**slot, "id": str(result.inserted_id)}
+
+
+@router.get('/slots', response_model=List[SlotResponseSchema])
+async def get_slots(
+    day: Optional[date] = Query(None, alias="date", description="Day to report the seats left of. Defaults to today."),
+    user_id: str = Depends(oauth2.require_user)
+):
+    """
+    Retrieve the training slots, with the seats left and the waitlist length of each on the given day.
+    """
+    with handle_errors():
+        day = (day or local_today()).isoformat()
+        slots = list(Slots.find().sort("start_time", 1))
+        seats_left = {counter["slot_id"]: counter["seats_left"] for counter in SlotDays.find({"date": day})}
+        waitlisted = {
+            group["_id"]: group["count"]
+            for group in SlotBookings.aggregate([
+                {"$match": {"date": day, "status": BookingStatus.WAITLISTED.value, "active": True}},
+                {"$group": {"_id": "$slot_id", "count": {"$sum": 1}}},
+            ])
+        }
+        return [
+            {**slot, "id": str(slot["_id"]), "date": day,
+             "seats_left": seats_left.get(str(slot["_id"]), slot["capacity"]),
+             "waitlisted": waitlisted.get(str(slot["_id"]), 0)}
+            for slot in slots
+        ]
+
+
+@router.patch('/slots/{slot_id}', response_model=SlotResponseSchema)
+async def update_slot(slot_id: str, payload: SlotUpdateSchema, user: dict = Depends(oauth2.require_admin)):
+    """
+    Rename a slot or change its capacity. Only accessible by admin users.
+    A capacity change applies to today and the days already booked ahead; added seats go to the waitlist first.
+    """
+    with handle_errors():
+        update_data = {k: v for k, v in payload.dict().items() if v is not None}
+        if not update_data:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to update.")
+
+        previous = Slots.find_one_and_update({"_id": _slot_id(slot_id)}, {"$set": update_data})
+        if not previous:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Slot not found.")
+        if "capacity" in update_data and update_data["capacity"] != previous["capacity"]:
+            resize(slot_id, update_data["capacity"], update_data["capacity"] - previous["capacity"],
+                   local_today().isoformat())
+
+        return {**previous, **update_data, "id": slot_id}
+
+
+@router.post('/slots/{slot_id}/bookings', status_code=status.HTTP_201_CREATED, response_model=BookingResponseSchema)
+async def book_slot(slot_id: str, payload: BookingCreateSchema, user_id: str = Depends(oauth2.require_user)):
+    """
+    Book a seat in a slot for a day. When the slot is full the booking is waitlisted,
+    and turns into a seat automatically as soon as one is cancelled.
+    """
+    with handle_errors():
+        today = local_today()
+        if not today <= payload.date <= today + timedelta(days=settings.SLOT_BOOKING_DAYS_AHEAD):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Slots can be booked from today up to {settings.SLOT_BOOKING_DAYS_AHEAD} days ahead."
+            )
+        slot = Slots.find_one({"_id": _slot_id(slot_id)}, {"capacity": 1})
+        if not slot:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Slot not found.")
+
+        try:
+            booking = book(slot, payload.date.isoformat(), user_id)
+        except AlreadyBooked:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="You already booked this slot for that day.")
+        logger.info("Slot {} on {} {} for user ID: {}", slot_id, payload.date, booking["status"], user_id)
+        return booking_response(booking)
+
+
+@router.get('/slots/bookings', response_model=BookingListResponseSchema)
+async def get_bookings(
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Member to list the bookings of (trainers and admins only)"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Retrieve a member's active bookings from today on, seated and waitlisted.
+    """
+    with handle_errors():
+        member_id = oauth2.member_access(request, user_id, authenticated_id, "bookings")
+        bookings = SlotBookings.find(
+            {"user_id": member_id, "date": {"$gte": local_today().isoformat()}, "active": True}
+        ).sort("date", 1)
+        return {"status": "success", "bookings": [booking_response(booking) for booking in bookings]}
+
+
+@router.delete('/slots/bookings/{booking_id}', response_model=BookingResponseSchema)
+async def cancel_booking(request: Request, booking_id: str, user_id: str = Depends(oauth2.require_user)):
+    """
+    Cancel a booking. Members cancel their own bookings; admins can cancel anyone's.
+    A freed seat goes to the first member on the waitlist.
+    """
+    with handle_errors():
+        if not ObjectId.is_valid(booking_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid booking ID format.")
+        owner = None if request.state.user.get("role") == "ADMIN" else user_id
+        booking = cancel(ObjectId(booking_id), owner)
+        if not booking:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Booking not found.")
+        return booking_response(booking)
@@ -0,0 +1,71 @@
+# app/routers/sync.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from bson.objectid import ObjectId
+from typing import Optional
+
+from app.database import User, Exercises, FoodItems, Forms, DietPlans, Tombstones
+from app.utilities.error_handler import handle_errors
+from app.utilities.responses import TrustedJSONResponse
+from app.utilities.sync import current_seq
+from config import settings
+from .. import oauth2
+
+router = APIRouter()
+
+
+def _sync_document(doc: dict) -> dict:
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+@router.get('/sync', status_code=status.HTTP_200_OK)
+def sync(
+    since: Optional[str] = Query(None, description="Token returned by the previous sync. Omit it for a full sync."),
+    user_id: str = Depends(oauth2.require_user)
+):
+    """
+    Return the exercises, food items, forms, diet plans and workout plan of the member
+    that were created, updated or deleted since the given token, plus a token for the next sync.
+
+    Changes are ordered by a global sequence that every write handler stamps on the documents it touches.
+    The last SYNC_OVERLAP sequence numbers before the token are served again, so changes whose write
+    was still in flight during the previous sync are not missed; clients apply changes by ID, idempotently.
+    """
+    with handle_errors():
+        try:
+            since_seq = int(since) if since else 0
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token.")
+
+        # Everything written up to this point is covered by the next token
+        token = current_seq()
+
+        if since_seq:
+            seq_filter = {"seq": {"$gt": max(since_seq - settings.SYNC_OVERLAP, 0)}}
+        else:
+            seq_filter = {}
+
+        changes = {
+            "exercises": [_sync_document(doc) for doc in Exercises.find(seq_filter)],
+            "food_items": [_sync_document(doc) for doc in FoodItems.find(seq_filter)],
+            "forms": [_sync_document(doc) for doc in Forms.find(seq_filter)],
+            "diet_plans": [_sync_document(doc) for doc in DietPlans.find({"user_id": user_id, **seq_filter})],
+            "workout_plan": None,
+        }
+
+        workout_plan_filter = {"_id": ObjectId(user_id), "workout_plan": {"$exists": True}}
+        if since_seq:
+            workout_plan_filter["workout_plan.seq"] = seq_filter["seq"]
+        member = User.find_one(workout_plan_filter, {"workout_plan": 1})
+        if member:
+            changes["workout_plan"] = member["workout_plan"]
+
+        deleted = {}
+        if since_seq:
+            tombstones = Tombstones.find({**seq_filter, "user_id": {"$in": [None, user_id]}})
+            for tombstone in tombstones:
+                deleted.setdefault(tombstone["collection"], []).append(tombstone["doc_id"])
+
+        # Documents are returned as stored, without a jsonable_encoder pass over every field
+        return TrustedJSONResponse({"status": "success", "token": str(token), "changes": changes, "deleted": deleted})
@@ -3,6 +3,7 @@ from bson.objectid import ObjectId
 from datetime import datetime, timedelta
 from app.serializers.userSerializers import userResponseEntity, userRegistrationEntity, serialize_user, serialize_users
 from app.utilities.error_handler import handle_errors
+from app.utilities import dashboard
 from app.database import Registrations
 from app.utilities.email_services import send_email
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -12,17 +13,30 @@ from app.schemas.user import UserResponse, UserResponseSchema
 from app.utilities.error_handler import handle_errors
 from typing import Optional
 
-from app.database import User
+from app.database import User, USER_FILTER_INDEXES
+from app.utilities.query_guard import check_query
+from app.utilities.fields import FIELDS_DESCRIPTION, parse_fields, partial_model, projection, select
 from .. import  oauth2
 from app.schemas import user
 
 router = APIRouter()
 
 
-@router.get('/me', response_model= user.UserResponse)
-def get_me(user_id: str = Depends(oauth2.require_user)):
+# Fields of the user document returned by /users/me, so embedded plans are never read for it
+USER_RESPONSE_PROJECTION = {field: 1 for field in UserResponseSchema.__fields__ if field != "id"}
+
+
+@router.get('/me', response_model=user.PartialUserResponse, response_model_exclude_unset=True)
+def get_me(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    user_id: str = Depends(oauth2.require_user)
+):
     with handle_errors():
-        user = userResponseEntity(User.find_one({'_id': ObjectId(str(user_id))}))
+        names = parse_fields(fields, UserResponseSchema.__fields__)
+        if names:
+            user = select(User.find_one({'_id': ObjectId(str(user_id))}, projection(names)), names)
+        else:
+            user = userResponseEntity(User.find_one({'_id': ObjectId(str(user_id))}, USER_RESPONSE_PROJECTION))
         return {"status": "success", "user": user}
 
 
@@ -34,6 +48,7 @@ async def new_registration(payload: user.UserRegistration , user_id: str = Depen
         payload.set_updated_timestamp()
 
         result = Registrations.insert_one(payload.dict())
+        dashboard.count_signup("registrations")
         new_user = Registrations.find_one({'_id': result.inserted_id})
 
         await send_email(
@@ -49,18 +64,25 @@ async def new_registration(payload: user.UserRegistration , user_id: str = Depen
 
 
 @router.get('/user', response_model=dict)
-def get_user_details(user_id: str, Authorize: str = Depends(oauth2.require_user)):
+def get_user_details(
+    user_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    Authorize: str = Depends(oauth2.require_user)
+):
     """
     Get user details based on the user_id as a query parameter.
+    Embedded documents can be narrowed down with dotted fields, e.g. `fields=name,workout_plan.end_weight`.
     This route is accessible by all users.
     """
     with handle_errors():
+        names = parse_fields(fields)
+
         try:
             object_id = ObjectId(user_id)  # Convert to ObjectId for MongoDB query
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID format")
 
-        user = User.find_one({'_id': object_id})
+        user = User.find_one({'_id': object_id}, projection(names) if names else None)
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -73,26 +95,44 @@ def get_user_details(user_id: str, Authorize: str = Depends(oauth2.require_user)
 def get_users(
     filter_field: Optional[str] = Query(None, description="Field to filter users by"),
     filter_value: Optional[str] = Query(None, description="Value to filter users by"),
+    role: Optional[user.UserRole] = Query(None, description="Only return users with this role"),
+    created_from: Optional[datetime] = Query(None, description="Only return users created at or after this date"),
+    created_to: Optional[datetime] = Query(None, description="Only return users created at or before this date"),
     page: int = Query(1, ge=1, description="Page number for pagination"),
     page_size: int = Query(10, ge=1, le=100, description="Number of users per page"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     Authorize: str = Depends(oauth2.require_user)
 ):
     """
     Get all users based on filter criteria and pagination.
+    Only fields backed by an index can be filtered on (see USER_FILTER_INDEXES).
     This route is accessible by all users.
     """
     with handle_errors():
+        names = parse_fields(fields)
+
         # Construct the query filter
         query = {}
         if filter_field and filter_value:
             query[filter_field] = filter_value
+        if role:
+            query["role"] = role.value
+        if created_from or created_to:
+            query["created_at"] = {}
+            if created_from:
+                query["created_at"]["$gte"] = created_from
+            if created_to:
+                query["created_at"]["$lte"] = created_to
+
+        # Reject filters that would scan the whole collection
+        check_query(User, USER_FILTER_INDEXES, query)
 
         # Calculate pagination values
         skip = (page - 1) * page_size
         limit = page_size
 
         # Retrieve users with filtering and pagination
-        users_cursor = User.find(query).skip(skip).limit(limit)
+        users_cursor = User.find(query, projection(names) if names else None).skip(skip).limit(limit)
         users_list = list(users_cursor)
 
         # Check if no users were found
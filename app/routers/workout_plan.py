@@ -1,13 +1,19 @@
 # app/routers/workout_plan.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from bson.objectid import ObjectId
 from datetime import datetime
+from typing import Optional
 from loguru import logger
 
-from app.database import User
+from app.database import User, ArchivedWorkoutPlans
 from app.schemas.workout_plan import WorkoutPlanSchema, WorkoutPlanUpdateSchema
+from app.utilities import dashboard
 from app.utilities.error_handler import handle_errors
+from app.utilities.events import event_bus
+from app.utilities.fields import FIELDS_DESCRIPTION, parse_fields, projection
+from app.utilities.responses import TrustedJSONResponse
+from app.utilities.sync import next_seq, record_tombstone
 from .. import oauth2
 
 # Initialize the router
@@ -22,7 +28,7 @@ async def create_workout_plan(
     Create a new workout plan for the user. This endpoint is typically used by admins to create workout plans.
     """
     with handle_errors():
-        logger.info(f"Creating workout plan for user ID: {user_id}")
+        logger.info("Creating workout plan for user ID: {}", user_id)
 
         # Convert user_id to ObjectId for MongoDB operations
         try:
@@ -48,6 +54,7 @@ async def create_workout_plan(
         # Set created_at and updated_at fields as datetime strings
         workout_plan_data["created_at"] = datetime.utcnow().isoformat()
         workout_plan_data["updated_at"] = datetime.utcnow().isoformat()
+        workout_plan_data["seq"] = next_seq()
 
         # Update the user document with the new workout plan
         update_result = User.update_one(
@@ -60,32 +67,68 @@ async def create_workout_plan(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to add workout plan."
             )
+        if "workout_plan" not in existing_user:
+            dashboard.count_plans("workout_plans")
+        event_bus.publish(str(user_id), "workout_plan.updated", {"seq": workout_plan_data["seq"]})
 
         return {"message": "Workout plan created successfully!"}
 
 
 @router.get('/workout-plan', status_code=status.HTTP_200_OK)
 async def get_workout_plan(
-    user_id: str = Query(..., description="User ID to get workout plan for")
+    user_id: str = Query(..., description="User ID to get workout plan for"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
     """
     Retrieve the workout plan for a specific user.
     """
     with handle_errors():
+        names = parse_fields(fields)
+
         try:
             user_id = ObjectId(user_id)
         except Exception:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID format.")
 
-        existing_user = User.find_one({"_id": user_id}, {"workout_plan": 1})
+        workout_plan_projection = projection(names, prefix="workout_plan.") if names else {"workout_plan": 1}
+        existing_user = User.find_one({"_id": user_id, "workout_plan": {"$exists": True}}, workout_plan_projection)
         
-        if not existing_user or "workout_plan" not in existing_user:
+        if not existing_user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No workout plan found for the user."
             )
 
-        return {"status": "success", "workout_plan": existing_user["workout_plan"]}
+        return {"status": "success", "workout_plan": existing_user.get("workout_plan", {})}
+
+
+@router.get('/workout-plan/archive', status_code=status.HTTP_200_OK)
+async def get_archived_workout_plans(
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Member to read the archive of (trainers and admins only)"),
+    page: int = Query(1, ge=1, description="Page number for pagination"),
+    page_size: int = Query(10, ge=1, le=100, description="Number of workout plans per page"),
+    authenticated_id: str = Depends(oauth2.require_user)
+):
+    """
+    Retrieve the workout plans that were archived after their end date, most recent first.
+    """
+    with handle_errors():
+        member_id = oauth2.member_access(request, user_id, authenticated_id, "workout plans")
+        query = {"user_id": member_id}
+        workout_plans = list(
+            ArchivedWorkoutPlans.find(query, {"gym_id": 0}).sort("end_date", -1).skip((page - 1) * page_size).limit(page_size)
+        )
+        for workout_plan in workout_plans:
+            workout_plan["id"] = str(workout_plan.pop("_id"))
+
+        return TrustedJSONResponse({
+            "status": "success",
+            "page": page,
+            "page_size": page_size,
+            "total": ArchivedWorkoutPlans.count_documents(query),
+            "workout_plans": workout_plans
+        })
 
 
 @router.put('/workout-plan', status_code=status.HTTP_200_OK)
@@ -118,6 +161,8 @@ async def update_workout_plan(
             update_data["start_date"] = update_data["start_date"].isoformat()
         if "end_date" in update_data and isinstance(update_data["end_date"], datetime):
             update_data["end_date"] = update_data["end_date"].isoformat()
+        update_data["updated_at"] = datetime.utcnow().isoformat()
+        update_data["seq"] = next_seq()
 
         # Update the workout plan in the user document
         update_result = User.update_one(
@@ -130,6 +175,7 @@ async def update_workout_plan(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update workout plan."
             )
+        event_bus.publish(str(user_id), "workout_plan.updated", {"seq": update_data["seq"]})
 
         return {"message": "Workout plan updated successfully!"}
 
@@ -166,5 +212,8 @@ async def delete_workout_plan(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to delete workout plan."
             )
+        dashboard.count_plans("workout_plans", -1)
+        seq = record_tombstone("workout_plan", user_id, user_id=str(user_id))
+        event_bus.publish(str(user_id), "workout_plan.deleted", {"seq": seq})
 
         return {"message": "Workout plan deleted successfully!"}
@@ -0,0 +1,30 @@
+# app/schemas/batch.py
+
+from pydantic import BaseModel
+from typing import Any, List, Optional
+from enum import Enum
+
+class BatchMethod(str, Enum):
+    GET = "GET"
+    POST = "POST"
+    PUT = "PUT"
+    PATCH = "PATCH"
+    DELETE = "DELETE"
+
+class BatchItemSchema(BaseModel):
+    id: Optional[str] = None  # Echoed back so the client can match responses to sub-requests
+    method: BatchMethod = BatchMethod.GET
+    path: str  # E.g., "/api/users/me" or "/api/exercises?category=Beginner"
+    body: Optional[Any] = None  # JSON body of POST/PUT/PATCH sub-requests
+
+class BatchRequestSchema(BaseModel):
+    requests: List[BatchItemSchema]
+
+class BatchItemResponseSchema(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: Optional[Any] = None
+
+class BatchResponseSchema(BaseModel):
+    status: str
+    responses: List[BatchItemResponseSchema]
@@ -0,0 +1,56 @@
+# app/schemas/body_metrics.py
+
+from pydantic import BaseModel, Field, root_validator
+from typing import List, Optional
+from datetime import datetime
+from enum import Enum
+
+METRIC_FIELDS = ("weight", "body_fat", "muscle_mass", "waist", "chest", "hips")
+
+class BodyMetricSchema(BaseModel):
+    measured_at: Optional[datetime] = Field(None, description="When the measurement was taken. Defaults to now.")
+    weight: Optional[float] = Field(None, gt=0, description="Body weight in kgs.")
+    body_fat: Optional[float] = Field(None, ge=0, le=100, description="Body fat in percent.")
+    muscle_mass: Optional[float] = Field(None, gt=0, description="Muscle mass in kgs.")
+    waist: Optional[float] = Field(None, gt=0, description="Waist circumference in cm.")
+    chest: Optional[float] = Field(None, gt=0, description="Chest circumference in cm.")
+    hips: Optional[float] = Field(None, gt=0, description="Hip circumference in cm.")
+
+    @root_validator
+    def check_any_metric(cls, values):
+        if all(values.get(field) is None for field in METRIC_FIELDS):
+            raise ValueError("At least one body metric is required.")
+        return values
+
+class MetricInterval(str, Enum):
+    AUTO = "auto"  # Picked from the length of the range
+    RAW = "raw"  # Individual measurements
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+class BodyMetricPointSchema(BaseModel):
+    measured_at: datetime  # Start of the interval (or the measurement time for raw series)
+    count: int = 1  # Measurements averaged into this point
+    weight: Optional[float] = None
+    weight_min: Optional[float] = None
+    weight_max: Optional[float] = None
+    body_fat: Optional[float] = None
+    muscle_mass: Optional[float] = None
+    waist: Optional[float] = None
+    chest: Optional[float] = None
+    hips: Optional[float] = None
+
+class WeightGoalProgressSchema(BaseModel):
+    start_weight: Optional[float] = None  # Weight when the workout plan was set
+    end_weight: Optional[float] = None  # Target weight of the workout plan
+    latest_weight: Optional[float] = None
+    latest_measured_at: Optional[datetime] = None
+    remaining: Optional[float] = None  # Kgs left to reach the target
+    percent_complete: Optional[float] = None
+
+class BodyMetricSeriesSchema(BaseModel):
+    status: str
+    interval: MetricInterval
+    points: List[BodyMetricPointSchema]
+    progress: WeightGoalProgressSchema
@@ -0,0 +1,22 @@
+# app/schemas/checkin.py
+
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class CheckinSchema(BaseModel):
+    user_id: Optional[str] = Field(None, description="Member checking in, when scanned in by a trainer or admin. Defaults to the caller.")
+    slot_id: Optional[str] = Field(None, description="Slot the member is checking in for, if any.")
+
+class CheckinResponseSchema(BaseModel):
+    status: str  # "recorded" once stored, "accepted" while buffered
+    user_id: str
+    date: str
+
+class AttendanceDaySchema(BaseModel):
+    date: str
+    checkins: int
+    hours: Dict[str, int] = {}  # Check-ins per hour of the day ("06": 120), gym timezone
+
+class AttendanceResponseSchema(BaseModel):
+    status: str
+    days: List[AttendanceDaySchema]
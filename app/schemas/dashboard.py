@@ -0,0 +1,21 @@
+# app/schemas/dashboard.py
+
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class DailyRegistrationsSchema(BaseModel):
+    date: str  # Day in 'YYYY-MM-DD' format (gym timezone)
+    users: int  # Accounts registered
+    registrations: int  # Registration forms filled in
+
+class ActivePlansSchema(BaseModel):
+    diet_plans: int
+    workout_plans: int
+
+class DashboardStatsSchema(BaseModel):
+    status: str
+    members_by_role: Dict[str, int]
+    active_plans: ActivePlansSchema
+    screenings_submitted: int
+    screening_completion_rate: Optional[float] = None  # Screenings per customer, None without customers
+    registrations: List[DailyRegistrationsSchema]  # Oldest day first
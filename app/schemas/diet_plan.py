@@ -1,9 +1,17 @@
 # app/schemas/diet.py
 
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
+from app.schemas.screening import FoodPreferences
+
+# Schema for a portion in canonical units, worked out from a free-text quantity when it is stored
+class PortionSchema(BaseModel):
+    grams: Optional[float] = Field(None, description="Weight in grams, when the food's density or piece weight is known.")
+    ml: Optional[float] = Field(None, description="Volume in ml, for quantities measured by volume.")
+    pieces: Optional[float] = Field(None, description="Number of pieces, for counted quantities.")
+
 # Schema for a food item
 class FoodItemSchema(BaseModel):
     food_name: str
@@ -25,10 +33,32 @@ class FoodItemSchema(BaseModel):
     magnesium: float = Field(..., description="Magnesium in mg.")
     sodium: float = Field(..., description="Sodium in mg.")
     potassium: float = Field(..., description="Potassium in mg.")
+    density: Optional[float] = Field(None, gt=0, description="Density in g/ml, to weigh quantities measured by volume.")
+    unit_weight: Optional[float] = Field(None, gt=0, description="Weight of one piece in grams, for counted quantities like '2'.")
+    portion: Optional[PortionSchema] = Field(None, description="The quantity in canonical units. Set by the server.")
+    food_type: Optional[FoodPreferences] = Field(None, description="Strictest diet the food fits, e.g. 'jain food' also fits vegetarians.")
+    allergens: Optional[List[str]] = Field(None, description="Allergens the food contains, e.g. ['milk', 'peanut'].")
+
+    class Config:
+        orm_mode = True
+
+# Schema for a meal in a diet plan: a reference to a catalog food item
+class MealEntrySchema(BaseModel):
+    food_id: str = Field(..., description="ID of the food item in the catalog.")
+    quantity: Optional[str] = Field(None, description="Prescribed quantity, e.g. '200ml'. Defaults to the food item's quantity.")
+    meal_slot: Optional[str] = Field(None, description="When the meal is eaten, e.g. 'Breakfast' or '6:00AM'.")
 
     class Config:
         orm_mode = True
 
+# Schema for a meal as returned to clients, with its food item resolved from the catalog
+# (or from the snapshot stored in a frozen plan)
+class ResolvedMealSchema(MealEntrySchema):
+    food_id: Optional[str] = Field(None, description="ID of the food item in the catalog.")
+    food: Optional[FoodItemSchema] = Field(None, description="The food item this meal refers to.")
+    portion: Optional[PortionSchema] = Field(None, description="The prescribed quantity in canonical units.")
+    nutrients: Optional[Dict[str, float]] = Field(None, description="Nutrients of the prescribed quantity, when it compares with the food item's.")
+
 # Schema for a diet plan's details
 class DietPlanSchema(BaseModel):
     user_id: Optional[str] = None  # User ID as a string
@@ -37,7 +67,8 @@ class DietPlanSchema(BaseModel):
     desired_weight: Optional[float] = Field(None, description="Target weight in kgs.")
     desired_calories: Optional[float] = Field(None, description="Target daily calories intake in kcal.")
     desired_proteins: Optional[float] = Field(None, description="Target daily protein intake in grams.")
-    meals: Optional[List[FoodItemSchema]] = Field([], description="List of meals included in the diet plan.")
+    meals: Optional[List[MealEntrySchema]] = Field([], description="List of meals included in the diet plan.")
+    frozen: Optional[bool] = Field(False, description="Keep a copy of each food item in the plan so later catalog edits don't change it.")
     created_at: Optional[str] = None  # Creation timestamp as a string
     updated_at: Optional[str] = None  # Update timestamp as a string
 
@@ -47,6 +78,33 @@ class DietPlanSchema(BaseModel):
 # Response schema for a diet plan
 class DietPlanResponseSchema(DietPlanSchema):
     id: Optional[str] = Field(None, description="Diet Plan ID")
+    meals: Optional[List[ResolvedMealSchema]] = Field([], description="List of meals included in the diet plan.")
 
     class Config:
         orm_mode = True
+
+# A diet plan moved to the archive after its end_date
+class ArchivedDietPlanSchema(DietPlanResponseSchema):
+    archived_at: Optional[datetime] = Field(None, description="When the plan was archived.")
+
+# One page of a member's archived diet plans
+class ArchivedDietPlansResponse(BaseModel):
+    status: str
+    page: int
+    page_size: int
+    total: int
+    diet_plans: List[ArchivedDietPlanSchema]
+
+# Schema for a food item offered as a substitute, with its distance to the replaced item
+class FoodSubstituteSchema(FoodItemSchema):
+    id: str
+    distance: float = Field(..., description="Distance over the standardized nutrients per 100 g; 0 is identical.")
+    unverified_diet: bool = Field(False, description="The item has no food_type, so it may not fit the diet filtered on.")
+
+# Schema for the substitutes of a food item
+class FoodSubstitutesResponse(BaseModel):
+    status: str
+    food_id: str
+    food_type: Optional[FoodPreferences] = None  # Diet the substitutes were filtered on
+    avoided: List[str] = []  # Allergies the substitutes were filtered on
+    substitutes: List[FoodSubstituteSchema]
@@ -15,6 +15,12 @@ class DayProgressSchema(BaseModel):
     day: str  # E.g., "Monday", "Tuesday", etc.
     exercises: List[ExerciseSchema]  # List of exercises performed on this day
 
+class BulkProgressEntrySchema(DayProgressSchema):
+    user_id: str  # Member whose progress is logged
+
+class BulkProgressSchema(BaseModel):
+    entries: List[BulkProgressEntrySchema]  # One entry per member (and day)
+
 class WorkoutPlanSchema(BaseModel):
     start_date: date
     end_date: date
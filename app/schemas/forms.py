@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from bson import ObjectId
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 # Define a custom PyObjectId class with JSON Schema logic
@@ -22,7 +22,9 @@ class PyObjectId(ObjectId):
 # Define Pydantic Schemas using the custom PyObjectId class
 class Field(BaseModel):
     field_name: str
-    field_type: str
+    field_type: str  # text, number, integer, boolean, date, datetime, email, select or multiselect
+    required: bool = False
+    options: Optional[List[str]] = None  # Allowed values of select and multiselect fields
 
 class FormCreateSchema(BaseModel):
     form_name: str
@@ -41,3 +43,18 @@ class FormResponseSchema(FormCreateSchema):
     class Config:
         orm_mode = True
         json_encoders = {ObjectId: str}
+
+class FormSubmissionSchema(BaseModel):
+    answers: Dict[str, Any]  # Field name -> value, checked against the form's fields
+
+class FormSubmissionResponseSchema(BaseModel):
+    id: str
+    form_id: str
+    user_id: str
+    answers: Dict[str, Any]
+    submitted_at: datetime
+
+class FormSubmissionListSchema(BaseModel):
+    status: str
+    submissions: List[FormSubmissionResponseSchema]
+    next_after: Optional[str] = None  # Pass as `after` to get the next page; None on the last page
@@ -0,0 +1,25 @@
+# app/schemas/leaderboard.py
+
+from pydantic import BaseModel
+from typing import List, Optional
+from enum import Enum
+
+class LeaderboardMetric(str, Enum):
+    VOLUME = "volume"  # Completed sets x reps in a week
+    STREAK = "streak"  # Consecutive days with a completed exercise
+
+class LeaderboardEntrySchema(BaseModel):
+    rank: int
+    user_id: str
+    name: Optional[str] = None
+    photo: Optional[str] = None
+    score: int
+
+class LeaderboardResponseSchema(BaseModel):
+    status: str
+    metric: LeaderboardMetric
+    period: str
+    slot: Optional[str] = None
+    total: int  # Members on the board
+    entries: List[LeaderboardEntrySchema]
+    me: Optional[LeaderboardEntrySchema] = None  # The requesting member, when they are on the board
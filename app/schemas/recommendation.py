@@ -0,0 +1,37 @@
+# app/schemas/recommendation.py
+
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+from app.schemas.screening import FoodPreferences
+
+class RecommendedExerciseSchema(BaseModel):
+    exercise_id: str
+    name: str
+    type: str
+    category: str
+    sets: int
+    reps: int
+
+class MacroTargetSchema(BaseModel):
+    energy_kcal: float = Field(..., description="Daily energy target in kcal.")
+    protein: float = Field(..., description="Daily protein target in grams.")
+    fat: float = Field(..., description="Daily fat target in grams.")
+    carbohydrates: float = Field(..., description="Daily carbohydrates target in grams.")
+    food_type: Optional[FoodPreferences] = None  # Diet the meals should fit
+
+class RecommendationSchema(BaseModel):
+    user_id: str
+    screening_version: int  # Version of the screening answers the recommendation was made from
+    catalog_version: int = 0  # Version of the exercise catalog the exercises were picked from
+    goal: str  # "fat_loss", "muscle_gain", "endurance" or "general"
+    days: Dict[str, List[RecommendedExerciseSchema]]  # Exercises per weekday, e.g. {"Monday": [...]}
+    macros: Optional[MacroTargetSchema] = None  # Missing when the screening has no weight
+    flags: List[str] = []  # Points for a trainer to check first, e.g. "medical_clearance"
+    rules: List[str] = []  # Names of the rules that matched, in order
+    created_at: datetime
+
+class RecommendationBatchResponseSchema(BaseModel):
+    status: str
+    recommended: int  # Members whose recommendation was (re)computed
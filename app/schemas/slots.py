@@ -0,0 +1,56 @@
+# app/schemas/slots.py
+
+from datetime import date, datetime
+from enum import Enum
+from pydantic import BaseModel, Field, validator
+from typing import List, Optional
+
+TIME_PATTERN = r"^([01]\d|2[0-3]):[0-5]\d$"
+
+class SlotCreateSchema(BaseModel):
+    name: str = Field(..., description="Display name, e.g. 'Morning peak'.")
+    start_time: str = Field(..., regex=TIME_PATTERN, description="Start time in 'HH:MM' (gym timezone).")
+    end_time: str = Field(..., regex=TIME_PATTERN, description="End time in 'HH:MM' (gym timezone).")
+    capacity: int = Field(..., ge=1, description="Members that can book the slot on a given day.")
+
+    @validator("end_time")
+    def ends_after_start(cls, end_time, values):
+        if "start_time" in values and end_time <= values["start_time"]:
+            raise ValueError("end_time must be after start_time")
+        return end_time
+
+class SlotUpdateSchema(BaseModel):
+    name: Optional[str] = None
+    capacity: Optional[int] = Field(None, ge=1, description="New capacity, applied to the days already booked as well.")
+
+class SlotResponseSchema(BaseModel):
+    id: str
+    name: str
+    start_time: str
+    end_time: str
+    capacity: int
+    date: Optional[str] = None  # The day seats_left and waitlisted refer to
+    seats_left: Optional[int] = None
+    waitlisted: Optional[int] = None
+
+class BookingCreateSchema(BaseModel):
+    date: date  # Day to book the slot for
+
+class BookingStatus(str, Enum):
+    BOOKED = "booked"
+    WAITLISTED = "waitlisted"  # Booked automatically, in order, as seats are cancelled
+    CANCELLED = "cancelled"
+
+class BookingResponseSchema(BaseModel):
+    id: str
+    slot_id: str
+    date: str
+    user_id: str
+    status: BookingStatus
+    waitlist_position: Optional[int] = None  # 1 for the next member to get a seat
+    created_at: datetime
+    booked_at: Optional[datetime] = None
+
+class BookingListResponseSchema(BaseModel):
+    status: str
+    bookings: List[BookingResponseSchema]
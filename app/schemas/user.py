@@ -3,6 +3,8 @@ from pydantic import BaseModel, EmailStr, constr
 from typing import Optional
 from enum import Enum
 
+from app.utilities.fields import partial_model
+
 
 class UserRole(str, Enum):
     ADMIN = "ADMIN"
@@ -45,6 +47,11 @@ class UserResponse(BaseModel):
     user: UserResponseSchema
 
 
+class PartialUserResponse(BaseModel):
+    status: str
+    user: partial_model(UserResponseSchema)
+
+
 class UserRegistration(BaseModel):
     name: str
     address: str
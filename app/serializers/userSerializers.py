@@ -8,7 +8,8 @@ def userEntity(user) -> dict:
         "verified": user["verified"],
         "password": user["password"],
         "created_at": user["created_at"],
-        "updated_at": user["updated_at"]
+        "updated_at": user["updated_at"],
+        "gym_id": user["gym_id"]
     }
 
 
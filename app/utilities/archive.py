@@ -0,0 +1,164 @@
+"""
+Background archival of plans past their end_date.
+
+Expired diet plans move from diet_plans to diet_plans_archive, and expired workout plans move out of
+their users document into workout_plans_archive, so the hot collections only hold current plans.
+Every plan is copied before it is removed, a plan edited in between stays hot, and a plan is only
+counted, tombstoned and announced by the run whose removal actually took it out of the hot collection,
+so the job is safe to interrupt. Workers take turns through a lease: each interval, the first worker
+to take it runs the job. It can also be run once with `python -m app.utilities.archive`.
+"""
+import asyncio
+from datetime import datetime
+from typing import List, Tuple
+
+from loguru import logger
+from pymongo import ReplaceOne
+from starlette.concurrency import run_in_threadpool
+
+from app.database import ArchivedDietPlans, ArchivedWorkoutPlans, DietPlans, User
+from app.utilities import dashboard
+from app.utilities.catalog_cache import food_lookup
+from app.utilities.circuit_breaker import ignore_slow_calls
+from app.utilities.events import event_bus
+from app.utilities.leaderboard import local_today
+from app.utilities.leases import take_lease
+from app.utilities.sync import record_tombstone
+from app.utilities.tenancy import tenant
+from config import settings
+
+
+def _freeze_meals(plans: List[dict]):
+    """Keep a snapshot of every meal's food item, so archived plans still read right once the catalog changes."""
+    foods = food_lookup.get_many({
+        meal["food_id"] for plan in plans for meal in plan.get("meals") or []
+        if meal.get("food_id") and "snapshot" not in meal
+    })
+    for plan in plans:
+        for meal in plan.get("meals") or []:
+            if meal.get("food_id") in foods and "snapshot" not in meal:
+                meal["snapshot"] = foods[meal["food_id"]]
+
+
+def archive_diet_plans(today: str, batch_size: int) -> int:
+    plans = list(DietPlans.find({"end_date": {"$lt": today, "$ne": None}}, limit=batch_size))
+    if not plans:
+        return 0
+
+    archived_at = datetime.utcnow()
+    _freeze_meals(plans)
+    ArchivedDietPlans.bulk_write(
+        [ReplaceOne({"_id": plan["_id"]}, {**plan, "archived_at": archived_at}, upsert=True) for plan in plans],
+        ordered=False
+    )
+    # Only the version that was copied is removed, and a plan removed by another run isn't counted again
+    archived = [
+        plan for plan in plans
+        if DietPlans.find_one_and_delete({"_id": plan["_id"], "seq": plan.get("seq")}, {"_id": 1})
+    ]
+    archived_ids = {plan["_id"] for plan in archived}
+    # Plans edited meanwhile stay hot, without a copy
+    still_hot = [
+        plan["_id"] for plan in DietPlans.find(
+            {"_id": {"$in": [plan["_id"] for plan in plans if plan["_id"] not in archived_ids]}}, {"_id": 1}
+        )
+    ]
+    if still_hot:
+        ArchivedDietPlans.delete_many({"_id": {"$in": still_hot}})
+
+    for plan in archived:
+        seq = record_tombstone("diet_plans", plan["_id"], user_id=plan.get("user_id"))
+        event_bus.publish(plan.get("user_id"), "diet_plan.deleted", {"id": str(plan["_id"]), "seq": seq})
+    dashboard.count_plans("diet_plans", -len(archived))
+    return len(archived)
+
+
+def _workout_copy_key(user: dict) -> dict:
+    # A plan keeps its seq until it is edited or replaced, so runs copying the same plan write the same document
+    plan = user["workout_plan"]
+    return {"user_id": str(user["_id"]), "seq": plan.get("seq"), "end_date": plan.get("end_date")}
+
+
+def archive_workout_plans(today: str, batch_size: int) -> int:
+    users = list(User.find(
+        {"workout_plan.end_date": {"$lt": today, "$ne": None}}, {"workout_plan": 1}, limit=batch_size
+    ))
+    if not users:
+        return 0
+
+    archived_at = datetime.utcnow()
+    ArchivedWorkoutPlans.bulk_write([
+        ReplaceOne(
+            _workout_copy_key(user),
+            {**user["workout_plan"], "user_id": str(user["_id"]), "archived_at": archived_at},
+            upsert=True
+        )
+        for user in users
+    ], ordered=False)
+    # A plan replaced or edited since it was read gets a new seq, and stays on the user
+    archived = [
+        user for user in users
+        if User.find_one_and_update(
+            {"_id": user["_id"], "workout_plan.seq": user["workout_plan"].get("seq")},
+            {"$unset": {"workout_plan": ""}},
+            projection={"_id": 1}
+        )
+    ]
+    archived_ids = {user["_id"] for user in archived}
+    still_hot = {
+        hot["_id"] for hot in User.find(
+            {"_id": {"$in": [user["_id"] for user in users if user["_id"] not in archived_ids]},
+             "workout_plan.end_date": {"$exists": True}},
+            {"_id": 1}
+        )
+    }
+    for user in users:
+        if user["_id"] in still_hot:
+            ArchivedWorkoutPlans.delete_one(_workout_copy_key(user))
+
+    for user in archived:
+        user_id = str(user["_id"])
+        seq = record_tombstone("workout_plan", user["_id"], user_id=user_id)
+        event_bus.publish(user_id, "workout_plan.deleted", {"seq": seq})
+    dashboard.count_plans("workout_plans", -len(archived))
+    return len(archived)
+
+
+def archive_expired_plans(batch_size: int = settings.ARCHIVE_BATCH_SIZE) -> Tuple[int, int]:
+    """Archive every plan that ended before today, in every gym branch. Returns (diet plans, workout plans) archived."""
+    archived_diet_plans = archived_workout_plans = 0
+    with ignore_slow_calls():
+        for gym_id in sorted(settings.GYM_IDS):
+            with tenant(gym_id):
+                today = local_today().isoformat()
+                while True:
+                    archived = archive_diet_plans(today, batch_size)
+                    archived_diet_plans += archived
+                    if not archived:
+                        break
+                while True:
+                    archived = archive_workout_plans(today, batch_size)
+                    archived_workout_plans += archived
+                    if not archived:
+                        break
+    if archived_diet_plans or archived_workout_plans:
+        logger.info("Archived {} diet plans and {} workout plans", archived_diet_plans, archived_workout_plans)
+    return archived_diet_plans, archived_workout_plans
+
+
+async def archive_periodically():
+    """
+    Run the archival every ARCHIVE_INTERVAL_SECONDS, off the event loop, for as long as the worker runs.
+    Every worker starts this loop; the one holding the lease for the interval does the work.
+    """
+    while True:
+        try:
+            if await run_in_threadpool(take_lease, "archive", settings.ARCHIVE_INTERVAL_SECONDS):
+                await run_in_threadpool(archive_expired_plans)
+        except Exception as e:
+            logger.error("Plan archival failed: {}", e)
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    archive_expired_plans()
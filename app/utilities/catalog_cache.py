@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import threading
+from typing import Callable, Dict, List, Tuple
+
+import orjson
+from bson import ObjectId
+from fastapi import Request, Response, status
+from loguru import logger
+
+from app.database import CatalogVersions, Exercises, FoodItems
+from app.schemas.diet_plan import FoodItemSchema
+from app.schemas.exercise import ExerciseResponseSchema
+from app.utilities.compression import brotli, choose_encoding
+from app.utilities.responses import shape
+from app.utilities.tenancy import current_gym
+
+
+class CatalogSnapshot:
+    """
+    Ready-made response bodies for a full catalog listing, kept as identity, gzip and brotli bytes.
+
+    Each gym branch gets its own snapshot, rebuilt only when the branch's catalog version (a counter
+    in the catalog_versions collection, bumped by every write handler through `invalidate()`) differs
+    from the one it was built at, so all workers pick up changes made by any of them.
+    """
+
+    def __init__(self, name: str, build: Callable[[], List[dict]]):
+        self.name = name
+        self._build = build
+        self._lock = threading.Lock()
+        # gym_id -> (version, etag, bodies by encoding)
+        self._snapshots: Dict[str, Tuple[int, str, Dict[str, bytes]]] = {}
+
+    def _version_id(self) -> str:
+        return f"{current_gym()}:{self.name}"
+
+    def invalidate(self):
+        """Mark the catalog as changed. Call this after every write to the underlying collection."""
+        CatalogVersions.update_one({"_id": self._version_id()}, {"$inc": {"version": 1}}, upsert=True)
+
+    def current_version(self) -> int:
+        doc = CatalogVersions.find_one({"_id": self._version_id()})
+        return doc["version"] if doc else 0
+
+    def _refresh(self) -> Tuple[int, str, Dict[str, bytes]]:
+        gym_id = current_gym()
+        version = self.current_version()
+        snapshot = self._snapshots.get(gym_id)
+        if snapshot is not None and snapshot[0] == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(gym_id)
+            if snapshot is not None and snapshot[0] == version:
+                return snapshot
+            body = orjson.dumps(self._build())
+            bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+            if brotli is not None:
+                bodies["br"] = brotli.compress(body, quality=11)
+            etag = f'"{self.name}-{gym_id}-{version}-{hashlib.md5(body).hexdigest()[:16]}"'
+            snapshot = self._snapshots[gym_id] = (version, etag, bodies)
+            logger.info("Rebuilt {} catalog snapshot of {} at version {} ({} bytes)", self.name, gym_id, version, len(body))
+            return snapshot
+
+    def response(self, request: Request) -> Response:
+        """Serve the snapshot in the best encoding the client accepts."""
+        _, etag, bodies = self._refresh()
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", "")) or "identity"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=bodies[encoding], media_type="application/json", headers=headers)
+
+
+def _build_exercise_catalog() -> List[dict]:
+    return [shape(ExerciseResponseSchema, {**ex, "id": str(ex['_id'])}) for ex in Exercises.find()]
+
+
+def _build_food_catalog() -> List[dict]:
+    return [shape(FoodItemSchema, item) for item in FoodItems.find()]
+
+
+exercise_catalog = CatalogSnapshot("exercises", _build_exercise_catalog)
+food_catalog = CatalogSnapshot("food_items", _build_food_catalog)
+
+
+class FoodItemLookup:
+    """
+    Batched, cached lookup of food items by ID, used to resolve diet plan meals on read.
+    Each branch has its own cache, dropped whenever the branch's food catalog version changes.
+    """
+
+    def __init__(self, catalog: CatalogSnapshot):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        # gym_id -> (version, items by ID)
+        self._caches: Dict[str, Tuple[int, Dict[str, dict]]] = {}
+
+    def get_many(self, food_ids) -> Dict[str, dict]:
+        """Return {food_id: food item} for the IDs that exist, with one query for the ones not cached yet."""
+        gym_id = current_gym()
+        version = self._catalog.current_version()
+        with self._lock:
+            cache = self._caches.get(gym_id)
+            if cache is None or cache[0] != version:
+                cache = self._caches[gym_id] = (version, {})
+            items = cache[1]
+
+        missing = {food_id for food_id in food_ids if food_id not in items and ObjectId.is_valid(food_id)}
+        if missing:
+            for item in FoodItems.find({"_id": {"$in": [ObjectId(food_id) for food_id in missing]}}):
+                items[str(item["_id"])] = shape(FoodItemSchema, item)
+
+        return {food_id: items[food_id] for food_id in food_ids if food_id in items}
+
+
+food_lookup = FoodItemLookup(food_catalog)
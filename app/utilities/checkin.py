@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from bson import ObjectId
+from loguru import logger
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.database import AttendanceDays, Checkins
+from app.utilities.tenancy import current_gym, tenant
+from config import settings
+
+
+def checkin_document(user_id: str, checked_in_by: str, slot_id: Optional[str] = None) -> dict:
+    """A check-in as stored, with its gym-local day and hour for the attendance counters."""
+    now = datetime.utcnow()
+    local = now.replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo(settings.GYM_TIMEZONE))
+    return {
+        # The ID is set here so a batch retried after a partial insert skips the documents already written
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "checked_in_by": checked_in_by,
+        "slot_id": slot_id,
+        "checked_in_at": now,
+        "date": local.date().isoformat(),
+        "hour": local.hour,
+    }
+
+
+def write_checkins(checkins: List[dict]):
+    """Insert check-ins of the current gym branch and add them to the per-day attendance counters."""
+    try:
+        Checkins.insert_many(checkins, ordered=False)
+    except BulkWriteError as e:
+        errors = [error for error in e.details["writeErrors"] if error["code"] != 11000]
+        if errors:
+            raise
+
+    per_hour = Counter((checkin["date"], checkin["hour"]) for checkin in checkins)
+    per_day = Counter(checkin["date"] for checkin in checkins)
+    AttendanceDays.bulk_write([
+        UpdateOne(
+            {"date": day},
+            {"$inc": {"checkins": count, **{f"hours.{hour:02d}": n for (d, hour), n in per_hour.items() if d == day}}},
+            upsert=True
+        )
+        for day, count in per_day.items()
+    ], ordered=False)
+
+
+class CheckinBuffer:
+    """
+    In-memory buffer absorbing bursts of check-ins. A background thread writes them with one
+    insert_many per gym branch (plus one counter update per day) whenever `max_size` check-ins
+    are pending or `flush_seconds` have passed.
+
+    Buffered check-ins not written yet are lost if the worker dies; `write_now` writes one
+    synchronously, together with everything pending, for callers that need it stored before answering.
+    Batches that fail to write are kept for the next flush, up to `max_pending` check-ins.
+    """
+
+    def __init__(self, max_size: int, flush_seconds: float, max_pending: int):
+        self.max_size = max_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: Dict[str, List[dict]] = {}
+        self._count = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.counters = {"buffered": 0, "written": 0, "flushes": 0, "failed_flushes": 0, "dropped": 0}
+
+    def add(self, checkin: dict):
+        """Queue a check-in of the current gym branch."""
+        with self._lock:
+            self._ensure_started()
+            self._pending.setdefault(current_gym(), []).append(checkin)
+            self._count += 1
+            self.counters["buffered"] += 1
+            if self._count >= self.max_size:
+                self._wakeup.notify()
+
+    def write_now(self, checkin: dict):
+        """Write a check-in of the current gym branch before returning, flushing the buffer along with it."""
+        gym_id = current_gym()
+        pending = self._take()
+        batch = pending.pop(gym_id, [])
+        try:
+            write_checkins(batch + [checkin])
+        except Exception:
+            # The buffered ones are retried; the caller reports the failure of its own check-in
+            pending.setdefault(gym_id, []).extend(batch)
+            self._requeue(pending)
+            raise
+        self._add_counts(written=len(batch) + 1)
+        self._write(pending)
+
+    def flush(self):
+        """Write every pending check-in now."""
+        self._write(self._take())
+
+    def close(self):
+        """Stop the flusher thread after a last flush, e.g. on shutdown."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"pending": self._count, **self.counters}
+
+    def _add_counts(self, **amounts: int):
+        # Request threads and the flusher thread both count, so every update holds the lock
+        with self._lock:
+            for counter, amount in amounts.items():
+                self.counters[counter] += amount
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="checkin-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_seconds
+                while not self._closed and self._count < self.max_size and time.monotonic() < deadline:
+                    self._wakeup.wait(deadline - time.monotonic())
+                if self._closed:
+                    return
+            self.flush()
+
+    def _take(self) -> Dict[str, List[dict]]:
+        with self._lock:
+            pending, self._pending, self._count = self._pending, {}, 0
+        return pending
+
+    def _write(self, pending: Dict[str, List[dict]]):
+        failed = {}
+        for gym_id, checkins in pending.items():
+            if not checkins:
+                continue
+            try:
+                with tenant(gym_id):
+                    write_checkins(checkins)
+                self._add_counts(written=len(checkins), flushes=1)
+            except Exception as e:
+                self._add_counts(failed_flushes=1)
+                logger.error("Failed to write {} check-ins of {}: {}", len(checkins), gym_id, e)
+                failed[gym_id] = checkins
+        if failed:
+            self._requeue(failed)
+
+    def _requeue(self, failed: Dict[str, List[dict]]):
+        with self._lock:
+            for gym_id, checkins in failed.items():
+                self._pending[gym_id] = checkins + self._pending.get(gym_id, [])
+                self._count += len(checkins)
+            # Past max_pending the oldest check-ins are dropped, so an outage can't exhaust memory
+            while self._count > self.max_pending:
+                gym_id = max(self._pending, key=lambda gym: len(self._pending[gym]))
+                excess = min(self._count - self.max_pending, len(self._pending[gym_id]))
+                del self._pending[gym_id][:excess]
+                self._count -= excess
+                self.counters["dropped"] += excess
+                logger.error("Dropped {} buffered check-ins of {}", excess, gym_id)
+
+
+checkin_buffer = CheckinBuffer(
+    max_size=settings.CHECKIN_BUFFER_SIZE,
+    flush_seconds=settings.CHECKIN_FLUSH_SECONDS,
+    max_pending=settings.CHECKIN_MAX_PENDING,
+)
@@ -0,0 +1,189 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from loguru import logger
+from pymongo import monitoring
+from pymongo.errors import ServerSelectionTimeoutError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Failed commands that mean the server (or the network to it) is in trouble, rather than a bad query
+CONNECTION_ERROR_TYPES = {"AutoReconnect", "ConnectionFailure", "NetworkTimeout", "NotPrimaryError", "ExecutionTimeout"}
+
+# Commands that are long by nature and never count as slow calls: index builds, and the cursor
+# batches fetched while streaming an export
+SLOW_CALL_EXEMPT_COMMANDS = {"createIndexes", "getMore"}
+
+_slow_calls_ignored: ContextVar[bool] = ContextVar("slow_calls_ignored", default=False)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling MongoDB while the circuit breaker is open."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("The database is unavailable, try again later.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to MongoDB after consecutive failures or slow calls, so requests
+    fail fast with a 503 instead of each waiting out the server selection timeout.
+
+    After `reset_timeout` seconds the breaker lets up to `half_open_max_calls` probe calls through:
+    a successful probe closes it again, a failed one reopens it.
+    """
+
+    def __init__(self, failure_threshold: int, slow_call_ms: int, reset_timeout: float, half_open_max_calls: int):
+        self.failure_threshold = failure_threshold
+        self.slow_call_ms = slow_call_ms
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.counters = {"failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not reach MongoDB."""
+        if self.state == CLOSED:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probes = 0
+                self._opened_at = now
+                logger.warning("MongoDB circuit breaker half-open, probing")
+            if self.state == HALF_OPEN:
+                # Probes whose outcome never came back (e.g. an unread cursor) don't block the breaker forever
+                if now - self._opened_at >= self.reset_timeout:
+                    self._probes = 0
+                    self._opened_at = now
+                if self._probes < self.half_open_max_calls:
+                    self._probes += 1
+                    return
+            self.counters["rejected"] += 1
+            retry_after = max(int(self.reset_timeout - (now - self._opened_at)), 1)
+        raise CircuitOpenError(retry_after)
+
+    def record_success(self, duration_ms: Optional[float] = None):
+        """Record an answered call; one slower than slow_call_ms counts as a failure unless its duration is None."""
+        if duration_ms is not None and duration_ms >= self.slow_call_ms:
+            self.counters["slow_calls"] += 1
+            self.record_failure(f"slow call ({duration_ms:.0f} ms)")
+            return
+        if self.state == CLOSED and not self._consecutive_failures:
+            return
+        with self._lock:
+            self._consecutive_failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                logger.warning("MongoDB circuit breaker closed")
+
+    def record_failure(self, reason: str):
+        with self._lock:
+            self.counters["failures"] += 1
+            self._consecutive_failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.counters["opened"] += 1
+                logger.error("MongoDB circuit breaker opened after {} failures (last: {})",
+                             self._consecutive_failures, reason)
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._consecutive_failures, **self.counters}
+
+
+@contextmanager
+def ignore_slow_calls():
+    """
+    Don't count the commands sent in this block (on this thread or task) as slow calls, for
+    background jobs whose whole-collection reads are expected to take long. Failures still count.
+    """
+    token = _slow_calls_ignored.set(True)
+    try:
+        yield
+    finally:
+        _slow_calls_ignored.reset(token)
+
+
+class BreakerCommandListener(monitoring.CommandListener):
+    """Feeds the outcome and duration of every command sent to MongoDB into the breaker."""
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+
+    def started(self, event):
+        pass
+
+    @staticmethod
+    def _duration_ms(event) -> Optional[float]:
+        # None for commands whose duration says nothing about the server's health
+        if event.command_name in SLOW_CALL_EXEMPT_COMMANDS or _slow_calls_ignored.get():
+            return None
+        return event.duration_micros / 1000
+
+    def succeeded(self, event):
+        self.breaker.record_success(self._duration_ms(event))
+
+    def failed(self, event):
+        error_type = event.failure.get("errtype") if isinstance(event.failure, dict) else None
+        if error_type in CONNECTION_ERROR_TYPES:
+            self.breaker.record_failure(f"{event.command_name}: {error_type}")
+        else:
+            # The server answered (e.g. a validation error), so it is reachable
+            self.breaker.record_success(self._duration_ms(event))
+
+
+class BreakerHeartbeatListener(monitoring.ServerHeartbeatListener):
+    """Counts failed server monitor heartbeats, which catch an unreachable server even while no command gets sent."""
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        self.breaker.record_failure(f"heartbeat to {event.connection_id}: {event.reply}")
+
+
+class GuardedCollection:
+    """
+    Collection wrapper that checks the breaker before every operation.
+    Server selection timeouts, which never reach the command listener, are reported to it here.
+    """
+
+    def __init__(self, collection, breaker: CircuitBreaker):
+        self._collection = collection
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not callable(attribute):
+            return attribute
+
+        def guarded(*args, **kwargs):
+            self._breaker.before_call()
+            try:
+                return attribute(*args, **kwargs)
+            except ServerSelectionTimeoutError as e:
+                self._breaker.record_failure(f"server selection: {e}")
+                raise
+
+        return guarded
+
+    def __repr__(self):
+        return f"GuardedCollection({self._collection!r})"
@@ -0,0 +1,104 @@
+import gzip
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {encoding: quality}."""
+    encodings = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[token.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(accept_encoding: str, available=("br", "gzip")) -> Optional[str]:
+    """Pick the best encoding the client accepts among `available`, or None for identity."""
+    encodings = accepted_encodings(accept_encoding)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        if encoding == "br" and brotli is None:
+            continue
+        quality = encodings.get(encoding, encodings.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Gzip responses larger than `minimum_size` on the fly.
+    Responses that already carry a Content-Encoding (pre-compressed snapshots),
+    event streams and other streamed bodies are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or choose_encoding(
+                Headers(scope=scope).get("Accept-Encoding", ""), available=("gzip",)) is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _GZipResponder(send, self.minimum_size, self.compresslevel)
+        await self.app(scope, receive, responder.send)
+
+
+class _GZipResponder:
+    def __init__(self, send: Send, minimum_size: int, compresslevel: int) -> None:
+        self._send = send
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if "content-encoding" in headers or content_type.startswith("text/event-stream"):
+                self.passthrough = True
+                await self._send(message)
+            else:
+                self.start_message = message
+            return
+
+        if self.passthrough or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        if message.get("more_body", False) or len(body) < self.minimum_size:
+            # Streamed and small responses go out as they are
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        body = gzip.compress(body, compresslevel=self.compresslevel)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(body))
+        headers.add_vary_header("Accept-Encoding")
+
+        await self._send(self.start_message)
+        await self._send({"type": "http.response.body", "body": body})
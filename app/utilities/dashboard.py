@@ -0,0 +1,193 @@
+"""
+Counters behind the admin dashboard.
+
+Every figure the dashboard shows lives in a small document of dashboard_stats, one per (gym branch,
+name), bumped with $inc by the handlers that change it: registrations, plan creation and deletion,
+screening submissions. Reading the dashboard is a single query on a fixed set of names, whatever the
+number of users or plans. Counters can drift (a crash between a write and its $inc, data changed by
+hand), so a nightly job recomputes them from the collections and overwrites them. Branches without
+counters are seeded the same way when a worker starts. Every worker schedules both, and the one
+that takes the job's lease runs it.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List
+from zoneinfo import ZoneInfo
+
+from loguru import logger
+from pymongo import ReplaceOne
+from starlette.concurrency import run_in_threadpool
+
+from app.database import DashboardStats, DietPlans, Registrations, Screenings, User
+from app.utilities.circuit_breaker import ignore_slow_calls
+from app.utilities.leaderboard import local_today
+from app.utilities.leases import take_lease
+from app.utilities.tenancy import tenant
+from config import settings
+
+MEMBERS = "members_by_role"
+ACTIVE_PLANS = "active_plans"
+SCREENINGS = "screenings"
+
+
+def _day_name(day: str) -> str:
+    return f"day:{day}"
+
+
+def bump(name: str, field: str, amount: int = 1):
+    """Add `amount` to a counter of the current branch."""
+    DashboardStats.update_one({"name": name}, {"$inc": {f"counts.{field}": amount}}, upsert=True)
+
+
+def count_signup(kind: str):
+    """Count a registration of today: "users" for accounts, "registrations" for registration forms."""
+    bump(_day_name(local_today().isoformat()), kind)
+
+
+def count_member(role, amount: int = 1):
+    """Count a member of `role` (a UserRole or its value)."""
+    bump(MEMBERS, getattr(role, "value", role), amount)
+
+
+def count_plans(kind: str, amount: int = 1):
+    """Count plans becoming active (or, with a negative amount, deleted or archived): "diet_plans" or "workout_plans"."""
+    if amount:
+        bump(ACTIVE_PLANS, kind, amount)
+
+
+def count_screening():
+    bump(SCREENINGS, "submitted")
+
+
+def read_stats(days: int) -> dict:
+    """The dashboard figures of the current branch, with the daily registrations of the last `days` days."""
+    today = local_today()
+    day_names = [_day_name((today - timedelta(days=n)).isoformat()) for n in range(days - 1, -1, -1)]
+    docs = {
+        doc["name"]: doc.get("counts", {})
+        for doc in DashboardStats.find({"name": {"$in": [MEMBERS, ACTIVE_PLANS, SCREENINGS, *day_names]}})
+    }
+
+    members = docs.get(MEMBERS, {})
+    submitted = docs.get(SCREENINGS, {}).get("submitted", 0)
+    customers = members.get("CUSTOMER", 0)
+    return {
+        "members_by_role": members,
+        "active_plans": {"diet_plans": 0, "workout_plans": 0, **docs.get(ACTIVE_PLANS, {})},
+        "screenings_submitted": submitted,
+        "screening_completion_rate": round(min(submitted / customers, 1.0), 4) if customers else None,
+        "registrations": [
+            {"date": name[len("day:"):], "users": docs.get(name, {}).get("users", 0),
+             "registrations": docs.get(name, {}).get("registrations", 0)}
+            for name in day_names
+        ],
+    }
+
+
+def _per_day(collection, since: datetime) -> Dict[str, int]:
+    return {
+        group["_id"]: group["count"]
+        for group in collection.aggregate([
+            {"$match": {"created_at": {"$gte": since}}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at", "timezone": settings.GYM_TIMEZONE}},
+                "count": {"$sum": 1},
+            }},
+        ])
+    }
+
+
+def reconcile_stats(days: int = settings.DASHBOARD_RECONCILE_DAYS) -> int:
+    """
+    Recompute the current branch's counters (daily ones for the last `days` days). Returns the documents rewritten.
+    The counters are overwritten, so a $inc made between the counts and the write is lost until the next run:
+    reconcile at a quiet hour.
+    """
+    today = local_today()
+    local_midnight = datetime.combine(today - timedelta(days=days - 1), datetime.min.time(), ZoneInfo(settings.GYM_TIMEZONE))
+    since = local_midnight.astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
+
+    users = _per_day(User, since)
+    registrations = _per_day(Registrations, since)
+    stats: Dict[str, dict] = {
+        MEMBERS: {group["_id"]: group["count"] for group in User.aggregate([
+            {"$group": {"_id": "$role", "count": {"$sum": 1}}}
+        ]) if group["_id"]},
+        ACTIVE_PLANS: {
+            "diet_plans": DietPlans.count_documents({}),
+            "workout_plans": User.count_documents({"workout_plan": {"$exists": True}}),
+        },
+        SCREENINGS: {"submitted": Screenings.count_documents({})},
+    }
+    for n in range(days):
+        day = (today - timedelta(days=n)).isoformat()
+        stats[_day_name(day)] = {"users": users.get(day, 0), "registrations": registrations.get(day, 0)}
+
+    operations: List[ReplaceOne] = [
+        ReplaceOne({"name": name}, {"name": name, "counts": counts, "reconciled_at": datetime.utcnow()}, upsert=True)
+        for name, counts in stats.items()
+    ]
+    DashboardStats.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def reconcile_all_stats() -> int:
+    rewritten = 0
+    # The whole-collection counts take long on big branches without the database being in trouble
+    with ignore_slow_calls():
+        for gym_id in sorted(settings.GYM_IDS):
+            with tenant(gym_id):
+                rewritten += reconcile_stats()
+    logger.info("Reconciled {} dashboard counters", rewritten)
+    return rewritten
+
+
+# How long the worker that takes a job's lease keeps it: the seeding lease outlasts the other
+# workers' startup, the nightly one expires before the next night
+SEED_LEASE_SECONDS = 600
+RECONCILE_LEASE_SECONDS = 12 * 3600
+
+
+def seed_missing_stats() -> int:
+    """
+    Reconcile the branches that have no counters yet (a fresh deployment on an existing database),
+    so the dashboard is right from the first request instead of after the first nightly run.
+    Only the worker taking the lease seeds.
+    """
+    if not take_lease("dashboard_seed", SEED_LEASE_SECONDS):
+        return 0
+    rewritten = 0
+    with ignore_slow_calls():
+        for gym_id in sorted(settings.GYM_IDS):
+            with tenant(gym_id):
+                if DashboardStats.find_one({"name": MEMBERS}, {"_id": 1}) is None:
+                    rewritten += reconcile_stats()
+    if rewritten:
+        logger.info("Seeded {} dashboard counters", rewritten)
+    return rewritten
+
+
+def _seconds_until_reconciliation() -> float:
+    now = datetime.now(ZoneInfo(settings.GYM_TIMEZONE))
+    next_run = now.replace(hour=settings.DASHBOARD_RECONCILE_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def reconcile_nightly():
+    """
+    Reconcile the counters every night at DASHBOARD_RECONCILE_HOUR (gym time), off the event loop.
+    Every worker wakes up at that hour; the one taking the lease reconciles.
+    """
+    while True:
+        await asyncio.sleep(_seconds_until_reconciliation())
+        try:
+            if await run_in_threadpool(take_lease, "dashboard_reconcile", RECONCILE_LEASE_SECONDS):
+                await run_in_threadpool(reconcile_all_stats)
+        except Exception as e:
+            logger.error("Dashboard counter reconciliation failed: {}", e)
+
+
+if __name__ == "__main__":
+    reconcile_all_stats()
@@ -4,35 +4,48 @@ from pymongo import errors as pymongo_errors
 from app.schemas.error import ErrorResponse
 from fastapi import HTTPException
 from loguru import logger
-import traceback
+
+from app.utilities.circuit_breaker import CircuitOpenError
 
 @contextmanager
 def handle_errors():
+    headers = None
     try:
         yield
+    except CircuitOpenError as e:
+        # The database is known to be unavailable: fail fast and tell the client when to retry
+        response = ErrorResponse(
+            status_code=503, status="ServiceUnavailable", message=str(e)
+        )
+        headers = {"Retry-After": str(e.retry_after)}
+    except pymongo_errors.ConnectionFailure as e:
+        logger.error("MongoDB connection error occurred: {}", e)
+        response = ErrorResponse(
+            status_code=503, status="ServiceUnavailable", message="The database is unavailable, try again later."
+        )
     except pymongo_errors.PyMongoError as e:
-        logger.error(f"MongoDB error occurred: {e}")
+        logger.error("MongoDB error occurred: {}", e)
         response = ErrorResponse(
             status_code=500, status="MongoDBError", message=str(e)
         )
     except HTTPException as e:
         # Capture specific FastAPI HTTPExceptions
-        logger.error(f"HTTPException: {e.detail}")
+        logger.error("HTTPException: {}", e.detail)
         response = ErrorResponse(
             status_code=e.status_code, status="HTTPException", message=e.detail
         )
     except Exception as e:
-        logger.error(f"Internal server error: {e}")
+        # Send the traceback through the logging pipeline instead of a blocking print
+        logger.opt(exception=e).error("Internal server error: {}", e)
         response = ErrorResponse(
             status_code=500, status="InternalServerError", message=str(e)
         )
-        print(traceback.format_exc())
     else:
         response = None
 
     if response is not None:
         # Log the response details before raising the exception
         logger.error(
-            f"Raising HTTP exception with response: {response.status_code} - {response.message}"
+            "Raising HTTP exception with response: {} - {}", response.status_code, response.message
         )
-        raise HTTPException(status_code=response.status_code, detail=vars(response))
+        raise HTTPException(status_code=response.status_code, detail=vars(response), headers=headers)
@@ -0,0 +1,95 @@
+import asyncio
+from typing import Dict, Optional, Set
+
+import orjson
+
+from app.utilities.tenancy import current_gym
+from config import settings
+
+
+def format_event(event: str, data: dict) -> str:
+    """Render one server-sent event."""
+    return f"event: {event}\ndata: {orjson.dumps(data, default=str).decode()}\n\n"
+
+
+RESYNC_EVENT = format_event("resync", {"reason": "Too many pending events, fetch /api/sync"})
+
+
+class EventBus:
+    """
+    In-process pub/sub bus feeding the per-user event streams.
+
+    Each connection gets a bounded queue. When a slow client lets its queue fill up, the pending
+    events are replaced by a single "resync" event telling it to catch up through the sync API,
+    so one stalled connection can never grow memory without bound.
+    Events only reach connections held by the same worker process.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # Gym branch of each subscribed user, so broadcasts stay within a branch
+        self._gyms: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        self._gyms[user_id] = current_gym()
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+                del self._gyms[user_id]
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, user_id: str, event: str, data: dict):
+        """Send an event to every open stream of the user. Safe to call from any thread."""
+        if user_id in self._subscribers:
+            self._dispatch(self._deliver, user_id, format_event(event, data))
+
+    def broadcast(self, event: str, data: dict):
+        """Send an event to every open stream of the current gym branch."""
+        if self._subscribers:
+            self._dispatch(self._deliver_all, current_gym(), format_event(event, data))
+
+    def _dispatch(self, callback, *args):
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            callback(*args)
+        else:
+            # Published from a threadpool handler: hand over to the event loop's thread
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _deliver(self, user_id: str, message: str):
+        for queue in self._subscribers.get(user_id, ()):
+            self._put(queue, message)
+
+    def _deliver_all(self, gym_id: str, message: str):
+        for user_id, queues in self._subscribers.items():
+            if self._gyms.get(user_id) == gym_id:
+                for queue in queues:
+                    self._put(queue, message)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, message: str):
+        if queue.full():
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC_EVENT)
+        else:
+            queue.put_nowait(message)
+
+
+event_bus = EventBus(queue_size=settings.SSE_QUEUE_SIZE)
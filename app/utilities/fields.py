@@ -0,0 +1,71 @@
+import re
+from functools import lru_cache
+from typing import Collection, List, Optional, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, create_model
+
+FIELDS_DESCRIPTION = "Comma-separated list of the fields to return, e.g. `fields=name,category`. Returns every field when omitted."
+
+# Fields that are never returned, whatever is requested
+HIDDEN_FIELDS = {"password"}
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_fields(fields: Optional[str], allowed: Optional[Collection[str]] = None) -> Optional[List[str]]:
+    """
+    Parse the `fields` query parameter into a list of field names, or None when it was not given.
+    With `allowed`, only those (top level) names are accepted; without it, dotted paths into
+    embedded documents are accepted as well.
+    """
+    if fields is None:
+        return None
+
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not names:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields requested.")
+
+    for name in names:
+        parts = name.split(".")
+        if allowed is not None:
+            valid = name in allowed
+        else:
+            valid = all(_FIELD_NAME.match(part) for part in parts) and parts[0] not in HIDDEN_FIELDS
+        if not valid:
+            detail = f"Unknown field '{name}'."
+            if allowed is not None:
+                detail += f" Available fields: {', '.join(sorted(allowed))}"
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+    return names
+
+
+def projection(names: List[str], prefix: str = "") -> dict:
+    """
+    MongoDB projection reading only the requested fields (of the embedded document at `prefix`, if given).
+    "id" maps to _id, which MongoDB returns anyway.
+    """
+    return {f"{prefix}{name}": 1 for name in names if name != "id"} or {"_id": 1}
+
+
+def select(doc: dict, names: List[str]) -> dict:
+    """Build a partial response from a projected document, with only the requested fields that it has."""
+    selected = {}
+    for name in names:
+        if name == "id":
+            selected["id"] = str(doc["_id"])
+        elif name in doc:
+            selected[name] = doc[name]
+    return selected
+
+
+@lru_cache(maxsize=None)
+def partial_model(model: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Variant of a response model where every field is optional, for responses limited by `fields`.
+    Use it with `response_model_exclude_unset=True` so fields that were not requested are left out.
+    """
+    optional_fields = {
+        name: (Optional[field.outer_type_], None) for name, field in model.__fields__.items()
+    }
+    return create_model(f"Partial{model.__name__}", __base__=model, **optional_fields)
@@ -0,0 +1,90 @@
+"""
+Validation of submissions against admin-defined forms.
+
+Each form is compiled into a pydantic model the first time it is submitted to, and the model is kept
+until the form changes: `edit_form` drops it right away on the worker that handled the edit, and the
+other workers notice the form's new seq on their next submission. Submitting then costs one small
+indexed read of the form's seq plus the validation itself.
+"""
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional, Tuple, Type
+
+from bson import ObjectId
+from pydantic import BaseConfig, BaseModel, EmailStr, Extra, Field, create_model
+
+from app.database import Forms
+
+FIELD_TYPES = {
+    "text": str, "string": str, "textarea": str,
+    "number": float, "float": float, "integer": int, "int": int,
+    "boolean": bool, "checkbox": bool,
+    "date": date, "datetime": datetime,
+    "email": EmailStr,
+    "select": str, "multiselect": List[str],
+}
+
+
+class _SubmissionConfig(BaseConfig):
+    extra = Extra.forbid
+    anystr_strip_whitespace = True
+
+
+def compile_form(form: dict) -> Type[BaseModel]:
+    """
+    A model checking answers to the form's fields. Field names are used as aliases, so a field
+    called e.g. "json" or "fields" can't shadow a BaseModel attribute. Unknown field types take text.
+    """
+    definitions = {}
+    for position, field in enumerate(form.get("fields") or []):
+        field_type = field["field_type"].strip().lower()
+        kind = FIELD_TYPES.get(field_type, str)
+        if field.get("options"):
+            allowed = Literal[tuple(field["options"])]
+            kind = List[allowed] if field_type == "multiselect" else allowed
+        if field.get("required"):
+            definitions[f"field_{position}"] = (kind, Field(..., alias=field["field_name"]))
+        else:
+            definitions[f"field_{position}"] = (Optional[kind], Field(None, alias=field["field_name"]))
+    return create_model(f"FormSubmission_{form['_id']}", __config__=_SubmissionConfig, **definitions)
+
+
+def validate_answers(model: Type[BaseModel], answers: dict) -> dict:
+    """The answers checked by the form's model, keyed by field name and ready to store (dates as 'YYYY-MM-DD')."""
+    return {
+        name: value.isoformat() if type(value) is date else value
+        for name, value in model.parse_obj(answers).dict(by_alias=True).items()
+    }
+
+
+class FormValidators:
+    """Compiled submission models by form ID, each kept with the seq of the form it was compiled from."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # form_id -> (seq, model)
+        self._models: Dict[str, Tuple[Optional[int], Type[BaseModel]]] = {}
+
+    def get(self, form_id: ObjectId) -> Optional[Type[BaseModel]]:
+        """The model of the form, or None when the form doesn't exist in the current branch."""
+        current = Forms.find_one({"_id": form_id}, {"seq": 1})
+        if current is None:
+            return None
+        cached = self._models.get(str(form_id))
+        if cached is not None and cached[0] == current.get("seq"):
+            return cached[1]
+
+        form = Forms.find_one({"_id": form_id})
+        if form is None:
+            return None
+        model = compile_form(form)
+        with self._lock:
+            self._models[str(form_id)] = (form.get("seq"), model)
+        return model
+
+    def invalidate(self, form_id: str):
+        with self._lock:
+            self._models.pop(form_id, None)
+
+
+form_validators = FormValidators()
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import jwt
+import orjson
+from loguru import logger
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import oauth2
+from app.database import IdempotencyKeys
+from app.utilities.circuit_breaker import CircuitOpenError
+from app.utilities.tenancy import GYM_HEADER
+from config import settings
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class IdempotencyMiddleware:
+    """
+    Replay the stored response of a write request retried with the same Idempotency-Key header.
+
+    The first request with a key claims it by inserting a document into the idempotency_keys
+    collection (unique _id, TTL index on created_at), runs the handler and stores its response.
+    Retries get that response back without the handler running again. A retry arriving while the
+    first request is still running waits for it instead of racing it, unless the first request's
+    lease (IDEMPOTENCY_LEASE_SECONDS) ran out, which means its worker died: the retry then takes the
+    key over and runs the handler itself. Keys are scoped to the caller: the user named by the token
+    (so a retry after a token refresh still replays), or the branch for requests without a token
+    (registration, login), where the stored fingerprint keeps a key reused for a different request
+    from replaying someone else's response. Requests with an invalid token skip idempotency and are
+    refused by the handler. Server errors are not stored, so the request can be retried for real.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._inflight: Dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        if scope["method"] not in WRITE_METHODS or not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > 255:
+            await _send_json(send, 400, {"detail": "Idempotency-Key is too long."})
+            return
+
+        caller = _caller(headers)
+        if caller is None:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        key_id = hashlib.sha256(f"{caller}\0{key}".encode()).hexdigest()
+        fingerprint = hashlib.sha256(
+            b"\0".join([scope["method"].encode(), scope["path"].encode(), scope["query_string"], body])
+        ).hexdigest()
+
+        try:
+            now = datetime.utcnow()
+            IdempotencyKeys.insert_one({
+                "_id": key_id, "fingerprint": fingerprint, "state": "in_progress", "created_at": now,
+                "lease_expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS),
+            })
+        except DuplicateKeyError:
+            if not await self._replay(key_id, fingerprint, send):
+                return
+        except CircuitOpenError as e:
+            await _send_json(send, 503, {"detail": str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+            return
+
+        self._inflight[key_id] = asyncio.Event()
+        try:
+            await self._run_and_store(scope, body, send, key_id)
+        finally:
+            self._inflight.pop(key_id).set()
+
+    async def _run_and_store(self, scope: Scope, body: bytes, send: Send, key_id: str) -> None:
+        response = {"status": 500, "headers": [], "body": []}
+
+        async def receive_buffered() -> Message:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_and_capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [[k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_buffered, send_and_capture)
+        except Exception:
+            IdempotencyKeys.delete_one({"_id": key_id})
+            raise
+
+        if response["status"] >= 500:
+            IdempotencyKeys.delete_one({"_id": key_id})
+            return
+        IdempotencyKeys.update_one(
+            {"_id": key_id},
+            {"$set": {"state": "completed", "status": response["status"], "headers": response["headers"],
+                      "body": b"".join(response["body"])}}
+        )
+
+    async def _replay(self, key_id: str, fingerprint: str, send: Send) -> bool:
+        """
+        Answer a request whose key is already claimed, with the stored response or an error.
+        Returns True instead when the request took the key over and must run the handler.
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            stored = IdempotencyKeys.find_one({"_id": key_id})
+            if stored is None:
+                # The first attempt failed with a server error and released the key
+                await _send_json(send, 409, {"detail": "The original request failed, retry with a new Idempotency-Key."})
+                return False
+            if stored["fingerprint"] != fingerprint:
+                await _send_json(send, 422, {"detail": "Idempotency-Key was already used for a different request."})
+                return False
+            if stored["state"] == "completed":
+                break
+            if key_id not in self._inflight and self._take_over(stored):
+                logger.warning("Taking over idempotency key {} after its lease expired", key_id[:12])
+                return True
+            if time.monotonic() >= deadline:
+                await _send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress."})
+                return False
+
+            # Wait for the first attempt: on its completion event when it runs in this worker,
+            # otherwise by polling the stored state
+            event = self._inflight.get(key_id)
+            try:
+                await asyncio.wait_for(event.wait() if event else asyncio.sleep(0.1),
+                                       timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+        logger.info("Replaying stored response for idempotency key {}", key_id[:12])
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in stored["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": stored["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": stored["body"]})
+        return False
+
+    @staticmethod
+    def _take_over(stored: dict) -> bool:
+        """Claim a key whose lease expired, unless another retry claimed it first."""
+        now = datetime.utcnow()
+        lease_expires_at = stored.get("lease_expires_at") or stored["created_at"] + timedelta(
+            seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+        if lease_expires_at > now:
+            return False
+        result = IdempotencyKeys.update_one(
+            {"_id": stored["_id"], "state": "in_progress", "lease_expires_at": stored.get("lease_expires_at")},
+            {"$set": {"created_at": now, "lease_expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)}}
+        )
+        return result.modified_count == 1
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+_jwt_settings = oauth2.Settings()
+
+
+def _caller(headers: Headers) -> Optional[str]:
+    """Namespace of the request's keys: its user, its branch when it has no token, None when the token is invalid."""
+    authorization = headers.get("authorization", "")
+    token = authorization[7:] if authorization[:7].lower() == "bearer " else _cookie(headers, "access_token")
+    if not token:
+        return f"anonymous:{headers.get(GYM_HEADER) or settings.DEFAULT_GYM_ID}"
+    try:
+        claims = jwt.decode(token, _jwt_settings.authjwt_public_key, algorithms=_jwt_settings.authjwt_decode_algorithms)
+    except jwt.InvalidTokenError:
+        return None
+    if not claims.get("sub"):
+        return None
+    return f"user:{oauth2.token_gym(claims)}:{claims['sub']}"
+
+
+def _cookie(headers: Headers, name: str) -> str:
+    for part in headers.get("cookie", "").split(";"):
+        cookie_name, _, value = part.strip().partition("=")
+        if cookie_name == name:
+            return value
+    return ""
+
+
+async def _send_json(send: Send, status_code: int, content: dict, headers: list = None) -> None:
+    body = orjson.dumps(content)
+    await send({"type": "http.response.start", "status": status_code,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            *(headers or [])]})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,251 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from bson import ObjectId
+from loguru import logger
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from sortedcontainers import SortedList
+
+from app.database import Counters, LeaderboardScores, Registrations, User
+from app.utilities.tenancy import current_gym
+from config import settings
+
+VOLUME = "volume"  # Completed sets x reps, per week
+STREAK = "streak"  # Consecutive days with at least one completed exercise
+METRICS = (VOLUME, STREAK)
+
+LEADERBOARD_COUNTER = "leaderboards"
+
+# Sequence numbers re-read on every refresh, so entries whose write was still in flight
+# during the previous refresh are not missed (applying an entry twice is harmless)
+REFRESH_OVERLAP = 20
+
+
+def local_today() -> date:
+    return datetime.now(ZoneInfo(settings.GYM_TIMEZONE)).date()
+
+
+def week_period(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def period_for(metric: str, day: date) -> str:
+    """Weekly boards start empty every ISO week; the streak board never rolls over."""
+    return week_period(day) if metric == VOLUME else "all"
+
+
+def day_key(day: str) -> str:
+    # Logged day names become keys of the entry's "days" document
+    return day.strip().replace(".", "_").replace("$", "_") or "_"
+
+
+def completed_volume(exercises: List[dict]) -> int:
+    return sum((exercise.get("sets") or 0) * (exercise.get("reps") or 0)
+               for exercise in exercises if exercise.get("completed"))
+
+
+class Leaderboard:
+    """
+    Scores of one board, kept sorted so top-N and rank queries are O(log n).
+    Ranks are competition ranks: members with the same score share a rank.
+    """
+
+    def __init__(self):
+        self._scores: Dict[str, int] = {}
+        self._ranking = SortedList()  # (-score, user_id)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def set(self, user_id: str, score: int):
+        self.remove(user_id)
+        self._scores[user_id] = score
+        self._ranking.add((-score, user_id))
+
+    def remove(self, user_id: str):
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            self._ranking.remove((-score, user_id))
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, str, int]]:
+        """Return (rank, user_id, score) for the members at positions offset..offset+limit."""
+        entries = []
+        for negative_score, user_id in self._ranking.islice(offset, offset + limit):
+            entries.append((self._ranking.bisect_left((negative_score,)) + 1, user_id, -negative_score))
+        return entries
+
+    def rank(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """Return (rank, score) of the member, or None when they are not on the board."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._ranking.bisect_left((-score,)) + 1, score
+
+
+class LeaderboardPeriod:
+    """
+    The gym-wide and per-slot boards of one metric and period, rebuilt from the
+    leaderboard_scores collection once and then kept up to date incrementally.
+
+    Every refresh only reads the entries written since the previous one (by their `seq`),
+    so entries logged through any worker show up without recomputing the boards.
+    """
+
+    def __init__(self, metric: str, period: str):
+        self.metric = metric
+        self.period = period
+        self._lock = threading.Lock()
+        self._seq = None
+        self._boards: Dict[Optional[str], Leaderboard] = {None: Leaderboard()}
+        self._entries: Dict[str, dict] = {}
+        # Streak entries ordered by the day they were last extended, to drop lapsed streaks
+        self._by_last_date = SortedList()
+
+    def board(self, slot: Optional[str] = None) -> Leaderboard:
+        self.refresh()
+        return self._boards.get(slot) or Leaderboard()
+
+    def refresh(self):
+        with self._lock:
+            query = {"metric": self.metric, "period": self.period}
+            if self._seq is not None:
+                query["seq"] = {"$gt": self._seq - REFRESH_OVERLAP}
+            for entry in LeaderboardScores.find(query):
+                self._apply(entry)
+            if self.metric == STREAK:
+                self._evict_lapsed_streaks()
+
+    def _apply(self, entry: dict):
+        user_id = entry["user_id"]
+        previous = self._entries.get(user_id)
+        if previous is not None:
+            if previous["seq"] > entry["seq"]:
+                return
+            self._remove(user_id, previous)
+
+        if self.metric == STREAK:
+            score = entry.get("streak", 0)
+            self._by_last_date.add((entry["last_date"], user_id))
+        else:
+            score = sum((entry.get("days") or {}).values())
+
+        self._entries[user_id] = entry
+        self._boards[None].set(user_id, score)
+        if entry.get("slot"):
+            self._boards.setdefault(entry["slot"], Leaderboard()).set(user_id, score)
+        self._seq = max(self._seq or 0, entry["seq"])
+
+    def _remove(self, user_id: str, entry: dict):
+        self._boards[None].remove(user_id)
+        if entry.get("slot") in self._boards:
+            self._boards[entry["slot"]].remove(user_id)
+        if self.metric == STREAK:
+            self._by_last_date.discard((entry["last_date"], user_id))
+
+    def _evict_lapsed_streaks(self):
+        # A streak is still alive when it was last extended yesterday or today;
+        # lapsed ones are dropped from the front of the date order, without touching the others
+        oldest_alive = (local_today() - timedelta(days=1)).isoformat()
+        while self._by_last_date and self._by_last_date[0][0] < oldest_alive:
+            _, user_id = self._by_last_date[0]
+            self._remove(user_id, self._entries.pop(user_id))
+
+
+class Leaderboards:
+    """
+    Registry of the boards in memory, per gym branch (boards are refreshed through the branch-scoped
+    collection, so a branch's boards must only be used while serving that branch).
+    Only the most recently used periods are kept, older ones are read again on demand.
+    """
+
+    def __init__(self, max_periods: int = 8):
+        self._lock = threading.Lock()
+        self._periods: "OrderedDict[Tuple[str, str, str], LeaderboardPeriod]" = OrderedDict()
+        self._max_periods = max_periods
+
+    def get(self, metric: str, period: str) -> LeaderboardPeriod:
+        with self._lock:
+            key = (current_gym(), metric, period)
+            if key not in self._periods:
+                self._periods[key] = LeaderboardPeriod(metric, period)
+                if len(self._periods) > self._max_periods:
+                    self._periods.popitem(last=False)
+            self._periods.move_to_end(key)
+            return self._periods[key]
+
+
+leaderboards = Leaderboards(max_periods=8 * len(settings.GYM_IDS))
+
+
+def _member_slots(user_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Slot preference of each member, from their gym registration (matched by email)."""
+    emails = {
+        user["email"]: str(user["_id"])
+        for user in User.find({"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}}, {"email": 1})
+    }
+    slots = {user_id: None for user_id in user_ids}
+    for registration in Registrations.find({"email": {"$in": list(emails)}}, {"email": 1, "slot_preference": 1}):
+        slots[emails[registration["email"]]] = registration.get("slot_preference")
+    return slots
+
+
+def record_progress(entries: List[Tuple[str, str, List[dict]]]):
+    """
+    Update the leaderboards with logged progress, given as (user_id, day, exercises) entries.
+    Call it after the progress was written; all entries are applied with a single bulk write.
+
+    The weekly volume keeps each logged day's volume, so logging a day again replaces its
+    contribution instead of adding to it. The streak is extended once per calendar day.
+    """
+    if not entries:
+        return
+
+    today = local_today()
+    now = datetime.utcnow()
+    user_ids = {user_id for user_id, _, _ in entries}
+    slots = _member_slots(user_ids)
+    seq = Counters.find_one_and_update(
+        {"_id": LEADERBOARD_COUNTER}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )["seq"]
+
+    operations = []
+    week = period_for(VOLUME, today)
+    for user_id, day, exercises in entries:
+        operations.append(UpdateOne(
+            {"_id": f"{VOLUME}:{week}:{user_id}"},
+            {"$set": {f"days.{day_key(day)}": completed_volume(exercises), "metric": VOLUME, "period": week,
+                      "user_id": user_id, "slot": slots.get(user_id), "seq": seq, "updated_at": now}},
+            upsert=True
+        ))
+
+    # Members who completed something today extend (or start) their streak
+    active = {user_id for user_id, _, exercises in entries if any(e.get("completed") for e in exercises)}
+    streak_ids = {f"{STREAK}:all:{user_id}": user_id for user_id in active}
+    current = {entry["_id"]: entry for entry in LeaderboardScores.find({"_id": {"$in": list(streak_ids)}})}
+    yesterday = (today - timedelta(days=1)).isoformat()
+    for entry_id, user_id in streak_ids.items():
+        entry = current.get(entry_id, {})
+        last_date = entry.get("last_date")
+        if last_date == today.isoformat():
+            continue
+        streak = entry.get("streak", 0) + 1 if last_date == yesterday else 1
+        # Conditional on the day read above, so two concurrent logs extend the streak only once
+        operations.append(UpdateOne(
+            {"_id": entry_id, "last_date": last_date},
+            {"$set": {"streak": streak, "last_date": today.isoformat(), "metric": STREAK, "period": "all",
+                      "user_id": user_id, "slot": slots.get(user_id), "seq": seq, "updated_at": now}},
+            upsert=True
+        ))
+
+    try:
+        LeaderboardScores.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate keys come from streaks extended concurrently, which already counted today
+        errors = [error for error in e.details["writeErrors"] if error["code"] != 11000]
+        if errors:
+            logger.error("Failed to update {} leaderboard entries: {}", len(errors), errors[0]["errmsg"])
@@ -0,0 +1,31 @@
+"""
+Leases that let one worker at a time run a background job every worker schedules.
+
+A lease is a document of job_leases naming its holder and when it expires. Taking it is a single
+upsert, so two workers racing for it can't both win; a worker that dies simply lets it expire.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from app.database import JobLeases
+
+# Identifies this worker as the holder of a lease
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def take_lease(job: str, seconds: float) -> bool:
+    """Take (or renew) the lease of `job` for `seconds`, unless another worker holds an unexpired one."""
+    now = datetime.utcnow()
+    try:
+        JobLeases.find_one_and_update(
+            {"_id": job, "$or": [{"expires_at": {"$lte": now}}, {"holder": WORKER_ID}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by someone else, so the upsert tried to create it again
+        return False
+    return True
@@ -0,0 +1,133 @@
+import queue
+import random
+import sys
+import threading
+import uuid
+
+import orjson
+from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+
+class QueuedSink:
+    """
+    Loguru sink that hands records to a writer thread through an in-process queue.
+
+    The request thread only pays for a queue put; building the JSON line and the blocking
+    write to stderr happen on the writer thread. (loguru's own `enqueue=True` pickles every
+    record into a multiprocessing pipe on the calling thread, which costs far more.)
+    """
+
+    def __init__(self, serialize: bool = True, stream=None):
+        self._serialize = serialize
+        self._stream = stream or sys.stderr
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        self._queue.put(message)
+
+    def stop(self):
+        # Called by loguru when the handler is removed: drain what is left and stop the thread
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self._stream.write(self._to_json(message) if self._serialize else self._to_text(message))
+                if self._queue.empty():
+                    self._stream.flush()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _to_json(message) -> str:
+        record = message.record
+        line = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "message": record["message"],
+            "module": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            **record["extra"],
+        }
+        # The handler format is "{exception}", so the message text is the formatted traceback (if any)
+        if message.strip():
+            line["exception"] = message.rstrip()
+        return orjson.dumps(line, default=str).decode() + "\n"
+
+    @staticmethod
+    def _to_text(message) -> str:
+        record = message.record
+        return (f"{record['time']:%Y-%m-%d %H:%M:%S}.{record['time'].microsecond // 1000:03d} | "
+                f"{record['level'].name: <8} | {record['extra'].get('request_id')} | "
+                f"{record['name']}:{record['function']}:{record['line']} - {record['message']}\n{message}")
+
+
+def setup_logging():
+    """Replace loguru's default synchronous stderr handler with a queued sink writing JSON (or plain) lines."""
+    logger.remove()
+    logger.configure(extra={"request_id": None})
+    # Only the traceback (if any) is formatted by loguru on the calling thread,
+    # the sink renders the rest of the line on its writer thread
+    # (a callable format, because loguru appends "{exception}" to plain string formats by itself)
+    logger.add(QueuedSink(serialize=settings.LOG_JSON), level=settings.LOG_LEVEL, format=lambda record: "{exception}",
+               backtrace=False, diagnose=False)
+
+
+class _DroppedLogger:
+    """Stand-in for the logger when a sampled log line is skipped."""
+
+    def _drop(self, *args, **kwargs):
+        pass
+
+    trace = debug = info = success = warning = error = exception = _drop
+
+
+_dropped_logger = _DroppedLogger()
+
+
+def sampled(rate: float = None):
+    """
+    Return the logger for a `rate` fraction of calls (LOG_SAMPLE_RATE by default) and a no-op otherwise.
+    Meant for noisy per-request info lines: `sampled().info("Retrieving ... {}", value)`.
+    """
+    if rate is None:
+        rate = settings.LOG_SAMPLE_RATE
+    return logger if random.random() < rate else _dropped_logger
+
+
+class RequestIdMiddleware:
+    """
+    Tag every log line emitted while handling a request with its request ID.
+    The ID is taken from the X-Request-ID header when the client sends one and echoed back in the response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        with logger.contextualize(request_id=request_id):
+            await self.app(scope, receive, send_with_request_id)
@@ -0,0 +1,171 @@
+"""
+Portion sizes in canonical units.
+
+Food quantities are free text ("200ml", "6 almonds", "1/2 cup", "3 idlies, 1 cup sambar"). They are
+parsed once, when a food item or a meal is written, into a portion of canonical units stored next to
+the text: grams, plus ml for volumes and pieces for counted foods. Reads scale nutrients from the
+stored portions, a numpy row per meal, and never parse text again.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# Nutrient fields of a food item, all given for the food item's own quantity
+NUTRIENT_FIELDS = (
+    "energy_kcal", "carbohydrates", "protein", "fat", "fiber", "calcium", "phosphorous", "iron",
+    "vitamin_a", "vitamin_b1", "vitamin_b2", "vitamin_b3", "vitamin_b9", "vitamin_c",
+    "magnesium", "sodium", "potassium",
+)
+
+MASS_UNITS = {
+    "g": 1.0, "gm": 1.0, "gms": 1.0, "gram": 1.0, "grams": 1.0, "kg": 1000.0, "mg": 0.001,
+    "oz": 28.35, "lb": 453.6,
+}
+VOLUME_UNITS = {
+    "ml": 1.0, "l": 1000.0, "litre": 1000.0, "liter": 1000.0, "litres": 1000.0, "liters": 1000.0,
+    "tsp": 5.0, "teaspoon": 5.0, "teaspoons": 5.0, "tbsp": 15.0, "tablespoon": 15.0, "tablespoons": 15.0,
+    "cup": 240.0, "cups": 240.0, "glass": 250.0, "glasses": 250.0, "bowl": 250.0, "bowls": 250.0,
+}
+COUNT_UNITS = {"piece", "pieces", "pc", "pcs", "nos", "no", "serving", "servings", "unit", "units"}
+SIZES = {"small": 0.75, "medium": 1.0, "large": 1.25}
+
+# Typical weight in grams of one piece, for counted foods without a unit_weight of their own
+PIECE_WEIGHTS = {
+    "almond": 1.2, "apple": 180.0, "banana": 120.0, "chapati": 40.0, "date": 7.0, "dosa": 80.0, "egg": 50.0,
+    "idli": 40.0, "orange": 130.0, "paratha": 80.0, "roti": 40.0, "slice": 30.0, "walnut": 5.0,
+}
+
+# Volumes of foods without a density of their own are weighed as water: milk, curd, dal and curries are close
+DEFAULT_DENSITY = 1.0
+
+# A fraction's denominator has a non-zero digit, so "1/0" doesn't parse instead of dividing by zero
+_FRACTION = r"\d+/\d*[1-9]\d*"
+_PART = re.compile(
+    rf"^(?P<amount>\d+(?:\.\d+)?(?:\s+{_FRACTION})?|{_FRACTION})?\s*"
+    r"(?P<size>small|medium|large)?\s*"
+    r"(?P<unit>[a-z]+(?:\s+[a-z]+)*)?\.?$"
+)
+
+
+class Quantity(NamedTuple):
+    amount: float
+    kind: str  # "mass", "volume" or "count"
+    factor: float  # grams (mass), ml (volume) or pieces (count) per unit of amount
+    noun: Optional[str]  # What is counted, e.g. "almond"
+
+
+def _amount(text: Optional[str]) -> float:
+    if not text:
+        return 1.0
+    total = 0.0
+    for token in text.split():
+        numerator, _, denominator = token.partition("/")
+        total += float(numerator) / float(denominator) if denominator else float(numerator)
+    return total
+
+
+def _singular(noun: str) -> str:
+    for suffix, replacement in (("ies", "i"), ("es", "e"), ("s", "")):
+        if noun.endswith(suffix) and noun[:-len(suffix)] + replacement in PIECE_WEIGHTS:
+            return noun[:-len(suffix)] + replacement
+    return noun[:-1] if noun.endswith("s") and len(noun) > 3 else noun
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text: str) -> Optional[List[Quantity]]:
+    """
+    Parse a free-text quantity into its parts, e.g. "3 idlies, 1 cup sambar" into 3 idli pieces and 240 ml.
+    Returns None when some part isn't understood. Memoized: the same few dozen quantities come up all the time.
+    """
+    parts = []
+    for part in (text or "").lower().replace("½", " 1/2").split(","):
+        match = _PART.match(part.strip())
+        if not match or not (match["amount"] or match["size"] or match["unit"]):
+            return None
+        amount = _amount(match["amount"]) * SIZES.get(match["size"], 1.0)
+        words = (match["unit"] or "").split()
+        unit = words[0] if words else None
+
+        if unit in MASS_UNITS:
+            parts.append(Quantity(amount, "mass", MASS_UNITS[unit], None))
+        elif unit in VOLUME_UNITS:
+            parts.append(Quantity(amount, "volume", VOLUME_UNITS[unit], None))
+        elif unit is None or unit in COUNT_UNITS:
+            parts.append(Quantity(amount, "count", 1.0, None))
+        else:
+            # "6 almonds", "1 cup sambar": a counted noun, or a measure followed by the food's name
+            parts.append(Quantity(amount, "count", 1.0, _singular(unit)))
+    return parts or None
+
+
+def _piece_weight(noun: Optional[str], food: dict) -> Optional[float]:
+    if noun is None or noun not in PIECE_WEIGHTS:
+        if food.get("unit_weight"):
+            return food["unit_weight"]
+        # A bare count ("2", "1 small") counts pieces of the food itself, e.g. of "Boiled egg"
+        noun = next((_singular(word) for word in food.get("food_name", "").lower().split()
+                     if _singular(word) in PIECE_WEIGHTS), noun)
+    return PIECE_WEIGHTS.get(noun)
+
+
+def normalize_portion(quantity: Optional[str], food: dict) -> Optional[Dict[str, Optional[float]]]:
+    """
+    The canonical portion of a quantity of the given food item: {"grams", "ml", "pieces"}.
+    ml and pieces are only set for quantities measured that way; grams whenever the food's
+    density or piece weight allow it. None when the quantity can't be parsed.
+    """
+    parts = parse_quantity(quantity) if quantity else None
+    if not parts:
+        return None
+
+    grams, ml, pieces = 0.0, 0.0, 0.0
+    for part in parts:
+        value = part.amount * part.factor
+        if part.kind == "mass":
+            grams = grams + value if grams is not None else None
+        elif part.kind == "volume":
+            ml += value
+            grams = grams + value * (food.get("density") or DEFAULT_DENSITY) if grams is not None else None
+        else:
+            pieces += value
+            weight = _piece_weight(part.noun, food)
+            grams = grams + value * weight if grams is not None and weight else None
+
+    kinds = {part.kind for part in parts}
+    return {
+        "grams": round(grams, 2) if grams is not None else None,
+        "ml": round(ml, 2) if kinds == {"volume"} else None,
+        "pieces": round(pieces, 2) if kinds == {"count"} else None,
+    }
+
+
+def portion_factor(portion: Optional[dict], base: Optional[dict]) -> Optional[float]:
+    """How many times the food item's own portion `base` fits in `portion`, or None when they don't compare."""
+    if portion is None or base is None:
+        return None
+    # Compare like with like first, so "2 cups" of "1 cup" is 2 whatever the density
+    for unit in ("pieces", "ml", "grams"):
+        if portion.get(unit) and base.get(unit):
+            return portion[unit] / base[unit]
+    return None
+
+
+def scale_nutrients(foods: Sequence[Optional[dict]], factors: Sequence[Optional[float]]) -> List[Optional[dict]]:
+    """
+    Nutrients of each food item scaled by its factor, computed as a single (meals x nutrients) array product.
+    Entries without a food item or a factor are None.
+    """
+    if not foods:
+        return []
+    values = np.array(
+        [[(food or {}).get(field) or 0.0 for field in NUTRIENT_FIELDS] for food in foods], dtype=float
+    )
+    scale = np.array([factor if factor is not None else np.nan for factor in factors], dtype=float)
+    scaled = np.round(values * scale[:, None], 2)
+
+    return [
+        dict(zip(NUTRIENT_FIELDS, row.tolist())) if food is not None and factor is not None else None
+        for food, factor, row in zip(foods, factors, scaled)
+    ]
@@ -0,0 +1,344 @@
+"""
+On-demand profiling of single requests.
+
+Nothing here runs unless PROFILING_ENABLED is set: the middleware isn't added, FastAPI isn't
+patched and the command listener isn't registered. When it is, a request is profiled when an admin
+sends `X-Profile: 1`, or when it falls in the PROFILING_SAMPLE_RATE sample. Other requests then pay
+one context variable lookup per timed call.
+
+A profiled request is run under pyinstrument (statistical, async aware) when it is installed and
+cProfile otherwise, and its wall time is split into phases: auth, db, validation, serialization
+and hashing (bcrypt); the rest is counted as "other". Phases are exclusive: a query run while
+validating counts as db, not validation. The stack profile is written to PROFILING_DIR as a speedscope
+JSON file (pyinstrument) or a pstats dump (cProfile, for flameprof or snakeviz), next to a JSON
+file with the phase timings; admins profiling with the header also get the timings back in a
+Server-Timing header.
+"""
+import cProfile
+import functools
+import inspect
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from loguru import logger
+from pymongo import monitoring
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utilities.log import REQUEST_ID_HEADER
+from config import settings
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pyinstrument is optional, cProfile is always available
+    Profiler = None
+
+PROFILE_HEADER = "X-Profile"
+PHASES = ("auth", "db", "validation", "serialization", "hashing", "other")
+
+_NO_PHASE = nullcontext()
+
+
+class RequestProfile:
+    """Wall time of one request split into exclusive phases: entering a phase pauses the enclosing one."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.db_calls = 0
+        self._stack: List[Tuple[str, float]] = []
+
+    def enter(self, name: str):
+        now = time.perf_counter()
+        if self._stack:
+            outer, since = self._stack[-1]
+            self.phases[outer] = self.phases.get(outer, 0.0) + now - since
+        self._stack.append((name, now))
+
+    def exit(self, name: str):
+        # Phases left unbalanced (e.g. by a command started on another thread of the request) are ignored
+        if not self._stack or self._stack[-1][0] != name:
+            return
+        now = time.perf_counter()
+        _, since = self._stack.pop()
+        self.phases[name] = self.phases.get(name, 0.0) + now - since
+        if self._stack:
+            self._stack[-1] = (self._stack[-1][0], now)
+
+    def timings(self) -> Dict[str, float]:
+        """Milliseconds per phase, with the time outside every phase as "other"."""
+        total = time.perf_counter() - self.started
+        timings = {name: self.phases.get(name, 0.0) for name in PHASES if name != "other"}
+        timings["other"] = max(total - sum(timings.values()), 0.0)
+        return {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+class _Phase:
+    __slots__ = ("profile", "name")
+
+    def __init__(self, profile: RequestProfile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile.enter(self.name)
+
+    def __exit__(self, *exc_info):
+        self.profile.exit(self.name)
+
+
+def phase(name: str):
+    """Context manager timing a block as `name` when the request is being profiled, a no-op otherwise."""
+    profile = _current.get()
+    return _NO_PHASE if profile is None else _Phase(profile, name)
+
+
+def _timed(name: str, function):
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def timed(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await function(*args, **kwargs)
+            profile.enter(name)
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                profile.exit(name)
+    else:
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return function(*args, **kwargs)
+            profile.enter(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.exit(name)
+    return timed
+
+
+_installed = False
+
+
+def install():
+    """Time token checks, FastAPI's validation and serialization steps, JSON rendering and password hashing as phases."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    import fastapi.dependencies.utils
+    import fastapi.routing
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi_jwt_auth import AuthJWT
+
+    from app.utilities import utils
+    from app.utilities.responses import TrustedJSONResponse
+
+    for module, name, phase_name in (
+        (fastapi.dependencies.utils, "request_params_to_args", "validation"),
+        (fastapi.dependencies.utils, "request_body_to_args", "validation"),
+        # Validates the return value against response_model, then encodes it
+        (fastapi.routing, "serialize_response", "validation"),
+        (fastapi.routing, "jsonable_encoder", "serialization"),
+        (utils, "hash_password", "hashing"),
+        (utils, "verify_password", "hashing"),
+    ):
+        setattr(module, name, _timed(phase_name, getattr(module, name)))
+    # Signing and verifying tokens; the user lookup of require_user is a db phase of its own
+    for name in ("jwt_required", "jwt_refresh_token_required", "get_raw_jwt", "get_jwt_subject",
+                 "create_access_token", "create_refresh_token"):
+        setattr(AuthJWT, name, _timed("auth", getattr(AuthJWT, name)))
+    for response_class in (JSONResponse, ORJSONResponse, TrustedJSONResponse):
+        response_class.render = _timed("serialization", response_class.__dict__["render"])
+
+
+class ProfilingCommandListener(monitoring.CommandListener):
+    """Counts the MongoDB commands of a profiled request as its db phase."""
+
+    def started(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.db_calls += 1
+            profile.enter("db")
+
+    def succeeded(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.exit("db")
+
+    def failed(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.exit("db")
+
+
+class _StackProfiler:
+    """pyinstrument when installed, cProfile otherwise, started and stopped around one request."""
+
+    def __init__(self):
+        self._profiler = Profiler(async_mode="enabled") if Profiler is not None else cProfile.Profile()
+
+    def start(self):
+        if Profiler is not None:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if Profiler is not None:
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def write(self, path: str) -> str:
+        if Profiler is not None:
+            path += ".speedscope.json"
+            with open(path, "w") as f:
+                f.write(self._profiler.output(renderer=SpeedscopeRenderer()))
+        else:
+            path += ".prof"
+            self._profiler.dump_stats(path)
+        return path
+
+
+class ProfilingStats:
+    """Totals of the profiled requests, for /api/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.profiled = 0
+        self.phase_seconds = {name: 0.0 for name in PHASES}
+
+    def add(self, timings: Dict[str, float]):
+        with self._lock:
+            self.profiled += 1
+            for name, ms in timings.items():
+                self.phase_seconds[name] += ms / 1000
+
+    def snapshot(self) -> dict:
+        return {"profiled": self.profiled, "phase_seconds": dict(self.phase_seconds)}
+
+
+profiling_stats = ProfilingStats()
+
+# Only one stack profiler runs at a time: both profilers hook the interpreter of the thread they
+# run on, so overlapping requests would tangle. Requests selected meanwhile only get phase timings
+_profiler_lock = threading.Lock()
+
+
+def _requested_by_admin(scope: Scope) -> bool:
+    """Whether the request carries a valid access token of an admin, checked the way require_user checks it."""
+    import jwt
+    from bson import ObjectId
+    from starlette.requests import HTTPConnection
+
+    from app import oauth2
+    from app.database import User
+    from app.utilities.tenancy import tenant
+
+    connection = HTTPConnection(scope)
+    authorization = connection.headers.get("authorization", "")
+    token = authorization[7:] if authorization[:7].lower() == "bearer " else connection.cookies.get("access_token")
+    if not token:
+        return False
+    config = oauth2.Settings()
+    try:
+        claims = jwt.decode(token, config.authjwt_public_key, algorithms=config.authjwt_decode_algorithms)
+        if claims.get("type") != "access":
+            return False
+        with tenant(oauth2.token_gym(claims)):
+            user = User.find_one({"_id": ObjectId(str(claims["sub"]))}, {"role": 1, "verified": 1})
+    except Exception:
+        return False
+    return bool(user) and user.get("verified", False) and user.get("role") == "ADMIN"
+
+
+def _file_stem(scope: Scope) -> str:
+    path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+    request_id = Headers(scope=scope).get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    return os.path.join(settings.PROFILING_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{scope['method']}-{path}-{request_id}")
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests admins ask for with the X-Profile header, and a sample of all requests.
+    The header is only honoured once the request's token is checked to belong to an admin, so anyone
+    else sending it gets no profiler (nor the profiler lock).
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = Headers(scope=scope).get(PROFILE_HEADER, "") not in ("", "0")
+        if requested:
+            requested = await run_in_threadpool(_requested_by_admin, scope)
+        sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+        if not requested and not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        stack_profiler = _StackProfiler() if _profiler_lock.acquire(blocking=False) else None
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start" and requested:
+                timings = profile.timings()
+                MutableHeaders(raw=message["headers"])["Server-Timing"] = ", ".join(
+                    f"{name};dur={ms}" for name, ms in timings.items()
+                )
+            await send(message)
+
+        token = _current.set(profile)
+        if stack_profiler is not None:
+            stack_profiler.start()
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            if stack_profiler is not None:
+                stack_profiler.stop()
+                _profiler_lock.release()
+            _current.reset(token)
+            await self._record(scope, profile, stack_profiler)
+
+    @staticmethod
+    async def _record(scope: Scope, profile: RequestProfile, stack_profiler: Optional[_StackProfiler]):
+        timings = profile.timings()
+        profiling_stats.add(timings)
+        stem = _file_stem(scope)
+        logger.info("Profiled {} {} in {} ms: {}", scope["method"], scope["path"], round(sum(timings.values()), 3), timings)
+
+        def write():
+            os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+            summary = {
+                "method": scope["method"], "path": scope["path"], "query_string": scope["query_string"].decode(),
+                "phases_ms": timings, "db_calls": profile.db_calls,
+                "profile": stack_profiler.write(stem) if stack_profiler is not None else None,
+            }
+            with open(stem + ".json", "wb") as f:
+                f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+
+        try:
+            await run_in_threadpool(write)
+        except OSError as e:
+            logger.error("Unable to write the profile of {} {}: {}", scope["method"], scope["path"], e)
@@ -0,0 +1,109 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from loguru import logger
+
+from config import settings
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+
+# Query shapes whose explain plan has already been checked (debug mode only)
+_explained_shapes = set()
+
+
+def _split_filter(query: dict) -> Tuple[List[str], List[str]]:
+    """Split a filter into its equality fields and its range fields."""
+    equality_fields, range_fields = [], []
+    for field, value in query.items():
+        if isinstance(value, dict):
+            operators = set(value.keys())
+            if not operators or not operators <= RANGE_OPERATORS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unsupported operator on '{field}'. Only ranges are allowed."
+                )
+            range_fields.append(field)
+        else:
+            equality_fields.append(field)
+    return equality_fields, range_fields
+
+
+def covering_index(indexes: Sequence[Tuple[str, ...]], query: dict) -> Optional[Tuple[str, ...]]:
+    """
+    Return the first index whose key prefix matches the filter, or None.
+    Equality fields must come first in the prefix and at most one range field is allowed, in the last position.
+    """
+    equality_fields, range_fields = _split_filter(query)
+    if len(range_fields) > 1:
+        return None
+
+    fields = equality_fields + range_fields
+    for keys in indexes:
+        prefix = keys[:len(fields)]
+        if len(prefix) != len(fields) or set(prefix) != set(fields):
+            continue
+        if range_fields and prefix[-1] != range_fields[0]:
+            continue
+        return keys
+    return None
+
+
+def _query_shape(collection, query: dict) -> tuple:
+    shape = []
+    for field, value in sorted(query.items()):
+        shape.append((field, tuple(sorted(value.keys())) if isinstance(value, dict) else "eq"))
+    return (collection.name, tuple(shape))
+
+
+def _plan_stages(plan) -> List[str]:
+    """Collect every stage name of an explain plan, whatever its nesting."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+def _explain_query(collection, query: dict):
+    shape = _query_shape(collection, query)
+    if shape in _explained_shapes:
+        return
+    _explained_shapes.add(shape)
+
+    try:
+        winning_plan = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+    except Exception as e:
+        logger.warning("Could not explain query shape {}: {}", shape, e)
+        return
+
+    stages = _plan_stages(winning_plan)
+    if "COLLSCAN" in stages or "IXSCAN" not in stages:
+        logger.warning("Query shape {} is not served by an index (plan stages: {})", shape, stages)
+        if settings.QUERY_GUARD_REJECT:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This filter combination is not backed by an index."
+            )
+
+
+def check_query(collection, indexes: Sequence[Tuple[str, ...]], query: dict) -> dict:
+    """
+    Reject filters that are not backed by one of the given indexes.
+    With QUERY_GUARD_EXPLAIN enabled, the explain plan of every new query shape is checked as well.
+    """
+    if query and covering_index(indexes, query) is None:
+        filterable = sorted({field for keys in indexes for field in keys})
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Filtering on {', '.join(sorted(query))} is not supported. "
+                   f"Filterable fields: {', '.join(filterable)}"
+        )
+
+    if query and settings.QUERY_GUARD_EXPLAIN:
+        _explain_query(collection, query)
+
+    return query
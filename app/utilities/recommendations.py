@@ -0,0 +1,262 @@
+"""
+Workout and diet suggestions from the screening answers.
+
+The rules below are declarative: each names conditions on screening fields and the effects it has on
+the recommendation. They are compiled once, at import, into plain predicate functions, so evaluating
+a member is a few function calls whatever the number of members. Effects of later rules override
+earlier ones, except `avoid` and `flags`, which add up.
+
+Conditions: a plain value (equality), or one of {"matches": regex} on text answers,
+{"gte": n}, {"lte": n}, {"between": [low, high]}, {"in": [values]}. An effect value "$field"
+takes the member's answer to that field.
+"""
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from pymongo import ReplaceOne, UpdateOne
+
+from app.database import Exercises, Recommendations, Screenings
+from app.utilities.catalog_cache import CatalogSnapshot, exercise_catalog
+from app.utilities.tenancy import current_gym
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# Training days for each number of days per week, spread to leave rest days in between
+TRAINING_DAYS = {
+    1: (0,), 2: (0, 3), 3: (0, 2, 4), 4: (0, 1, 3, 4), 5: (0, 1, 2, 3, 4), 6: (0, 1, 2, 3, 4, 5), 7: tuple(range(7)),
+}
+
+# Maintenance energy per kg of body weight, before the goal's calorie factor
+KCAL_PER_KG = 30.0
+# Share of the energy target coming from fat
+FAT_SHARE = 0.25
+
+DEFAULTS = {
+    "goal": "general", "types": ["Strength", "Cardio"], "categories": ["Beginner", "Intermediate"],
+    "days": 3, "exercises_per_day": 5, "calorie_factor": 1.0, "protein_per_kg": 1.6,
+    "food_type": None, "avoid": [], "flags": [],
+}
+ADDITIVE = {"avoid", "flags"}
+
+RULES = [
+    {"name": "fat_loss", "when": {"training_goal": {"matches": r"fat|weight loss|lose|cut|slim|lean"}},
+     "then": {"goal": "fat_loss", "types": ["Cardio", "Strength"], "calorie_factor": 0.8, "protein_per_kg": 1.8}},
+    {"name": "muscle_gain", "when": {"training_goal": {"matches": r"muscle|bulk|gain|mass|strength"}},
+     "then": {"goal": "muscle_gain", "types": ["Strength"], "calorie_factor": 1.1, "protein_per_kg": 2.0}},
+    {"name": "endurance", "when": {"training_goal": {"matches": r"endurance|stamina|marathon|run|cardio"}},
+     "then": {"goal": "endurance", "types": ["Cardio", "Strength"], "protein_per_kg": 1.4}},
+    {"name": "high_intensity", "when": {"training_intensity": {"gte": 8}},
+     "then": {"categories": ["Intermediate", "Advanced"], "exercises_per_day": 6}},
+    {"name": "low_intensity", "when": {"training_intensity": {"lte": 3}}, "then": {"exercises_per_day": 4}},
+    {"name": "gap_in_lifting", "when": {"gap_in_lifting": "Yes"}, "then": {"categories": ["Beginner", "Intermediate"]}},
+    {"name": "new_to_lifting", "when": {"lifting_experience": {"matches": r"^\s*(no|none|never|beginner|0)\b"}},
+     "then": {"categories": ["Beginner"]}},
+    {"name": "six_day_split", "when": {"okay_with_six_day_workout": "Yes"}, "then": {"days": 6}},
+    {"name": "stated_days", "when": {"workout_days_per_week": {"between": [1, 7]}}, "then": {"days": "$workout_days_per_week"}},
+    {"name": "back_or_knees", "when": {"back_or_knees_problem": "Yes"},
+     "then": {"avoid": ["squat", "deadlift", "lunge", "jump", "burpee", "leg press"], "flags": ["back_or_knees"]}},
+    {"name": "injuries", "when": {"injuries": "Yes"}, "then": {"categories": ["Beginner"], "flags": ["injuries"]}},
+    {"name": "heart_trouble", "when": {"heart_trouble": "Yes"},
+     "then": {"categories": ["Beginner"], "exercises_per_day": 4, "flags": ["medical_clearance"]}},
+    {"name": "chest_pain", "when": {"chest_pain": "Yes"},
+     "then": {"categories": ["Beginner"], "exercises_per_day": 4, "flags": ["medical_clearance"]}},
+    {"name": "food_preference", "when": {"food_preferences": {"in": ["vegetarian", "non-vegetarian", "ovo vegetarian", "jain food"]}},
+     "then": {"food_type": "$food_preferences"}},
+]
+
+Predicate = Callable[[dict], bool]
+
+
+def _compile_condition(field: str, condition: Any) -> Predicate:
+    if not isinstance(condition, dict):
+        return lambda answers: answers.get(field) == condition
+    (operator, operand), = condition.items()
+    if operator == "matches":
+        pattern = re.compile(operand, re.IGNORECASE)
+        return lambda answers: isinstance(answers.get(field), str) and pattern.search(answers[field]) is not None
+    if operator == "gte":
+        return lambda answers: isinstance(answers.get(field), (int, float)) and answers[field] >= operand
+    if operator == "lte":
+        return lambda answers: isinstance(answers.get(field), (int, float)) and answers[field] <= operand
+    if operator == "between":
+        low, high = operand
+        return lambda answers: isinstance(answers.get(field), (int, float)) and low <= answers[field] <= high
+    if operator == "in":
+        values = frozenset(operand)
+        return lambda answers: answers.get(field) in values
+    raise ValueError(f"Unknown rule operator: {operator}")
+
+
+def _compile_effects(effects: dict) -> Callable[[dict], dict]:
+    references = {key: value[1:] for key, value in effects.items() if isinstance(value, str) and value.startswith("$")}
+    if not references:
+        return lambda answers: effects
+    return lambda answers: {**effects, **{key: answers.get(field) for key, field in references.items()}}
+
+
+class RuleEngine:
+    """Rules compiled into predicates once, evaluated against screening answers."""
+
+    def __init__(self, rules: List[dict], defaults: dict):
+        self.defaults = defaults
+        self.fields = sorted({field for rule in rules for field in rule["when"]})
+        self._rules: List[Tuple[str, Tuple[Predicate, ...], Callable[[dict], dict]]] = [
+            (
+                rule["name"],
+                tuple(_compile_condition(field, condition) for field, condition in rule["when"].items()),
+                _compile_effects(rule["then"]),
+            )
+            for rule in rules
+        ]
+
+    def evaluate(self, answers: dict) -> Tuple[dict, List[str]]:
+        """The merged effects of the rules matching `answers`, and the names of those rules."""
+        effects = {key: list(value) if key in ADDITIVE else value for key, value in self.defaults.items()}
+        matched = []
+        for name, predicates, apply in self._rules:
+            if all(predicate(answers) for predicate in predicates):
+                matched.append(name)
+                for key, value in apply(answers).items():
+                    if key in ADDITIVE:
+                        effects[key].extend(item for item in value if item not in effects[key])
+                    else:
+                        effects[key] = value
+        return effects, matched
+
+
+engine = RuleEngine(RULES, DEFAULTS)
+
+# Screening fields read to recommend a plan
+SCREENING_FIELDS = {field: 1 for field in engine.fields + ["user_id", "version", "weight"]}
+
+
+class PoolSnapshot:
+    """
+    The branch's exercises at one catalog version, with the exercise sequence of every combination
+    of categories, types and avoided words worked out once: members share a handful of them.
+    """
+
+    def __init__(self, version: int, exercises: List[dict]):
+        self.version = version
+        self.exercises = exercises
+        self._sequences: Dict[Tuple, List[dict]] = {}
+
+    def sequence(self, categories: List[str], types: List[str], avoid: List[str]) -> List[dict]:
+        """Suitable exercises, alternating the preferred types so a fat loss day mixes cardio and strength."""
+        key = (tuple(categories), tuple(types), tuple(avoid))
+        sequence = self._sequences.get(key)
+        if sequence is None:
+            words = [word.lower() for word in avoid]
+            suitable = [
+                ex for ex in self.exercises
+                if ex["category"] in categories and not any(word in ex["name"].lower() for word in words)
+            ]
+            by_type = [[ex for ex in suitable if ex["type"] == exercise_type] for exercise_type in types]
+            sequence = self._sequences[key] = [
+                group[i] for i in range(max(map(len, by_type), default=0)) for group in by_type if i < len(group)
+            ]
+        return sequence
+
+
+class ExercisePool:
+    """The branch's exercises as recommendations need them, cached against the exercise catalog version."""
+
+    def __init__(self, catalog: CatalogSnapshot):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        # gym_id -> (version, snapshot)
+        self._pools: Dict[str, Tuple[int, PoolSnapshot]] = {}
+
+    def get(self) -> PoolSnapshot:
+        gym_id = current_gym()
+        version = self._catalog.current_version()
+        with self._lock:
+            cached = self._pools.get(gym_id)
+            if cached is None or cached[0] != version:
+                exercises = [
+                    {"exercise_id": str(ex["_id"]), "name": ex["name"], "type": ex["type"],
+                     "category": ex["category"], "sets": ex["sets"], "reps": ex["reps"]}
+                    for ex in Exercises.find({}, {"name": 1, "type": 1, "category": 1, "sets": 1, "reps": 1})
+                ]
+                exercises.sort(key=lambda ex: ex["name"].lower())
+                cached = self._pools[gym_id] = (version, PoolSnapshot(version, exercises))
+        return cached[1]
+
+
+exercise_pool = ExercisePool(exercise_catalog)
+
+
+def _weekly_plan(effects: dict, pool: PoolSnapshot) -> Dict[str, List[dict]]:
+    """Spread the suitable exercises over the training days, each day picking up where the previous one stopped."""
+    sequence = pool.sequence(effects["categories"], effects["types"], effects["avoid"])
+    days = TRAINING_DAYS[min(max(int(effects["days"] or DEFAULTS["days"]), 1), 7)]
+    per_day = min(effects["exercises_per_day"], len(sequence))
+    return {
+        WEEKDAYS[day]: [sequence[(n * per_day + i) % len(sequence)] for i in range(per_day)]
+        for n, day in enumerate(days)
+    }
+
+
+def _macro_target(effects: dict, weight: Optional[float]) -> Optional[dict]:
+    if not weight or weight <= 0:
+        return None
+    energy = weight * KCAL_PER_KG * effects["calorie_factor"]
+    protein = weight * effects["protein_per_kg"]
+    fat = energy * FAT_SHARE / 9
+    carbohydrates = max(energy - protein * 4 - fat * 9, 0) / 4
+    return {
+        "energy_kcal": round(energy), "protein": round(protein), "fat": round(fat),
+        "carbohydrates": round(carbohydrates), "food_type": effects["food_type"],
+    }
+
+
+def recommend(screening: dict, pool: Optional[PoolSnapshot] = None) -> dict:
+    """The recommendation for one member's screening answers."""
+    effects, matched = engine.evaluate(screening)
+    pool = pool or exercise_pool.get()
+    return {
+        "user_id": screening["user_id"],
+        "screening_version": screening.get("version", 1),
+        "catalog_version": pool.version,
+        "goal": effects["goal"],
+        "days": _weekly_plan(effects, pool),
+        "macros": _macro_target(effects, screening.get("weight")),
+        "flags": effects["flags"],
+        "rules": matched,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def recommend_pending(batch_size: int = 500) -> int:
+    """
+    Recommend a plan to every member of the current branch whose screening was submitted or edited
+    since the last run, in one pass over a cursor. Returns the number of members recommended.
+    """
+    pool = exercise_pool.get()
+    cursor = Screenings.find({"recommendation_pending": {"$ne": False}}, SCREENING_FIELDS, batch_size=batch_size)
+
+    recommended, recommendations, done = 0, [], []
+    for screening in cursor:
+        recommendation = recommend(screening, pool)
+        recommendations.append(ReplaceOne({"user_id": screening["user_id"]}, recommendation, upsert=True))
+        # A screening edited during the run keeps its newer version pending
+        done.append(UpdateOne(
+            {"_id": screening["_id"], "version": screening.get("version")},
+            {"$set": {"recommendation_pending": False}}
+        ))
+        if len(recommendations) >= batch_size:
+            recommended += _write_batch(recommendations, done)
+            recommendations, done = [], []
+    if recommendations:
+        recommended += _write_batch(recommendations, done)
+
+    logger.info("Recommended plans to {} newly screened members of {}", recommended, current_gym())
+    return recommended
+
+
+def _write_batch(recommendations: List[ReplaceOne], done: List[UpdateOne]) -> int:
+    Recommendations.bulk_write(recommendations, ordered=False)
+    Screenings.bulk_write(done, ordered=False)
+    return len(recommendations)
@@ -0,0 +1,63 @@
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple, Type
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+from pydantic.utils import lenient_issubclass
+
+_MISSING = object()
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class TrustedJSONResponse(ORJSONResponse):
+    """JSON response serialized straight with orjson, without FastAPI's jsonable_encoder pass."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache(maxsize=None)
+def _shape_plan(model: Type[BaseModel]) -> List[Tuple[str, ModelField, Optional[Type[BaseModel]], bool]]:
+    plan = []
+    for name, field in model.__fields__.items():
+        nested = field.type_ if lenient_issubclass(field.type_, BaseModel) else None
+        if nested is not None and field.shape not in (SHAPE_SINGLETON, SHAPE_LIST):
+            nested = None
+        plan.append((name, field, nested, field.shape == SHAPE_LIST))
+    return plan
+
+
+def shape(model: Type[BaseModel], data: dict) -> dict:
+    """
+    Keep the fields of `model` from a database document (filling in the defaults of missing ones)
+    without validating the values, the way `model.construct()` would, but recursing into
+    nested models and producing plain dicts ready to serialize.
+    """
+    shaped = {}
+    for name, field, nested, is_list in _shape_plan(model):
+        value = data.get(name, _MISSING)
+        if value is _MISSING:
+            value = field.get_default()
+        elif nested is not None and value is not None:
+            value = [shape(nested, item) for item in value] if is_list else shape(nested, value)
+        shaped[name] = value
+    return shaped
+
+
+def trusted_response(model: Type[BaseModel], data, status_code: int = 200) -> TrustedJSONResponse:
+    """
+    Respond with database documents (one or a list) shaped as `model`, skipping response model validation.
+
+    Only for data this API wrote and validated itself on the way in: the values are returned as stored.
+    Returning a Response also bypasses the route's response_model, which then only documents the endpoint.
+    """
+    content = [shape(model, item) for item in data] if isinstance(data, list) else shape(model, data)
+    return TrustedJSONResponse(content, status_code=status_code)
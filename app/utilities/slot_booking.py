@@ -0,0 +1,151 @@
+"""
+Seat accounting of slot bookings.
+
+Every (slot, day) has a counter document in slot_days holding its seats_left. A seat is only ever
+taken by a single conditional find_one_and_update (`seats_left > 0` -> decrement) and given back by
+an increment, so concurrent bookings can never oversell a slot, whatever the number of workers.
+Members who find no seat are waitlisted; seats given back are handed to the waitlist in order.
+"""
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.database import SlotBookings, SlotDays, Slots
+from app.schemas.slots import BookingStatus
+from app.utilities.events import event_bus
+
+# Bookings that hold a seat or a waitlist spot; a member has at most one per slot and day
+ACTIVE = {"active": True}
+
+
+class AlreadyBooked(Exception):
+    pass
+
+
+def _ensure_day(slot: dict, day: str):
+    """
+    Create the seat counter of the slot's day, at full capacity, the first time the day is booked.
+    Counters carry the capacity they count seats of, so one created while the capacity changes is
+    brought to the new capacity exactly once, either here or by `resize`.
+    """
+    slot_id = str(slot["_id"])
+    capacity = slot["capacity"]
+    try:
+        result = SlotDays.update_one(
+            {"slot_id": slot_id, "date": day},
+            {"$setOnInsert": {"seats_left": capacity, "capacity": capacity}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Created by a concurrent booking
+        return
+    if result.upserted_id is None:
+        return
+    # A capacity change since the slot was read missed this counter
+    latest = Slots.find_one({"_id": slot["_id"]}, {"capacity": 1})
+    if latest and latest["capacity"] != capacity:
+        SlotDays.update_one(
+            {"_id": result.upserted_id, "capacity": capacity},
+            {"$inc": {"seats_left": latest["capacity"] - capacity}, "$set": {"capacity": latest["capacity"]}}
+        )
+
+
+def _claim_seat(slot_id: str, day: str) -> bool:
+    return SlotDays.find_one_and_update(
+        {"slot_id": slot_id, "date": day, "seats_left": {"$gt": 0}},
+        {"$inc": {"seats_left": -1}}
+    ) is not None
+
+
+def _release_seat(slot_id: str, day: str):
+    SlotDays.update_one({"slot_id": slot_id, "date": day}, {"$inc": {"seats_left": 1}})
+
+
+def book(slot: dict, day: str, user_id: str) -> dict:
+    """Book a seat for the member, or put them on the waitlist when the slot is full."""
+    slot_id = str(slot["_id"])
+    _ensure_day(slot, day)
+    has_seat = _claim_seat(slot_id, day)
+
+    now = datetime.utcnow()
+    booking = {
+        "slot_id": slot_id, "date": day, "user_id": user_id, **ACTIVE, "created_at": now,
+        "status": BookingStatus.BOOKED.value if has_seat else BookingStatus.WAITLISTED.value,
+        "booked_at": now if has_seat else None,
+    }
+    try:
+        SlotBookings.insert_one(booking)
+    except DuplicateKeyError:
+        if has_seat:
+            _release_seat(slot_id, day)
+        raise AlreadyBooked()
+
+    if not has_seat:
+        # A seat given back between the failed claim and the insert would otherwise stay unused
+        promote_waitlist(slot_id, day)
+        booking = SlotBookings.find_one({"_id": booking["_id"]})
+    return booking
+
+
+def cancel(booking_id: ObjectId, user_id: Optional[str] = None) -> Optional[dict]:
+    """Cancel an active booking (of `user_id`, when given); a seat it held goes to the waitlist."""
+    query = {"_id": booking_id, **ACTIVE}
+    if user_id is not None:
+        query["user_id"] = user_id
+    booking = SlotBookings.find_one_and_update(
+        query,
+        {"$set": {"status": BookingStatus.CANCELLED.value, "cancelled_at": datetime.utcnow()}, "$unset": {"active": ""}},
+        return_document=ReturnDocument.AFTER
+    )
+    if booking is not None and booking.get("booked_at"):
+        _release_seat(booking["slot_id"], booking["date"])
+        promote_waitlist(booking["slot_id"], booking["date"])
+    return booking
+
+
+def promote_waitlist(slot_id: str, day: str) -> int:
+    """Give free seats to waitlisted members, first come first served. Returns the number promoted."""
+    promoted = 0
+    while _claim_seat(slot_id, day):
+        booking = SlotBookings.find_one_and_update(
+            {"slot_id": slot_id, "date": day, "status": BookingStatus.WAITLISTED.value, **ACTIVE},
+            {"$set": {"status": BookingStatus.BOOKED.value, "booked_at": datetime.utcnow()}},
+            sort=[("created_at", 1), ("_id", 1)]
+        )
+        if booking is None:
+            _release_seat(slot_id, day)
+            break
+        promoted += 1
+        event_bus.publish(booking["user_id"], "slot_booking.booked", {"id": str(booking["_id"]), "date": day})
+    return promoted
+
+
+def waitlist_position(booking: dict) -> Optional[int]:
+    if booking["status"] != BookingStatus.WAITLISTED.value:
+        return None
+    ahead = SlotBookings.count_documents({
+        "slot_id": booking["slot_id"], "date": booking["date"], "status": BookingStatus.WAITLISTED.value, **ACTIVE,
+        "created_at": {"$lt": booking["created_at"]},
+    })
+    return ahead + 1
+
+
+def booking_response(booking: dict) -> dict:
+    return {**booking, "id": str(booking["_id"]), "waitlist_position": waitlist_position(booking)}
+
+
+def resize(slot_id: str, capacity: int, delta: int, from_day: str):
+    """
+    Apply a capacity change (to `capacity`, by `delta`) to the days from `from_day` on, promoting waitlisted
+    members into new seats. Counters already created at the new capacity are left alone.
+    """
+    SlotDays.update_many(
+        {"slot_id": slot_id, "date": {"$gte": from_day}, "capacity": {"$ne": capacity}},
+        {"$inc": {"seats_left": delta}, "$set": {"capacity": capacity}}
+    )
+    if delta > 0:
+        for day in SlotDays.distinct("date", {"slot_id": slot_id, "date": {"$gte": from_day}}):
+            promote_waitlist(slot_id, day)
@@ -0,0 +1,142 @@
+"""
+Food substitutes ranked by nutrient similarity.
+
+Each gym branch's food catalog is kept as a numpy matrix of nutrients per 100 g (per serving for
+items whose quantity can't be weighed), every column divided by its standard deviation so kcal
+don't drown out mg of iron. A query is one vectorized distance computation over the whole matrix
+plus an argpartition, well under a millisecond for tens of thousands of items. The matrix is
+rebuilt only when the branch's food catalog version changes.
+"""
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.database import FoodItems
+from app.schemas.screening import FoodPreferences
+from app.utilities.catalog_cache import CatalogSnapshot, food_catalog
+from app.utilities.portions import NUTRIENT_FIELDS
+from app.utilities.tenancy import current_gym
+
+# Diets from the strictest; a food fits its own diet and every less strict one
+DIET_ORDER = (
+    FoodPreferences.JAIN_FOOD, FoodPreferences.VEGETARIAN,
+    FoodPreferences.OVO_VEGETARIAN, FoodPreferences.NON_VEGETARIAN,
+)
+_DIET_RANK = {diet.value: rank for rank, diet in enumerate(DIET_ORDER)}
+# Foods without a food_type (most of a catalog created before food types) pass every diet filter,
+# marked as unverified so the member or their trainer checks them
+_UNKNOWN_RANK = -1
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def _terms(text: str) -> Set[str]:
+    """Lowercase words of a food name or allergy, with a plural 's' dropped: "Peanuts" matches "peanut"."""
+    return {word[:-1] if word.endswith("s") and len(word) > 3 else word for word in _WORD.findall(text.lower())}
+
+
+class NutrientMatrix(NamedTuple):
+    ids: List[str]
+    positions: Dict[str, int]
+    values: np.ndarray  # (items x nutrients), divided by the column standard deviations
+    diet_ranks: np.ndarray
+    terms: Dict[str, np.ndarray]  # word of a name or allergen -> rows containing it
+
+
+def _build_matrix() -> NutrientMatrix:
+    projection = {field: 1 for field in NUTRIENT_FIELDS + ("food_name", "food_type", "allergens", "portion")}
+    ids, rows, ranks, terms = [], [], [], {}
+    for row, item in enumerate(FoodItems.find({}, projection)):
+        ids.append(str(item["_id"]))
+        grams = (item.get("portion") or {}).get("grams")
+        per_100g = 100.0 / grams if grams else 1.0
+        rows.append([(item.get(field) or 0.0) * per_100g for field in NUTRIENT_FIELDS])
+        ranks.append(_DIET_RANK.get(item.get("food_type"), _UNKNOWN_RANK))
+        for term in _terms(" ".join([item.get("food_name", "")] + (item.get("allergens") or []))):
+            terms.setdefault(term, []).append(row)
+
+    values = np.array(rows, dtype=np.float64).reshape(len(rows), len(NUTRIENT_FIELDS))
+    spread = values.std(axis=0) if len(rows) else np.ones(len(NUTRIENT_FIELDS))
+    values /= np.where(spread > 0, spread, 1.0)
+    return NutrientMatrix(
+        ids=ids,
+        positions={food_id: row for row, food_id in enumerate(ids)},
+        values=values,
+        diet_ranks=np.array(ranks, dtype=np.int8),
+        terms={term: np.array(rows_, dtype=np.intp) for term, rows_ in terms.items()},
+    )
+
+
+class FoodSubstitutes:
+    """Nearest food items by nutrients, from a per-branch matrix cached against the food catalog version."""
+
+    def __init__(self, catalog: CatalogSnapshot):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        # gym_id -> (version, matrix)
+        self._matrices: Dict[str, Tuple[int, NutrientMatrix]] = {}
+
+    def matrix(self) -> NutrientMatrix:
+        gym_id = current_gym()
+        version = self._catalog.current_version()
+        cached = self._matrices.get(gym_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._lock:
+            cached = self._matrices.get(gym_id)
+            if cached is None or cached[0] != version:
+                matrix = _build_matrix()
+                cached = self._matrices[gym_id] = (version, matrix)
+                logger.info("Rebuilt the nutrient matrix of {} at version {} ({} food items)", gym_id, version, len(matrix.ids))
+        return cached[1]
+
+    def rank(
+        self,
+        food_id: str,
+        limit: int,
+        nutrients: Optional[Sequence[str]] = None,
+        diet: Optional[str] = None,
+        avoid: Iterable[str] = (),
+    ) -> Optional[List[Tuple[str, float, bool]]]:
+        """
+        The `limit` food items closest to `food_id` as [(food_id, distance, unverified_diet)], nearest first,
+        compared on `nutrients` only when given. `diet` keeps the items that fit a FoodPreferences diet, and
+        the items without a food_type, flagged as unverified; `avoid` drops the items whose name or allergens
+        mention one of its words. None when the item is unknown.
+        """
+        matrix = self.matrix()
+        row = matrix.positions.get(food_id)
+        if row is None:
+            return None
+
+        values = matrix.values
+        if nutrients:
+            values = values[:, [NUTRIENT_FIELDS.index(name) for name in nutrients]]
+        distances = np.sqrt(np.square(values - values[row]).sum(axis=1))
+
+        excluded = np.zeros(len(matrix.ids), dtype=bool)
+        excluded[row] = True
+        if diet is not None:
+            excluded |= matrix.diet_ranks > _DIET_RANK[diet]
+        for term in _terms(" ".join(avoid)):
+            if term in matrix.terms:
+                excluded[matrix.terms[term]] = True
+        distances[excluded] = np.inf
+
+        limit = min(limit, int((~excluded).sum()))
+        if limit <= 0:
+            return []
+        nearest = np.argpartition(distances, limit - 1)[:limit]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        # Any food fits the least strict diet, so only stricter ones leave untyped items unverified
+        restricted = diet is not None and _DIET_RANK[diet] < len(DIET_ORDER) - 1
+        return [
+            (matrix.ids[i], round(float(distances[i]), 4), restricted and bool(matrix.diet_ranks[i] == _UNKNOWN_RANK))
+            for i in nearest
+        ]
+
+
+food_substitutes = FoodSubstitutes(food_catalog)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Optional
+from pymongo import ReturnDocument
+
+from app.database import Counters, Tombstones
+
+SYNC_COUNTER = "sync"
+
+
+def next_seq() -> int:
+    """Allocate the next value of the global change sequence used by the sync API."""
+    counter = Counters.find_one_and_update(
+        {"_id": SYNC_COUNTER},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+
+def current_seq() -> int:
+    counter = Counters.find_one({"_id": SYNC_COUNTER})
+    return counter["seq"] if counter else 0
+
+
+def sync_stamp() -> dict:
+    """Fields every write handler sets on the documents it creates or updates."""
+    return {"seq": next_seq(), "updated_at": datetime.utcnow()}
+
+
+def record_tombstone(collection: str, doc_id, user_id: Optional[str] = None) -> int:
+    """
+    Remember that a document was deleted so syncing clients can drop it.
+    `user_id` restricts the tombstone to that member's sync (e.g. their diet plans).
+    Returns the sequence number of the deletion.
+    """
+    seq = next_seq()
+    Tombstones.insert_one({
+        "collection": collection,
+        "doc_id": str(doc_id),
+        "user_id": user_id,
+        "seq": seq,
+        "deleted_at": datetime.utcnow()
+    })
+    return seq
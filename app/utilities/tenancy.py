@@ -0,0 +1,168 @@
+import copy
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from pymongo import ASCENDING
+
+from config import settings
+
+TENANT_FIELD = "gym_id"
+
+# Header naming the branch of requests that carry no token yet (register, login, public catalog reads)
+GYM_HEADER = "x-gym-id"
+
+# Branch of the request being handled. Authenticated requests take it from the token's gym_id claim
+_current_gym: ContextVar[Optional[str]] = ContextVar("gym_id", default=None)
+
+
+class UnknownGym(Exception):
+    pass
+
+
+def current_gym() -> str:
+    """The branch every tenant-scoped query of the current request runs against."""
+    return _current_gym.get() or settings.DEFAULT_GYM_ID
+
+
+def set_current_gym(gym_id: str):
+    """Switch the rest of the current request (or task) to `gym_id`."""
+    if gym_id not in settings.GYM_IDS:
+        raise UnknownGym(gym_id)
+    _current_gym.set(gym_id)
+
+
+@contextmanager
+def tenant(gym_id: str):
+    """Run a block against one branch, e.g. in scripts and background jobs that serve every branch."""
+    token = _current_gym.set(gym_id)
+    try:
+        yield
+    finally:
+        _current_gym.reset(token)
+
+
+def _scoped(query: Optional[dict]) -> dict:
+    return {**(query or {}), TENANT_FIELD: current_gym()}
+
+
+def _with_tenant(doc: dict) -> dict:
+    doc[TENANT_FIELD] = current_gym()
+    return doc
+
+
+class TenantCollection:
+    """
+    Collection wrapper that confines every read and write to the current branch: filters and
+    aggregations get a gym_id condition, inserted documents get the gym_id field, and every index
+    is created with gym_id as its first key, which is also the key the collections can be sharded on.
+
+    `unscoped` gives the underlying collection, for migrations and jobs that span every branch.
+    """
+
+    def __init__(self, collection):
+        self.unscoped = collection
+
+    def __getattr__(self, name):
+        return getattr(self.unscoped, name)
+
+    def _filtered(self, method: str, args: tuple, kwargs: dict):
+        if args:
+            args = (_scoped(args[0]),) + args[1:]
+        else:
+            kwargs["filter"] = _scoped(kwargs.get("filter"))
+        return getattr(self.unscoped, method)(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return self._filtered("find", args, kwargs)
+
+    def find_one(self, *args, **kwargs):
+        return self._filtered("find_one", args, kwargs)
+
+    def find_one_and_update(self, *args, **kwargs):
+        return self._filtered("find_one_and_update", args, kwargs)
+
+    def find_one_and_delete(self, *args, **kwargs):
+        return self._filtered("find_one_and_delete", args, kwargs)
+
+    def update_one(self, *args, **kwargs):
+        return self._filtered("update_one", args, kwargs)
+
+    def update_many(self, *args, **kwargs):
+        return self._filtered("update_many", args, kwargs)
+
+    def delete_one(self, *args, **kwargs):
+        return self._filtered("delete_one", args, kwargs)
+
+    def delete_many(self, *args, **kwargs):
+        return self._filtered("delete_many", args, kwargs)
+
+    def count_documents(self, *args, **kwargs):
+        return self._filtered("count_documents", args, kwargs)
+
+    def distinct(self, key, filter=None, **kwargs):
+        return self.unscoped.distinct(key, _scoped(filter), **kwargs)
+
+    def replace_one(self, filter, replacement, *args, **kwargs):
+        return self.unscoped.replace_one(_scoped(filter), _with_tenant(dict(replacement)), *args, **kwargs)
+
+    def find_one_and_replace(self, filter, replacement, *args, **kwargs):
+        return self.unscoped.find_one_and_replace(_scoped(filter), _with_tenant(dict(replacement)), *args, **kwargs)
+
+    def insert_one(self, document, *args, **kwargs):
+        return self.unscoped.insert_one(_with_tenant(document), *args, **kwargs)
+
+    def insert_many(self, documents, *args, **kwargs):
+        return self.unscoped.insert_many([_with_tenant(doc) for doc in documents], *args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        return self.unscoped.aggregate([{"$match": _scoped(None)}, *pipeline], *args, **kwargs)
+
+    def bulk_write(self, requests, *args, **kwargs):
+        scoped = []
+        for request in requests:
+            request = copy.copy(request)
+            if hasattr(request, "_filter"):
+                # Updates upserted through the filter pick up its gym_id
+                request._filter = _scoped(request._filter)
+                if type(request).__name__ == "ReplaceOne":
+                    request._doc = _with_tenant(dict(request._doc))
+            else:
+                request._doc = _with_tenant(request._doc)
+            scoped.append(request)
+        return self.unscoped.bulk_write(scoped, *args, **kwargs)
+
+    def create_index(self, keys, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, ASCENDING)]
+        return self.unscoped.create_index([(TENANT_FIELD, ASCENDING), *keys], **kwargs)
+
+    def __repr__(self):
+        return f"TenantCollection({self.unscoped!r})"
+
+
+class TenantMiddleware:
+    """
+    Scopes requests that name their branch in the X-Gym-Id header (before any token exists, e.g. register
+    and login). Authenticated requests are scoped to their token's branch by `require_user` instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        gym_id = None
+        if scope["type"] == "http":
+            gym_id = next((value.decode("latin-1") for name, value in scope["headers"] if name == GYM_HEADER.encode()), None)
+        if gym_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        if gym_id not in settings.GYM_IDS:
+            response = JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": f"Unknown gym '{gym_id}'."})
+            await response(scope, receive, send)
+            return
+        with tenant(gym_id):
+            await self.app(scope, receive, send)
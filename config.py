@@ -1,3 +1,5 @@
+from typing import Set
+
 from pydantic import BaseSettings
 
 
@@ -13,6 +15,82 @@ class Settings(BaseSettings):
 
     CLIENT_ORIGIN: str
 
+    # Gym branches served by this deployment (a JSON list in the environment), and the branch of
+    # requests and tokens that don't name one, which is where documents from before tenancy live
+    GYM_IDS: Set[str] = {"main"}
+    DEFAULT_GYM_ID: str = "main"
+
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    # MongoDB circuit breaker: consecutive failed (or slower than CIRCUIT_SLOW_CALL_MS, background jobs,
+    # index builds and streamed cursors aside) calls that open it, seconds before it lets probe calls
+    # through, and how many probes at once
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_SLOW_CALL_MS: int = 2000
+    CIRCUIT_RESET_SECONDS: int = 10
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = 2
+
+    # Explain every new list query shape and log (or reject) the ones not served by an index
+    QUERY_GUARD_EXPLAIN: bool = False
+    QUERY_GUARD_REJECT: bool = False
+
+    # Responses at least this large (in bytes) are gzipped on the fly
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+
+    # Sequence numbers before a sync token that are served again to cover writes in flight during the last sync
+    SYNC_OVERLAP: int = 20
+
+    # Server-sent events: seconds between heartbeats and pending events kept per connection
+    SSE_HEARTBEAT_SECONDS: int = 15
+    SSE_QUEUE_SIZE: int = 100
+
+    # Idempotency keys: how long stored responses are kept, how long a retry waits for the original request,
+    # and how long a request holds its key before a retry may assume its worker died and run it again
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_WAIT_SECONDS: int = 30
+    IDEMPOTENCY_LEASE_SECONDS: int = 120
+
+    # Most sub-requests accepted by POST /api/batch
+    BATCH_MAX_REQUESTS: int = 20
+
+    # Seconds between runs of the job archiving plans past their end_date (0 disables it), and plans moved per batch
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+    ARCHIVE_BATCH_SIZE: int = 500
+
+    # How many days ahead members can book a slot
+    SLOT_BOOKING_DAYS_AHEAD: int = 14
+
+    # Check-ins are buffered and written in batches of CHECKIN_BUFFER_SIZE, or every CHECKIN_FLUSH_SECONDS;
+    # at most CHECKIN_MAX_PENDING are kept while the database is unavailable
+    CHECKIN_BUFFER_SIZE: int = 500
+    CHECKIN_FLUSH_SECONDS: float = 1.0
+    CHECKIN_MAX_PENDING: int = 20000
+
+    # Hour of the night (gym time) the dashboard counters are recomputed from the data (-1 disables it),
+    # and how many days of daily registration counters are recomputed
+    DASHBOARD_RECONCILE_HOUR: int = 3
+    DASHBOARD_RECONCILE_DAYS: int = 35
+
+    # Most entries accepted by POST /api/workout-plan/progress/bulk
+    BULK_PROGRESS_MAX_ENTRIES: int = 500
+
+    # Timezone of the gym: day and week boundaries of the leaderboards and body metric charts
+    GYM_TIMEZONE: str = "Asia/Kolkata"
+
+    # Longest range of individual body metric measurements returned without downsampling
+    BODY_METRICS_RAW_MAX_POINTS: int = 1000
+
+    # Per-request profiling (app.utilities.profiling), off entirely unless enabled: admins then profile a request
+    # by sending X-Profile: 1, PROFILING_SAMPLE_RATE of all requests are profiled, and profiles go to PROFILING_DIR
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_DIR: str = "profiles"
+
+    LOG_LEVEL: str = "INFO"
+    # JSON lines by default, human readable lines for local development
+    LOG_JSON: bool = True
+    # Fraction of noisy per-request info lines that are actually logged
+    LOG_SAMPLE_RATE: float = 0.1
+
     class Config:
         env_file = '.env'
 
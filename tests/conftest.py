@@ -0,0 +1,29 @@
+"""
+Test setup: the app's collections are backed by mongomock instead of a MongoDB server.
+
+The client is swapped before anything imports app.database, which connects at import time.
+Requires `pip install pytest mongomock`.
+"""
+import base64
+import os
+
+import mongomock
+import pymongo
+
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_INITDB_DATABASE", "levelup_test")
+os.environ.setdefault("JWT_PUBLIC_KEY", base64.b64encode(b"test").decode())
+os.environ.setdefault("JWT_PRIVATE_KEY", base64.b64encode(b"test").decode())
+os.environ.setdefault("REFRESH_TOKEN_EXPIRES_IN", "60")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRES_IN", "15")
+os.environ.setdefault("JWT_ALGORITHM", "RS256")
+os.environ.setdefault("CLIENT_ORIGIN", "http://localhost:3000")
+
+
+class MockClient(mongomock.MongoClient):
+    def __init__(self, *args, **kwargs):
+        # The server URL and the pymongo-only options (timeouts, event listeners) don't apply
+        super().__init__()
+
+
+pymongo.MongoClient = MockClient
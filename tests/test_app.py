@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+
+from app.database import User
+from app.main import app
+
+
+def test_startup_and_shutdown_hooks_run():
+    with TestClient(app) as client:
+        assert client.get("/api/healthchecker").status_code == 200
+        assert hasattr(app.state, "dashboard_reconciliation")
+
+
+def test_registration_retried_with_the_same_key_is_replayed():
+    payload = {"name": "Retry", "email": "retry@example.com", "password": "password123",
+               "password_confirm": "password123", "role": "ADMIN"}
+    with TestClient(app) as client:
+        first = client.post("/api/auth/register", json=payload, headers={"Idempotency-Key": "register-1"})
+        retry = client.post("/api/auth/register", json=payload, headers={"Idempotency-Key": "register-1"})
+
+    assert first.status_code == 201
+    assert retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert User.count_documents({"email": "retry@example.com"}) == 1
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+from app.utilities.circuit_breaker import CLOSED, OPEN, BreakerCommandListener, CircuitBreaker, ignore_slow_calls
+
+
+def _listener():
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_ms=100, reset_timeout=10, half_open_max_calls=1)
+    return breaker, BreakerCommandListener(breaker)
+
+
+def _succeeded(listener, command_name, duration_ms):
+    listener.succeeded(SimpleNamespace(command_name=command_name, duration_micros=duration_ms * 1000))
+
+
+def test_slow_request_calls_open_the_breaker():
+    breaker, listener = _listener()
+    for _ in range(2):
+        _succeeded(listener, "find", 500)
+    assert breaker.state == OPEN
+
+
+def test_long_maintenance_commands_are_not_slow_calls():
+    breaker, listener = _listener()
+    for _ in range(3):
+        _succeeded(listener, "createIndexes", 500)
+        _succeeded(listener, "getMore", 500)
+        with ignore_slow_calls():
+            _succeeded(listener, "aggregate", 500)
+    assert breaker.state == CLOSED
+    assert breaker.counters["slow_calls"] == 0
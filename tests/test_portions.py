@@ -0,0 +1,13 @@
+from app.utilities.portions import parse_quantity
+
+
+def test_fractions_and_mixed_numbers():
+    assert parse_quantity("1/2 cup")[0].amount == 0.5
+    assert parse_quantity("1 1/2 cups")[0].amount == 1.5
+    assert parse_quantity("2/10 kg")[0].amount == 0.2
+
+
+def test_zero_denominator_does_not_parse():
+    assert parse_quantity("1/0") is None
+    assert parse_quantity("0/0 cup") is None
+    assert parse_quantity("1 1/00 cups") is None
@@ -0,0 +1,19 @@
+from app.database import Exercises, Screenings
+from app.utilities.catalog_cache import exercise_catalog
+from app.utilities.recommendations import SCREENING_FIELDS, recommend
+from app.utilities.tenancy import tenant
+
+
+def test_recommendation_follows_the_exercise_catalog_version():
+    with tenant("main"):
+        Exercises.insert_one({"name": "Squat", "type": "strength", "category": "legs", "sets": 3, "reps": 10})
+        Screenings.insert_one({"user_id": "member-1", "version": 1})
+        screening = Screenings.find_one({"user_id": "member-1"}, SCREENING_FIELDS)
+
+        before = recommend(screening)
+        assert before["catalog_version"] == exercise_catalog.current_version()
+
+        # Editing or deleting an exercise bumps the version, so the stored recommendation is stale
+        exercise_catalog.invalidate()
+        after = recommend(screening)
+        assert after["catalog_version"] == exercise_catalog.current_version() != before["catalog_version"]
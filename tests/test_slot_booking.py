@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.database import SlotBookings, SlotDays, Slots
+from app.schemas.slots import BookingStatus
+from app.utilities.slot_booking import book, resize
+
+DAY = "2030-01-01"
+MEMBERS = 300
+
+
+def _slot(capacity: int) -> dict:
+    slot_id = Slots.insert_one({"name": "Morning", "capacity": capacity}).inserted_id
+    return Slots.find_one({"_id": slot_id})
+
+
+def test_parallel_bookings_never_oversell_the_last_seat():
+    slot = _slot(1)
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        bookings = list(pool.map(lambda n: book(slot, DAY, f"member-{n}"), range(MEMBERS)))
+
+    statuses = [booking["status"] for booking in bookings]
+    assert statuses.count(BookingStatus.BOOKED.value) == 1
+    assert statuses.count(BookingStatus.WAITLISTED.value) == MEMBERS - 1
+    assert SlotDays.find_one({"slot_id": str(slot["_id"]), "date": DAY})["seats_left"] == 0
+    assert SlotBookings.count_documents({"slot_id": str(slot["_id"]), "status": BookingStatus.BOOKED.value}) == 1
+
+
+def test_day_first_booked_during_a_capacity_change_gets_the_new_capacity():
+    slot = _slot(1)
+    # The capacity is raised after the booking read the slot, before the day's counter exists
+    Slots.update_one({"_id": slot["_id"]}, {"$set": {"capacity": 3}})
+    resize(str(slot["_id"]), 3, 2, DAY)
+
+    book(slot, DAY, "member-1")
+    assert SlotDays.find_one({"slot_id": str(slot["_id"]), "date": DAY})["seats_left"] == 2
+
+    # Applying the same change again leaves counters already at the new capacity alone
+    resize(str(slot["_id"]), 3, 2, DAY)
+    assert SlotDays.find_one({"slot_id": str(slot["_id"]), "date": DAY})["seats_left"] == 2